@@ -0,0 +1,199 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from .auth import get_current_user
+from .models import User
+from .backtest import run_backtest, to_dict
+from .candle_store import candle_store, RESOLUTION_SECONDS
+from .candle_sync import candle_sync
+from .quote_stream import QUOTE_WATCHLIST
+from .rate_limiter import REPORTS
+from .signal_pool import signal_pool
+from .signal_tracker import signal_tracker, SIGNAL_MIN_SAMPLES
+from .storage import db
+
+router = APIRouter()
+
+# Backtest metrics per (symbol, strategy) over the stored candle history,
+# recomputed every BACKTEST_REFRESH_INTERVAL and persisted, so signal requests
+# only read a dict. Symbols asked for that have no results yet are picked up
+# by the refresh loop within BACKTEST_POLL_INTERVAL. Before each run the loop
+# syncs the symbols' candles back to BACKTEST_BARS, so the backtest covers the
+# whole window and not just what the signal endpoints happened to fetch.
+BACKTEST_RESOLUTION = os.getenv("BACKTEST_RESOLUTION", "HOUR")
+BACKTEST_BARS = int(os.getenv("BACKTEST_BARS", str(2 * 365 * 24)))
+BACKTEST_SYMBOLS = [s for s in (os.getenv("BACKTEST_SYMBOLS") or ",".join(QUOTE_WATCHLIST)).split(",") if s]
+BACKTEST_REFRESH_INTERVAL = float(os.getenv("BACKTEST_REFRESH_INTERVAL", "86400"))
+BACKTEST_POLL_INTERVAL = float(os.getenv("BACKTEST_POLL_INTERVAL", "60"))
+# Win rates from fewer trades than this are not used for weighting
+BACKTEST_MIN_TRADES = int(os.getenv("BACKTEST_MIN_TRADES", "10"))
+
+
+class BacktestCache:
+    def __init__(self, database=db, pool=signal_pool):
+        self.db = database
+        self.pool = pool
+        # resolution -> {symbol: {strategy: metrics}}
+        self._results = {}
+        self._refreshed = {}
+        # resolution -> symbols asked for without results; touched from
+        # request threads, the refresh thread and the loop
+        self.wanted = {}
+        self._wanted_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._task = None
+        self.stats = {"refreshes": 0, "symbols": 0, "errors": 0, "run_total": 0.0, "last_run": 0.0}
+
+    def _load(self, resolution):
+        results = self._results.get(resolution)
+        if results is None:
+            with self._lock:
+                results = self._results.get(resolution)
+                if results is None:
+                    stored = self.db.backtest_results(resolution)
+                    results = self._results[resolution] = {s: r for s, (r, _) in stored.items()}
+                    if stored:
+                        self._refreshed[resolution] = min(t for _, t in stored.values())
+        return results
+
+    def results(self, symbols, resolution=BACKTEST_RESOLUTION):
+        results = self._load(resolution)
+        missing = [s for s in symbols if s not in results]
+        if missing:
+            with self._wanted_lock:
+                self.wanted.setdefault(resolution, set()).update(missing)
+        return {s: results.get(s, {}) for s in symbols}
+
+    def _wanted(self, resolution, pop=False):
+        with self._wanted_lock:
+            return set(self.wanted.pop(resolution, ()) if pop else self.wanted.get(resolution, ()))
+
+    def symbols(self, resolution, symbols=None):
+        # A full refresh covers every symbol that has been asked for before
+        if symbols is None:
+            symbols = set(BACKTEST_SYMBOLS) | set(self._load(resolution))
+        return sorted(set(symbols) | self._wanted(resolution))
+
+    def refresh(self, resolution=BACKTEST_RESOLUTION, symbols=None, bars=BACKTEST_BARS):
+        # Blocking: backtests the symbols over stored candles and swaps in the results
+        self._load(resolution)
+        started = time.perf_counter()
+        symbols = sorted(set(self.symbols(resolution, symbols)) | self._wanted(resolution, pop=True))
+        if not symbols:
+            return {}
+        histories = candle_store.window(symbols, resolution, bars)
+        results = to_dict(run_backtest(histories.epics, histories.close, resolution, pool=self.pool))
+        self.db.save_backtest_results(resolution, results)
+        with self._lock:
+            self._results[resolution].update(results)
+        elapsed = time.perf_counter() - started
+        self.stats["refreshes"] += 1
+        self.stats["symbols"] += len(symbols)
+        self.stats["run_total"] += elapsed
+        self.stats["last_run"] = elapsed
+        return results
+
+    async def _sync_history(self, client_provider, resolution, symbols):
+        if client_provider is None or not symbols:
+            return
+        try:
+            api = client_provider()
+        except Exception as e:
+            # No live broker session: backtest what is stored
+            print("Backtest history sync skipped:", e)
+            return
+        errors = await candle_sync.sync(api, symbols, resolution, lane=REPORTS, history_bars=BACKTEST_BARS)
+        for symbol, error in errors.items():
+            if error:
+                print(f"Backtest history sync error for {symbol}:", error)
+
+    async def _refresh_loop(self, client_provider):
+        while True:
+            now = time.time()
+            with self._wanted_lock:
+                resolutions = {BACKTEST_RESOLUTION} | set(self.wanted)
+            for resolution in resolutions:
+                try:
+                    if now - self._refreshed.get(resolution, 0.0) >= BACKTEST_REFRESH_INTERVAL:
+                        symbols = await run_in_threadpool(self.symbols, resolution)
+                        await self._sync_history(client_provider, resolution, symbols)
+                        await run_in_threadpool(self.refresh, resolution, symbols)
+                        self._refreshed[resolution] = now
+                    elif self._wanted(resolution):
+                        symbols = sorted(self._wanted(resolution))
+                        await self._sync_history(client_provider, resolution, symbols)
+                        await run_in_threadpool(self.refresh, resolution, symbols)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    print(f"Backtest refresh error for {resolution}:", e)
+            await asyncio.sleep(BACKTEST_POLL_INTERVAL)
+
+    def start(self, client_provider=None):
+        # client_provider() -> AsyncCapitalComAPI for the history sync, raising
+        # if there is no live session
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop(client_provider))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self):
+        with self._wanted_lock:
+            wanted = sum(len(v) for v in self.wanted.values())
+        return {**self.stats, "resolutions": {r: len(v) for r, v in self._results.items()},
+                "wanted": wanted}
+
+
+backtest_cache = BacktestCache()
+
+
+def get_backtest_win_rates(symbols, resolution=BACKTEST_RESOLUTION, min_trades=BACKTEST_MIN_TRADES):
+    # {symbol: {strategy: win_rate}} for pairs with enough trades behind them
+    return {
+        symbol: {name: m["win_rate"] for name, m in per_strategy.items()
+                 if m["trades"] >= min_trades and m["win_rate"] is not None}
+        for symbol, per_strategy in backtest_cache.results(symbols, resolution).items()
+    }
+
+
+def get_recent_signal_performance(symbols, min_samples=SIGNAL_MIN_SAMPLES):
+    # {symbol: {strategy: win_rate}} over the last SIGNAL_WINDOW resolved live signals
+    return {
+        symbol: {name: m["win_rate"] for name, m in per_strategy.items()}
+        for symbol, per_strategy in signal_tracker.performance(symbols, min_samples).items()
+    }
+
+
+@router.get("/analytics/backtest")
+async def get_backtest(symbols: Optional[str] = None, resolution: str = BACKTEST_RESOLUTION,
+                       user: User = Depends(get_current_user)):
+    if resolution not in RESOLUTION_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Unknown resolution {resolution}")
+    symbols = [s for s in (symbols or "").split(",") if s] or BACKTEST_SYMBOLS
+    return await run_in_threadpool(backtest_cache.results, symbols, resolution)
+
+
+@router.post("/analytics/backtest/refresh")
+async def refresh_backtest(symbols: Optional[str] = None, resolution: str = BACKTEST_RESOLUTION,
+                           user: User = Depends(get_current_user)):
+    if resolution not in RESOLUTION_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Unknown resolution {resolution}")
+    symbols = [s for s in (symbols or "").split(",") if s] or None
+    return await run_in_threadpool(backtest_cache.refresh, resolution, symbols)
+
+
+@router.get("/analytics/signals")
+async def get_signal_performance(symbols: Optional[str] = None, min_samples: int = SIGNAL_MIN_SAMPLES,
+                                 user: User = Depends(get_current_user)):
+    symbols = [s for s in (symbols or "").split(",") if s] or list(signal_tracker.by_symbol)
+    return signal_tracker.performance(symbols, min_samples)
@@ -1,26 +1,39 @@
-from fastapi import APIRouter, Depends
-from .models import User
-from .capitalcom_api import CapitalComAPI
-from .auth import get_current_user
+import hashlib
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, Request, Response
+from .capitalcom_api import AsyncCapitalComAPI
+from .broker_sessions import get_broker_api
+from .instrument_catalogue import instrument_catalogue
 
 router = APIRouter()
 
+def _serialized(type, status):
+    # The response body and its ETag, built once per catalogue version and filter.
+    # Only filters naming an indexed type/status are kept, so arbitrary query
+    # strings cannot grow the cache; anything else matches nothing anyway.
+    key = (instrument_catalogue.version, type, status)
+    cached = instrument_catalogue.responses.get(key)
+    if cached is None:
+        body = json.dumps(instrument_catalogue.select(type, status), separators=(",", ":")).encode()
+        cached = (body, '"%s"' % hashlib.sha1(body).hexdigest())
+        if ((type is None or type in instrument_catalogue.by_type)
+                and (status is None or status in instrument_catalogue.by_status)):
+            instrument_catalogue.responses[key] = cached
+    return cached
+
+def _matches(if_none_match, etag):
+    # Weak validators compare equal for GET
+    tags = {t.strip()[2:] if t.strip().startswith("W/") else t.strip() for t in (if_none_match or "").split(",")}
+    return "*" in tags or etag in tags
+
 @router.get("/assets")
-def get_assets(user: User = Depends(get_current_user)):
-    api = CapitalComAPI(
-        identifier=user.username,
-        password=user.password,
-        api_key=user.api_key,
-        api_key_password=user.api_key_password,
-        demo=user.use_demo
-    )
-    api.session_token = user.cc_session_token
-    instruments = api.get_all_instruments()  # Implement this in your CapitalComAPI
-    return [
-        {
-            "symbol": inst["symbol"],
-            "name": inst.get("name", ""),
-            "type": inst.get("type", "")
-        }
-        for inst in instruments
-    ]
\ No newline at end of file
+async def get_assets(request: Request, type: Optional[str] = None, status: Optional[str] = None,
+                     api: AsyncCapitalComAPI = Depends(get_broker_api)):
+    # Served from the in-memory catalogue; unchanged lists are answered with 304
+    await instrument_catalogue.ensure(api)
+    body, etag = _serialized(type, status)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
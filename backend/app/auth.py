@@ -1,59 +1,163 @@
 import jwt
 from datetime import datetime, timedelta
 from fastapi import HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from .models import User
-import json
+from .storage import db
+import hashlib
 import os
-from passlib.context import CryptContext
+import threading
+import time
+from collections import OrderedDict
+from .password_hashing import build_context, password_hasher, HashingBusy
 
 SECRET_KEY = os.getenv("SECRET_KEY", "dev_insecure_secret_key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
 
-USERS_FILE = os.getenv("USERS_FILE", "users.json")
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = build_context()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def load_users():
-    print("Loading users from:", USERS_FILE)
-    if not os.path.exists(USERS_FILE):
-        return {}
-    with open(USERS_FILE, "r") as f:
-        return json.load(f)
+# Verified-token cache for get_current_user. Entries live until the token
+# expires or AUTH_CACHE_TTL passes (bounds staleness for writes made by other
+# workers); upsert_user drops a user's entries immediately in this worker.
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+
+class UserRepository:
+    # Users live in SQLite; materialised User models are cached per worker and
+    # dropped whenever the users_version counter moves (any worker's write).
+    def __init__(self, database):
+        self.db = database
+        self._models = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        version = self.db.users_version()
+        if version != self._version:
+            with self._lock:
+                self._models = {}
+                self._version = version
+
+    def get_data(self, username):
+        return self.db.get_user(username)
+
+    def get(self, username):
+        self._refresh()
+        user = self._models.get(username)
+        if user is None:
+            data = self.db.get_user(username)
+            if data is None:
+                return None
+            user = self._models[username] = User(**data)
+        # Handlers mutate the user before upserting, so hand out a copy
+        return user.model_copy()
+
+    def upsert(self, user: User):
+        self.db.upsert_user(user.dict())
+        with self._lock:
+            self._models.pop(user.username, None)
+
+
+user_repo = UserRepository(db)
+
+
+class TokenCache:
+    def __init__(self, max_size=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL, clock=time.time):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # digest -> (expires_at, user)
+        self._by_user = {}             # username -> set of digests
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        key = self.digest(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def put(self, token, exp, user: User):
+        key = self.digest(token)
+        expires_at = min(exp, self.clock() + self.ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, user)
+            self._entries.move_to_end(key)
+            self._by_user.setdefault(user.username, set()).add(key)
+            while len(self._entries) > self.max_size:
+                old_key, (_, old_user) = self._entries.popitem(last=False)
+                self._by_user.get(old_user.username, set()).discard(old_key)
+                self.stats["evictions"] += 1
 
-def save_users(users):
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f)
+    def invalidate_user(self, username):
+        with self._lock:
+            for key in self._by_user.pop(username, ()):
+                if self._entries.pop(key, None) is not None:
+                    self.stats["invalidations"] += 1
+
+    def get_stats(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "size": len(self._entries), "hit_rate": self.stats["hits"] / lookups if lookups else 0.0}
+
+
+token_cache = TokenCache()
 
 def upsert_user(user: User):
-    users = load_users()
-    users[user.username] = user.dict()
-    save_users(users)
+    user_repo.upsert(user)
+    token_cache.invalidate_user(user.username)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def get_password_hash_async(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except HashingBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def authenticate_user(username: str, password: str) -> User:
-    users = load_users()
-    print(f"Loaded users: {list(users.keys())}")
-    user_data = users.get(username)
-    print(f"User data for {username!r}: {user_data}")
+    user_data = user_repo.get_data(username)
     if not user_data:
         print("User not found")
         return None
     if not verify_password(password, user_data["password"]):
         print("Password does not match!")
-        print(f"Password tried: {password!r}")
-        print(f"Password hash: {user_data['password']!r}")
         return None
-    print("Password verified!")
-    return User(**user_data)
+    return user_repo.get(username)
+
+async def authenticate_user_async(username: str, password: str) -> User:
+    # Same as authenticate_user with bcrypt on the hashing pool; upgrades the
+    # stored hash when BCRYPT_ROUNDS changed since it was created
+    user_data = await run_in_threadpool(user_repo.get_data, username)
+    if not user_data:
+        print("User not found")
+        return None
+    try:
+        ok, new_hash = await password_hasher.verify(password, user_data["password"])
+    except HashingBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if not ok:
+        print("Password does not match!")
+        return None
+    user = await run_in_threadpool(user_repo.get, username)
+    if new_hash:
+        user.password = new_hash
+        await run_in_threadpool(upsert_user, user)
+    return user
 
 def create_access_token(username: str):
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -61,6 +165,9 @@ def create_access_token(username: str):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached.model_copy()
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
@@ -68,8 +175,8 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    users = load_users()
-    user_data = users.get(username)
-    if user_data is None:
+    user = user_repo.get(username)
+    if user is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return User(**user_data)
\ No newline at end of file
+    token_cache.put(token, payload.get("exp", 0), user)
+    return user.model_copy()
\ No newline at end of file
@@ -0,0 +1,126 @@
+import os
+from typing import List, NamedTuple
+import numpy as np
+from .candle_store import RESOLUTION_SECONDS
+from .indicators import IndicatorCache
+from .strategy import STRATEGIES
+
+# Vectorized backtest of the batch strategies over close matrices. For every
+# bar the strategy's signal is the position held until the next close (HOLD
+# is flat), so positions, returns and trades are array ops over the whole
+# (symbols x bars) block:
+#   signals -> positions -> per-bar log returns -> runs of equal position
+#   (trades) -> per-trade returns summed with bincount.
+# Rows are processed in chunks of BACKTEST_CHUNK_ROWS so the memoized
+# indicator series stay small, and chunks can be spread over a SignalPool.
+BACKTEST_CHUNK_ROWS = int(os.getenv("BACKTEST_CHUNK_ROWS", "64"))
+# Round-trip cost as a fraction of price, charged when a position is opened
+BACKTEST_COST = float(os.getenv("BACKTEST_COST", "0.0002"))
+
+METRICS = ("trades", "win_rate", "expectancy", "total_return", "max_drawdown", "sharpe")
+
+
+class BacktestResult(NamedTuple):
+    # Metrics for every symbol x strategy, NaN where there were no trades
+    symbols: List[str]
+    strategies: List[str]
+    trades: np.ndarray        # number of closed or open trades
+    win_rate: np.ndarray      # share of trades with a positive return
+    expectancy: np.ndarray    # mean return per trade
+    total_return: np.ndarray  # compounded return of the strategy
+    max_drawdown: np.ndarray  # worst peak-to-trough loss of the equity curve, as a fraction
+    sharpe: np.ndarray        # annualized, per-bar returns
+
+
+def periods_per_year(resolution):
+    return 365 * 86400 / RESOLUTION_SECONDS[resolution]
+
+
+def _evaluate(signals, log_returns, valid, cost, annualize):
+    # signals, log_returns: (rows, bars - 1) aligned so signals[:, t] earns log_returns[:, t]
+    rows = signals.shape[0]
+    position = np.where(valid, signals, 0).astype(np.int8)
+    previous = np.zeros_like(position)
+    previous[:, 1:] = position[:, :-1]
+    opened = (position != 0) & (position != previous)
+    bar_returns = position * log_returns - np.where(opened, cost, 0.0)
+
+    # A trade is a run of bars with the same non-zero position; runs never
+    # span rows because every row starts flat. A trade returns side * (exit / entry - 1)
+    in_trade = (position != 0).ravel()
+    trade_id = np.cumsum(opened.ravel()) - 1
+    moves = np.bincount(trade_id[in_trade], weights=log_returns.ravel()[in_trade], minlength=int(opened.sum()))
+    trade_rows, trade_cols = np.nonzero(opened)
+    trade_returns = position[trade_rows, trade_cols] * np.expm1(moves) - cost
+    trades = np.bincount(trade_rows, minlength=rows)
+    wins = np.bincount(trade_rows, weights=trade_returns > 0, minlength=rows)
+    total_trade = np.bincount(trade_rows, weights=trade_returns, minlength=rows)
+
+    equity = np.cumsum(bar_returns, axis=1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), 0.0)
+    drawdown = -np.expm1(-np.max(peak - equity, axis=1, initial=0.0))
+    bars = valid.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = bar_returns.sum(axis=1) / bars
+        std = np.sqrt(np.where(valid, (bar_returns - mean[:, None]) ** 2, 0.0).sum(axis=1) / (bars - 1))
+        sharpe = np.where(std > 0, mean / std * np.sqrt(annualize), np.nan)
+        has_trades = trades > 0
+        return {
+            "trades": trades.astype(float),
+            "win_rate": np.where(has_trades, wins / trades, np.nan),
+            "expectancy": np.where(has_trades, total_trade / trades, np.nan),
+            "total_return": np.where(has_trades, np.expm1(equity[:, -1] if equity.shape[1] else 0.0), np.nan),
+            "max_drawdown": np.where(has_trades, drawdown, np.nan),
+            "sharpe": np.where(has_trades, sharpe, np.nan),
+        }
+
+
+def backtest_block(matrix, names, annualize, cost=BACKTEST_COST):
+    # {metric: (rows, strategies)} for one block of rows; module level so pool workers can run it
+    prices = IndicatorCache(matrix)
+    packed = prices.packed
+    rows = packed.shape[0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_returns = np.diff(np.log(packed), axis=1)
+    valid = np.arange(packed.shape[1] - 1)[None, :] < (prices.counts - 1)[:, None]
+    log_returns = np.where(valid, log_returns, 0.0)
+    metrics = {name: np.full((rows, len(names)), np.nan) for name in METRICS}
+    for col, name in enumerate(names):
+        signals, _ = STRATEGIES[name].generate_series(prices)
+        for metric, values in _evaluate(signals[:, :-1], log_returns, valid, cost, annualize).items():
+            metrics[metric][:, col] = values
+    return metrics
+
+
+def run_backtest(symbols, matrix, resolution, strategies=None, cost=BACKTEST_COST,
+                 pool=None, chunk_rows=BACKTEST_CHUNK_ROWS) -> BacktestResult:
+    # matrix: (symbols, bars) closes, NaN-padded. Plugin-only strategies have no
+    # vectorized form and are left to the event-driven simulator.
+    names = [name for name in (strategies or STRATEGIES) if name in STRATEGIES]
+    annualize = periods_per_year(resolution)
+    matrix = np.asarray(matrix, dtype=float)
+    if pool is not None:
+        blocks = pool.run(backtest_block, matrix, names, annualize, cost, shard_rows=chunk_rows)
+    else:
+        blocks = [backtest_block(matrix[start:start + chunk_rows], names, annualize, cost)
+                  for start in range(0, matrix.shape[0], chunk_rows)]
+    merged = {
+        metric: np.concatenate([block[metric] for block in blocks]) if blocks else np.empty((0, len(names)))
+        for metric in METRICS
+    }
+    return BacktestResult(symbols=list(symbols), strategies=names, **merged)
+
+
+def to_dict(result: BacktestResult):
+    # {symbol: {strategy: {metric: value}}}, skipping pairs without trades
+    results = {}
+    for row, symbol in enumerate(result.symbols):
+        per_strategy = {}
+        for col, name in enumerate(result.strategies):
+            if result.trades[row, col] > 0:
+                per_strategy[name] = {
+                    metric: (int(value) if metric == "trades" else (None if np.isnan(value) else float(value)))
+                    for metric, value in ((m, getattr(result, m)[row, col]) for m in METRICS)
+                }
+        results[symbol] = per_strategy
+    return results
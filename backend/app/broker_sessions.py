@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from fastapi import HTTPException, Depends
+from .models import User
+from .auth import get_current_user
+from .capitalcom_api import CapitalComAPI, AsyncCapitalComAPI
+
+# Capital.com sessions expire after 10 minutes without activity, so ping well
+# inside that window. Sessions unused for SESSION_IDLE_TTL are dropped instead
+# of being kept alive forever.
+KEEPALIVE_INTERVAL = float(os.getenv("BROKER_KEEPALIVE_INTERVAL", "240"))
+SESSION_IDLE_TTL = float(os.getenv("BROKER_SESSION_IDLE_TTL", str(8 * 60 * 60)))
+
+
+class BrokerSessionManager:
+    def __init__(self, keepalive_interval=KEEPALIVE_INTERVAL, idle_ttl=SESSION_IDLE_TTL):
+        self.keepalive_interval = keepalive_interval
+        self.idle_ttl = idle_ttl
+        # username -> credentials and Capital.com tokens, kept in memory only
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._user_locks = {}
+        self._stop = threading.Event()
+        self._thread = None
+        # Session the process-wide feeds (quote stream, scanners) currently use
+        self._shared = None
+        self.stats = {"hits": 0, "misses": 0, "logins": 0, "refreshes": 0, "reauths": 0, "failures": 0}
+
+    def _user_lock(self, username):
+        with self._lock:
+            lock = self._user_locks.get(username)
+            if lock is None:
+                lock = self._user_locks[username] = threading.Lock()
+            return lock
+
+    def register(self, username, api, password=None, streaming_host=None):
+        # Called after a successful broker login so the tokens can be reused
+        entry = {
+            "identifier": api.identifier,
+            "password": password if password is not None else api.password,
+            "api_key": api.api_key,
+            "api_key_password": api.api_key_password,
+            "demo": api.demo,
+            "tokens": api.get_tokens(),
+            "streaming_host": streaming_host,
+            "last_used": time.monotonic(),
+        }
+        with self._lock:
+            self._sessions[username] = entry
+            self.stats["logins"] += 1
+
+    def tokens(self, username):
+        entry = self._sessions.get(username)
+        return entry["tokens"] if entry else None
+
+    def shared_username(self, streaming=False):
+        # A live session for the process-wide feeds; sticks to the same user
+        # while their session lives, then moves to any other live one
+        def live(username):
+            entry = self._sessions.get(username)
+            return (entry is not None and entry["tokens"].get("cst")
+                    and (not streaming or entry.get("streaming_host")))
+        if self._shared is not None and live(self._shared):
+            return self._shared
+        self._shared = next((username for username in list(self._sessions) if live(username)), None)
+        return self._shared
+
+    def stream_session(self):
+        # (streaming_host, tokens) of a live session, or None
+        username = self.shared_username(streaming=True)
+        entry = self._sessions.get(username) if username is not None else None
+        if entry is None:
+            return None
+        return entry["streaming_host"], entry["tokens"]
+
+    def shared_async_client(self) -> AsyncCapitalComAPI:
+        # Does not count as use of the session, so the feeds alone never keep
+        # a user's session alive past its idle TTL
+        username = self.shared_username()
+        entry = self._sessions.get(username) if username is not None else None
+        if entry is None:
+            self.stats["misses"] += 1
+            raise HTTPException(status_code=401, detail="No live broker session.")
+        return self._client(AsyncCapitalComAPI, username, entry)
+
+    def drop(self, username):
+        with self._lock:
+            self._sessions.pop(username, None)
+
+    def _client(self, cls, username, entry):
+        api = cls(
+            identifier=entry["identifier"],
+            password=entry["password"],
+            api_key=entry["api_key"],
+            api_key_password=entry["api_key_password"],
+            demo=entry["demo"],
+        )
+        api.set_tokens(entry["tokens"])
+        api.reauthenticate = lambda stale_cst: self._reauthenticate(username, stale_cst)
+        return api
+
+    def _checkout(self, username):
+        entry = self._sessions.get(username)
+        if entry is None or not entry["tokens"].get("cst"):
+            self.stats["misses"] += 1
+            raise HTTPException(status_code=401, detail="Broker session expired. Please log in again.")
+        self.stats["hits"] += 1
+        entry["last_used"] = time.monotonic()
+        return entry
+
+    def client_for(self, user: User) -> CapitalComAPI:
+        return self._client(CapitalComAPI, user.username, self._checkout(user.username))
+
+    def async_client_for(self, user: User) -> AsyncCapitalComAPI:
+        return self.async_client_for_username(user.username)
+
+    def async_client_for_username(self, username) -> AsyncCapitalComAPI:
+        return self._client(AsyncCapitalComAPI, username, self._checkout(username))
+
+    def _login(self, username, entry):
+        api = CapitalComAPI(
+            identifier=entry["identifier"],
+            password=entry["password"],
+            api_key=entry["api_key"],
+            api_key_password=entry["api_key_password"],
+            demo=entry["demo"],
+        )
+        result = api.login()
+        if not result.get("success") or not api.cst:
+            self.stats["failures"] += 1
+            return None
+        entry["tokens"] = api.get_tokens()
+        return entry["tokens"]
+
+    def _reauthenticate(self, username, stale_cst=None):
+        with self._user_lock(username):
+            entry = self._sessions.get(username)
+            if entry is None:
+                return None
+            # Another request already logged in again while we waited for the lock
+            if stale_cst is not None and entry["tokens"].get("cst") != stale_cst:
+                return entry["tokens"]
+            tokens = self._login(username, entry)
+            if tokens:
+                self.stats["reauths"] += 1
+            return tokens
+
+    def _keepalive_once(self):
+        now = time.monotonic()
+        for username, entry in list(self._sessions.items()):
+            if now - entry["last_used"] > self.idle_ttl:
+                self.drop(username)
+                continue
+            api = self._client(CapitalComAPI, username, entry)
+            if api.ping():
+                self.stats["refreshes"] += 1
+            elif self._reauthenticate(username, entry["tokens"].get("cst")):
+                self.stats["refreshes"] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.keepalive_interval):
+            try:
+                self._keepalive_once()
+            except Exception as e:
+                print("Broker keep-alive error:", e)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="broker-keepalive", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_stats(self):
+        return {**self.stats, "active_sessions": len(self._sessions)}
+
+
+broker_sessions = BrokerSessionManager()
+
+
+def get_broker_api(user: User = Depends(get_current_user)) -> AsyncCapitalComAPI:
+    return broker_sessions.async_client_for(user)
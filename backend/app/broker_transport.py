@@ -0,0 +1,123 @@
+import os
+import threading
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# One pooled keep-alive session per (base_url, api_key), shared by every
+# CapitalComAPI instance in the process so handlers stop paying a fresh
+# TCP+TLS handshake on each broker call.
+POOL_CONNECTIONS = int(os.getenv("CAPITALCOM_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.getenv("CAPITALCOM_POOL_MAXSIZE", "32"))
+POOL_BLOCK = os.getenv("CAPITALCOM_POOL_BLOCK", "false").lower() == "true"
+CONNECT_TIMEOUT = float(os.getenv("CAPITALCOM_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("CAPITALCOM_READ_TIMEOUT", "10"))
+ASYNC_MAX_CONNECTIONS = int(os.getenv("CAPITALCOM_ASYNC_MAX_CONNECTIONS", "200"))
+ASYNC_MAX_KEEPALIVE = int(os.getenv("CAPITALCOM_ASYNC_MAX_KEEPALIVE", "50"))
+
+ORDER_READ_TIMEOUT = float(os.getenv("CAPITALCOM_ORDER_READ_TIMEOUT", "5"))
+
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+ORDER_TIMEOUT = (CONNECT_TIMEOUT, ORDER_READ_TIMEOUT)
+
+_sessions = {}
+_async_clients = {}
+_lock = threading.Lock()
+
+
+def _build_session(api_key: str) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        pool_block=POOL_BLOCK,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Headers shared by every call for this key; per-call auth headers are merged on top.
+    session.headers.update({
+        "X-CAP-API-KEY": api_key,
+        "Accept": "application/json",
+        "Connection": "keep-alive",
+    })
+    return session
+
+
+def get_session(base_url: str, api_key: str) -> requests.Session:
+    key = (base_url, api_key)
+    session = _sessions.get(key)
+    if session is None:
+        with _lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _build_session(api_key)
+                _sessions[key] = session
+    return session
+
+
+def get_async_client(base_url: str, api_key: str) -> httpx.AsyncClient:
+    # Clients are bound to the running event loop; the app has one per worker.
+    key = (base_url, api_key)
+    client = _async_clients.get(key)
+    if client is None or client.is_closed:
+        with _lock:
+            client = _async_clients.get(key)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    headers={"X-CAP-API-KEY": api_key, "Accept": "application/json"},
+                    limits=httpx.Limits(
+                        max_connections=ASYNC_MAX_CONNECTIONS,
+                        max_keepalive_connections=ASYNC_MAX_KEEPALIVE,
+                    ),
+                    timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                )
+                _async_clients[key] = client
+    return client
+
+
+def _mask(api_key: str) -> str:
+    return (api_key or "")[:4] + "***"
+
+
+def transport_stats():
+    # urllib3 keeps per-host counters: num_connections is how many sockets were
+    # opened, num_requests how many requests went through them.
+    stats = []
+    for (base_url, api_key), session in list(_sessions.items()):
+        created = sent = 0
+        seen = set()
+        for adapter in session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for pool_key in list(pools.keys()):
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                created += pool.num_connections
+                sent += pool.num_requests
+        stats.append({
+            "base_url": base_url,
+            "api_key": _mask(api_key),
+            "connections_created": created,
+            "requests": sent,
+            "connections_reused": max(sent - created, 0),
+        })
+    return stats
+
+
+def close_all():
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        session.close()
+
+
+async def aclose_all():
+    with _lock:
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+    for client in clients:
+        await client.aclose()
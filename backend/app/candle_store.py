@@ -0,0 +1,210 @@
+import os
+import re
+import threading
+import time
+import numpy as np
+from .capitalcom_api import PriceHistories, align_columns
+
+# On-disk OHLCV history, one directory per (epic, resolution) holding one
+# fixed-width column file per field. Reads are memory-mapped, so a range read
+# is a binary search on the time column plus zero-copy slices.
+CANDLE_STORE_DIR = os.getenv("CANDLE_STORE_DIR", "candles")
+
+COLUMNS = (
+    ("time", np.int64),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("volume", np.float64),
+)
+FIELDS = tuple(name for name, _ in COLUMNS if name != "time")
+
+RESOLUTION_SECONDS = {
+    "MINUTE": 60,
+    "MINUTE_5": 300,
+    "MINUTE_15": 900,
+    "MINUTE_30": 1800,
+    "HOUR": 3600,
+    "HOUR_4": 4 * 3600,
+    "DAY": 86400,
+    "WEEK": 7 * 86400,
+}
+
+
+def _safe_name(value):
+    return re.sub(r"[^A-Za-z0-9._-]", "_", value)
+
+
+class CandleSeries:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._maps = None
+        self._mapped_len = -1
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def __len__(self):
+        # Time is written last, so a torn append never exposes a partial row
+        lengths = []
+        for name, dtype in COLUMNS:
+            f = self._file(name)
+            size = os.path.getsize(f) if os.path.exists(f) else 0
+            lengths.append(size // np.dtype(dtype).itemsize)
+        return min(lengths)
+
+    def _columns(self):
+        n = len(self)
+        if n != self._mapped_len:
+            with self._lock:
+                if n == 0:
+                    self._maps = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}
+                else:
+                    self._maps = {
+                        name: np.memmap(self._file(name), dtype=dtype, mode="r", shape=(n,))
+                        for name, dtype in COLUMNS
+                    }
+                self._mapped_len = n
+        return self._maps
+
+    def first_time(self):
+        times = self._columns()["time"]
+        return int(times[0]) if len(times) else None
+
+    def last_time(self):
+        times = self._columns()["time"]
+        return int(times[-1]) if len(times) else None
+
+    def append(self, columns):
+        # columns: {"time": int64 array, "open": ..., ...}, sorted by time.
+        # Bars older than the last stored one are ignored; a bar with the same
+        # timestamp as the last one replaces it (the broker's still-forming bar).
+        times = np.asarray(columns["time"], dtype=np.int64)
+        if not len(times):
+            return 0
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            n = len(self)
+            last = None
+            if n:
+                with open(self._file("time"), "rb") as f:
+                    f.seek((n - 1) * 8)
+                    last = int(np.frombuffer(f.read(8), dtype=np.int64)[0])
+            start = 0
+            if last is not None:
+                start = int(np.searchsorted(times, last, side="left"))
+                if start < len(times) and times[start] == last:
+                    for name, dtype in COLUMNS:
+                        value = np.asarray(columns[name][start:start + 1], dtype=dtype)
+                        with open(self._file(name), "r+b") as f:
+                            f.seek((n - 1) * np.dtype(dtype).itemsize)
+                            f.write(value.tobytes())
+                    start += 1
+            if start >= len(times):
+                self._mapped_len = -1
+                return 0
+            for name, dtype in COLUMNS[1:] + COLUMNS[:1]:
+                with open(self._file(name), "ab") as f:
+                    f.write(np.asarray(columns[name][start:], dtype=dtype).tobytes())
+            self._mapped_len = -1
+            return len(times) - start
+
+    def merge(self, columns):
+        # Interior backfill: insert bars anywhere in the series by rewriting the
+        # column files. New values win on duplicate timestamps.
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            self._mapped_len = -1
+            self._maps = None
+            current = {}
+            n = len(self)
+            for name, dtype in COLUMNS:
+                if n:
+                    current[name] = np.fromfile(self._file(name), dtype=dtype, count=n)
+                else:
+                    current[name] = np.empty(0, dtype=dtype)
+            times = np.concatenate([current["time"], np.asarray(columns["time"], dtype=np.int64)])
+            order = np.argsort(times, kind="stable")
+            ordered = times[order]
+            keep = order[np.r_[ordered[1:] != ordered[:-1], True]]
+            for name, dtype in COLUMNS[1:] + COLUMNS[:1]:
+                merged = np.concatenate([current[name], np.asarray(columns[name], dtype=dtype)])[keep]
+                tmp = self._file(name) + ".tmp"
+                merged.tofile(tmp)
+                os.replace(tmp, self._file(name))
+            return len(keep) - n
+
+    def gaps(self, step, tolerance=1.5):
+        # (last_before, first_after) pairs where consecutive bars are further
+        # apart than the resolution allows
+        times = self._columns()["time"]
+        if len(times) < 2:
+            return []
+        idx = np.nonzero(np.diff(times) > step * tolerance)[0]
+        return [(int(times[i]), int(times[i + 1])) for i in idx]
+
+    def read(self, start=None, end=None):
+        # Zero-copy views of bars with start <= time < end
+        cols = self._columns()
+        times = cols["time"]
+        lo = int(np.searchsorted(times, start, side="left")) if start is not None else 0
+        hi = int(np.searchsorted(times, end, side="left")) if end is not None else len(times)
+        return {name: cols[name][lo:hi] for name, _ in COLUMNS}
+
+    def tail(self, count):
+        cols = self._columns()
+        return {name: cols[name][-count:] if count else cols[name][:0] for name, _ in COLUMNS}
+
+
+class CandleStore:
+    def __init__(self, root=CANDLE_STORE_DIR):
+        self.root = root
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def series(self, epic, resolution) -> CandleSeries:
+        key = (epic, resolution)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.get(key)
+                if series is None:
+                    path = os.path.join(self.root, _safe_name(resolution), _safe_name(epic))
+                    series = self._series[key] = CandleSeries(path)
+        return series
+
+    def append(self, epic, resolution, columns):
+        return self.series(epic, resolution).append(columns)
+
+    def append_histories(self, histories: PriceHistories, resolution):
+        for row, epic in enumerate(histories.epics):
+            mask = ~np.isnan(histories.close[row])
+            if not mask.any():
+                continue
+            columns = {"time": histories.times[mask]}
+            for name in FIELDS:
+                columns[name] = getattr(histories, name)[row, mask]
+            self.append(epic, resolution, columns)
+
+    def read(self, epic, resolution, start=None, end=None):
+        return self.series(epic, resolution).read(start, end)
+
+    def is_stale(self, epic, resolution, now=None):
+        # Stale once the newest stored bar is more than one period old
+        last = self.series(epic, resolution).last_time()
+        now = time.time() if now is None else now
+        return last is None or last < now - RESOLUTION_SECONDS[resolution]
+
+    def window(self, epics, resolution, bars, now=None) -> PriceHistories:
+        now = time.time() if now is None else now
+        start = int(now) - bars * RESOLUTION_SECONDS[resolution]
+        columns, errors = {}, {}
+        for epic in epics:
+            columns[epic] = self.read(epic, resolution, start=start)
+            errors[epic] = None if len(columns[epic]["time"]) else "no data"
+        return align_columns(epics, columns, errors)
+
+
+candle_store = CandleStore()
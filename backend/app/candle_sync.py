@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+from fastapi.concurrency import run_in_threadpool
+from .candle_store import candle_store, CandleStore, RESOLUTION_SECONDS
+from .capitalcom_api import candles_to_columns, BULK_CONCURRENCY
+from .rate_limiter import MARKET_DATA
+
+# Incremental history sync: per (epic, resolution) only the bars after the
+# newest stored one are requested, split into pages of at most
+# MAX_POINTS_PER_CALL. Interior gaps are requested once and then remembered,
+# so weekend/holiday closures are not refetched on every pass. Callers that
+# need a longer history than the series holds (backtests) pass history_bars,
+# and the missing head is requested once the same way.
+MAX_POINTS_PER_CALL = int(os.getenv("CAPITALCOM_MAX_POINTS_PER_CALL", "1000"))
+INITIAL_BARS = int(os.getenv("CANDLE_SYNC_INITIAL_BARS", "1000"))
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class CandleSync:
+    def __init__(self, store: CandleStore = candle_store, max_points=MAX_POINTS_PER_CALL, initial_bars=INITIAL_BARS):
+        self.store = store
+        self.max_points = max_points
+        self.initial_bars = initial_bars
+        self.stats = {"passes": 0, "requests": 0, "bars": 0, "gaps_filled": 0, "errors": 0}
+
+    def _checked_file(self, epic, resolution):
+        return os.path.join(self.store.series(epic, resolution).path, "checked_gaps.json")
+
+    def _checked_gaps(self, epic, resolution):
+        path = self._checked_file(epic, resolution)
+        if not os.path.exists(path):
+            return set()
+        with open(path, "r") as f:
+            return {tuple(g) for g in json.load(f)}
+
+    def _save_checked_gaps(self, epic, resolution, gaps):
+        with open(self._checked_file(epic, resolution), "w") as f:
+            json.dump(sorted(gaps), f)
+
+    def _pages(self, start, end, step):
+        # [start, end) split into windows of at most max_points bars
+        span = self.max_points * step
+        pages = []
+        while start < end:
+            pages.append((start, min(start + span, end)))
+            start += span
+        return pages
+
+    def plan(self, epic, resolution, now=None, history_bars=None):
+        # Returns (tail pages, gap pages) still missing for this series
+        step = RESOLUTION_SECONDS[resolution]
+        now = int(time.time() if now is None else now)
+        series = self.store.series(epic, resolution)
+        last = series.last_time()
+        since = now - (history_bars or self.initial_bars) * step
+        if last is not None and not self.store.is_stale(epic, resolution, now):
+            tail = []
+        else:
+            # Re-request the newest stored bar too, it may still have been forming
+            start = last if last is not None else since
+            tail = self._pages(start, now + step, step)
+        checked = self._checked_gaps(epic, resolution)
+        gaps = [g for g in series.gaps(step) if g not in checked]
+        if history_bars and last is not None:
+            # History older than the series holds is a gap ending at its first
+            # bar; once asked for, it stays checked while `since` moves forward
+            first = series.first_time()
+            if first > since + step and not any(g[1] == first and g[0] < since for g in checked):
+                gaps.append((since - step, first))
+        gap_pages = [(g, page) for g in gaps for page in self._pages(g[0] + step, g[1], step)]
+        return tail, gap_pages
+
+    async def _fetch(self, api, epic, resolution, page, lane, semaphore):
+        async with semaphore:
+            self.stats["requests"] += 1
+            return await api._fetch_prices(epic, resolution, self.max_points, _iso(page[0]), _iso(page[1]), lane)
+
+    def _fill_gaps(self, epic, resolution, gap_pages, filled):
+        # Blocking: merges the fetched gap pages and remembers the gaps as checked
+        series = self.store.series(epic, resolution)
+        checked = self._checked_gaps(epic, resolution)
+        for (gap, _), candles in zip(gap_pages, filled):
+            if candles:
+                added = series.merge(candles_to_columns(candles))
+                self.stats["bars"] += added
+                self.stats["gaps_filled"] += 1 if added else 0
+            checked.add(gap)
+        self._save_checked_gaps(epic, resolution, checked)
+
+    async def sync_epic(self, api, epic, resolution, lane=MARKET_DATA, semaphore=None, now=None, history_bars=None):
+        semaphore = semaphore or asyncio.Semaphore(BULK_CONCURRENCY)
+        # Store reads and writes are file I/O; they run off the event loop
+        try:
+            tail, gap_pages = await run_in_threadpool(self.plan, epic, resolution, now, history_bars)
+            pages = await asyncio.gather(*(self._fetch(api, epic, resolution, p, lane, semaphore) for p in tail))
+            for candles in pages:
+                if candles:
+                    self.stats["bars"] += await run_in_threadpool(
+                        self.store.append, epic, resolution, candles_to_columns(candles)
+                    )
+            if gap_pages:
+                filled = await asyncio.gather(
+                    *(self._fetch(api, epic, resolution, page, lane, semaphore) for _, page in gap_pages)
+                )
+                await run_in_threadpool(self._fill_gaps, epic, resolution, gap_pages, filled)
+            return None
+        except Exception as e:
+            self.stats["errors"] += 1
+            return str(e)
+
+    async def sync(self, api, epics, resolution, lane=MARKET_DATA, concurrency=BULK_CONCURRENCY, now=None,
+                   history_bars=None):
+        # One pass over the whole watchlist; returns per-epic error status
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        results = await asyncio.gather(
+            *(self.sync_epic(api, epic, resolution, lane, semaphore, now, history_bars) for epic in epics)
+        )
+        self.stats["passes"] += 1
+        return dict(zip(epics, results))
+
+
+candle_sync = CandleSync()
@@ -1,32 +1,149 @@
-import requests
+import asyncio
+import httpx
 import numpy as np
+import os
+import requests
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional
+from .broker_transport import get_session, get_async_client, DEFAULT_TIMEOUT, ORDER_TIMEOUT
+from .rate_limiter import get_limiter, ORDERS, ACCOUNT, MARKET_DATA
+from .resilience import (
+    BrokerUnavailable, MAX_RETRIES, RETRYABLE_STATUS, backoff_delay, cache_key, get_breaker, response_cache,
+)
+
+# Max in-flight price requests per bulk fetch; the rate limiter still applies per call
+BULK_CONCURRENCY = int(os.getenv("CAPITALCOM_BULK_CONCURRENCY", "8"))
+# Markets returned per market navigation node (the broker caps this at 500)
+NAVIGATION_LIMIT = int(os.getenv("CAPITALCOM_NAVIGATION_LIMIT", "500"))
+# Never answered from the last-good cache: risk reconciliation rebuilds its
+# books from these, and a stale position list would look like a real one
+UNCACHED_PATHS = {"/api/v1/positions"}
+
+
+class PriceHistories(NamedTuple):
+    # Candles for many epics aligned on one time axis (epic x time), NaN where missing
+    epics: List[str]
+    times: np.ndarray   # int64 epoch seconds
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    errors: Dict[str, Optional[str]]
+
+
+def _to_epoch(values):
+    return np.array([v.rstrip("Z") for v in values], dtype="datetime64[s]").astype(np.int64)
+
+
+def align_columns(epics, columns_by_epic, errors) -> PriceHistories:
+    # columns_by_epic: epic -> {"time": int64 array, "open": ..., ...}
+    empty = np.empty(0, dtype=np.int64)
+    stamps = {e: (columns_by_epic.get(e) or {}).get("time", empty) for e in epics}
+    times = np.unique(np.concatenate([stamps[e] for e in epics])) if epics else empty
+    shape = (len(epics), len(times))
+    fields = {name: np.full(shape, np.nan) for name in ("open", "high", "low", "close", "volume")}
+    for row, epic in enumerate(epics):
+        if not len(stamps[epic]):
+            continue
+        cols = np.searchsorted(times, stamps[epic])
+        for name, matrix in fields.items():
+            matrix[row, cols] = columns_by_epic[epic][name]
+    return PriceHistories(list(epics), times, errors=errors, **fields)
+
 
-class CapitalComAPI:
-    def __init__(self, identifier, password, api_key, demo, login_context=None):
+def candles_to_columns(candles):
+    columns = {"time": _to_epoch([c["time"] for c in candles])}
+    for name in ("open", "high", "low", "close", "volume"):
+        columns[name] = np.array([c[name] if c[name] is not None else np.nan for c in candles], dtype=float)
+    return columns
+
+
+def align_price_histories(epics, candles_by_epic, errors) -> PriceHistories:
+    columns = {e: candles_to_columns(c) for e, c in candles_by_epic.items() if c}
+    return align_columns(epics, columns, errors)
+
+
+class _CapitalComBase:
+    # Request building and response parsing shared by the sync and async clients.
+    def __init__(self, identifier, password, api_key, demo, api_key_password=None, login_context=None):
         self.identifier = identifier
         self.password = password
         self.api_key = api_key
+        self.api_key_password = api_key_password
         self.demo = demo
         self.login_context = login_context
         self.session_token = None  # Store the session token if available
+        # Capital.com session headers returned by POST /session
+        self.cst = None
+        self.security_token = None
+        # Optional callable(stale_cst) -> tokens dict, used to log in again once on a 401
+        self.reauthenticate = None
         # Capital.com base URL
         self.base_url = (
             "https://api-capital.backend-capital.com"
             if not demo else
             "https://demo-api-capital.backend-capital.com"
         )
+        self.timeout = DEFAULT_TIMEOUT
+        # Per-API-key request budget shared by every client for that key
+        self.limiter = get_limiter(self.api_key)
 
     def get_login_context(self):
         # Placeholder for storing intermediate login/2FA state if needed
         return {"identifier": self.identifier}
 
-    def login(self, otp=None):
-        url = f"{self.base_url}/api/v1/session"
-        headers = {
-            "Content-Type": "application/json",
-            "X-CAP-API-KEY": self.api_key,
-        }
+    def _auth_headers(self):
+        headers = {}
+        if self.cst and self.security_token:
+            headers["CST"] = self.cst
+            headers["X-SECURITY-TOKEN"] = self.security_token
+        # Add Authorization header if session_token is present
+        elif self.session_token:
+            headers["Authorization"] = f"Bearer {self.session_token}"
+        return headers
+
+    def get_tokens(self):
+        return {"cst": self.cst, "security_token": self.security_token, "session_token": self.session_token}
+
+    def set_tokens(self, tokens):
+        self.cst = tokens.get("cst")
+        self.security_token = tokens.get("security_token")
+        self.session_token = tokens.get("session_token")
+
+    def _guard(self, method, path, params, endpoint):
+        breaker = get_breaker(self.base_url, endpoint or path)
+        cacheable = method == "GET" and path not in UNCACHED_PATHS
+        key = cache_key(self.api_key, method, path, params) if cacheable else None
+        # Only idempotent GETs are retried
+        attempts = MAX_RETRIES + 1 if method == "GET" else 1
+        return breaker, key, attempts
+
+    @staticmethod
+    def _fallback(key, error):
+        # Serve the last good payload while the broker is unhealthy
+        cached = response_cache.get(key) if key else None
+        if cached is None:
+            raise error
+        return cached
+
+    @staticmethod
+    def _accept(resp, breaker, key):
+        # (data, error); a 5xx, a 429 or a body that is not JSON is an error and
+        # never counts as a success or reaches the cache
+        if resp.status_code in RETRYABLE_STATUS or resp.status_code >= 500:
+            return None, BrokerUnavailable(f"Broker returned {resp.status_code}")
+        try:
+            data = resp.json()
+        except ValueError:
+            return None, BrokerUnavailable(f"Broker returned an unreadable {resp.status_code} response")
+        breaker.record_success()
+        if key and resp.status_code == 200:
+            response_cache.put(key, data)
+        return data, None
+
+    def _login_payload(self, otp=None):
         payload = {
             "identifier": self.identifier,
             "password": self.password,
@@ -34,75 +151,392 @@ class CapitalComAPI:
         }
         if otp:
             payload["2faCode"] = otp
+        return payload
+
+    def _parse_login(self, status_code, data, headers=None):
+        if status_code == 200 and headers is not None:
+            self.cst = headers.get("CST")
+            self.security_token = headers.get("X-SECURITY-TOKEN")
+        # Store session token if present
+        if status_code == 200 and "session" in data:
+            self.session_token = data["session"]
+        if status_code == 200 and "currentAccountId" in data:
+            # Success! Return all relevant account info.
+            result = {"success": True}
+            result.update(data)
+            return result
+        elif data.get("2fa_required") or data.get("2faRequired"):
+            return {"success": False, "2fa_required": True}
+        else:
+            return {"success": False, "error": data.get("error", "Login failed")}
+
+    def _order_payload(self, symbol, side, amount, take_profit=None, stop_loss=None):
+        payload = {
+            "epic": symbol,
+            "direction": side.upper(),
+            "size": amount,
+            "orderType": "MARKET",
+        }
+        if take_profit:
+            payload["takeProfit"] = take_profit
+        if stop_loss:
+            payload["stopLoss"] = stop_loss
+        return payload
+
+    @staticmethod
+    def _history_params(from_date=None, to_date=None):
+        params = {}
+        if from_date:
+            params["from"] = from_date.rstrip("Z")
+        if to_date:
+            params["to"] = to_date.rstrip("Z")
+        return params
+
+    @staticmethod
+    def _price_params(resolution, max_points=None, from_date=None, to_date=None):
+        params = {"resolution": resolution}
+        if max_points:
+            params["max"] = max_points
+        if from_date:
+            params["from"] = from_date.rstrip("Z")
+        if to_date:
+            params["to"] = to_date.rstrip("Z")
+        return params
+
+    @staticmethod
+    def _mid(price):
+        if not isinstance(price, dict):
+            return price
+        bid, ask = price.get("bid"), price.get("ask")
+        if bid is None or ask is None:
+            return bid if ask is None else ask
+        return (bid + ask) / 2
+
+    @classmethod
+    def _parse_prices(cls, data):
+        # Flatten Capital.com bid/ask candles into mid-price OHLCV dicts
+        candles = []
+        for p in data.get("prices", []):
+            candles.append({
+                "time": p.get("snapshotTimeUTC") or p.get("snapshotTime"),
+                "open": cls._mid(p.get("openPrice")),
+                "high": cls._mid(p.get("highPrice")),
+                "low": cls._mid(p.get("lowPrice")),
+                "close": cls._mid(p.get("closePrice")),
+                "volume": p.get("lastTradedVolume", 0),
+            })
+        return candles
+
+    @staticmethod
+    def _parse_instruments(data):
+        instruments = []
+        for m in data.get("markets", []):
+            instruments.append({
+                "epic": m.get("epic"),
+                "symbol": m.get("epic"),
+                "name": m.get("instrumentName", ""),
+                "type": m.get("instrumentType", ""),
+                "status": m.get("marketStatus", ""),
+                "bid": m.get("bid"),
+                "offer": m.get("offer"),
+            })
+        return instruments
+
+    @staticmethod
+    def _navigation_request(node_id):
+        # Top-level nodes, or one node's sub-nodes and markets
+        if node_id is None:
+            return "/api/v1/marketnavigation", None
+        return f"/api/v1/marketnavigation/{node_id}", {"limit": NAVIGATION_LIMIT}
+
+    @classmethod
+    def _parse_navigation(cls, data):
+        return {
+            "nodes": [{"id": n.get("id"), "name": n.get("name", "")} for n in data.get("nodes", [])],
+            "markets": cls._parse_instruments(data),
+        }
+
+
+class CapitalComAPI(_CapitalComBase):
+    def __init__(self, identifier, password, api_key, demo, api_key_password=None, login_context=None):
+        super().__init__(identifier, password, api_key, demo, api_key_password, login_context)
+        # Shared keep-alive session (already carries the X-CAP-API-KEY header)
+        self.session = get_session(self.base_url, self.api_key)
+
+    def _do(self, method, url, params=None, payload=None, lane=ACCOUNT, timeout=None):
+        self.limiter.acquire(lane)
+        headers = self._auth_headers()
+        if payload is not None:
+            headers["Content-Type"] = "application/json"
+        return self.session.request(method, url, params=params, json=payload, headers=headers,
+                                    timeout=timeout or self.timeout)
+
+    def _send(self, method, path, params=None, payload=None, lane=ACCOUNT, endpoint=None, timeout=None):
+        url = f"{self.base_url}{path}"
+        breaker, key, attempts = self._guard(method, path, params, endpoint)
+        if not breaker.allow():
+            return self._fallback(key, BrokerUnavailable(f"Circuit open for {endpoint or path}"))
+        error = None
+        for attempt in range(attempts):
+            try:
+                resp = self._do(method, url, params, payload, lane, timeout)
+                if resp.status_code == 401 and self.reauthenticate:
+                    tokens = self.reauthenticate(self.cst)
+                    if tokens:
+                        self.set_tokens(tokens)
+                        resp = self._do(method, url, params, payload, lane, timeout)
+                data, error = self._accept(resp, breaker, key)
+                if error is None:
+                    return data
+                throttled = resp.status_code == 429
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                throttled = False
+            # A 429 is our own key's budget, not a sign the broker is down
+            if not throttled:
+                breaker.record_failure()
+            if attempt + 1 == attempts or breaker.state == breaker.OPEN:
+                break
+            time.sleep(backoff_delay(attempt))
+        return self._fallback(key, error)
+
+    def login(self, otp=None):
+        url = f"{self.base_url}/api/v1/session"
+        headers = {
+            "Content-Type": "application/json",
+        }
         try:
-            resp = requests.post(url, json=payload, headers=headers)
-            data = resp.json()
-            print("Capital.com API response:", data)  # For debugging
-            # Store session token if present
-            if resp.status_code == 200 and "session" in data:
-                self.session_token = data["session"]
-            if resp.status_code == 200 and "currentAccountId" in data:
-                # Success! Return all relevant account info.
-                result = {"success": True}
-                result.update(data)
-                return result
-            elif data.get("2fa_required") or data.get("2faRequired"):
-                return {"success": False, "2fa_required": True}
-            else:
-                return {"success": False, "error": data.get("error", "Login failed")}
+            self.limiter.acquire(ACCOUNT)
+            resp = self.session.post(url, json=self._login_payload(otp), headers=headers, timeout=self.timeout)
+            return self._parse_login(resp.status_code, resp.json(), resp.headers)
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    def ping(self):
+        try:
+            return self._do("GET", f"{self.base_url}/api/v1/ping").status_code == 200
+        except Exception:
+            return False
+
     def get_account_info(self):
-        url = f"{self.base_url}/api/v1/accounts"
-        headers = {
-            "X-CAP-API-KEY": self.api_key,
-        }
-        # Add Authorization header if session_token is present
-        if self.session_token:
-            headers["Authorization"] = f"Bearer {self.session_token}"
         try:
-            resp = requests.get(url, headers=headers)
-            return resp.json()
+            return self._send("GET", "/api/v1/accounts")
         except Exception as e:
             return {"error": str(e)}
 
     def get_trades(self):
-        url = f"{self.base_url}/api/v1/history/transactions"
-        headers = {
-            "X-CAP-API-KEY": self.api_key,
-        }
-        # Add Authorization header if session_token is present
-        if self.session_token:
-            headers["Authorization"] = f"Bearer {self.session_token}"
         try:
-            resp = requests.get(url, headers=headers)
-            data = resp.json()
+            data = self._send("GET", "/api/v1/history/transactions")
+            return data.get("transactions", [])
+        except Exception as e:
+            return []
+
+    def get_trade_history(self, from_date=None, to_date=None):
+        try:
+            data = self._send("GET", "/api/v1/history/transactions",
+                              params=self._history_params(from_date, to_date))
             return data.get("transactions", [])
         except Exception as e:
             return []
 
+    def get_positions(self):
+        try:
+            return self._send("GET", "/api/v1/positions")
+        except Exception as e:
+            return {"error": str(e)}
+
     def place_trade(self, symbol, side, amount, take_profit=None, stop_loss=None):
-        url = f"{self.base_url}/api/v1/orders"
+        payload = self._order_payload(symbol, side, amount, take_profit, stop_loss)
+        try:
+            return self._send("POST", "/api/v1/orders", payload=payload, lane=ORDERS, timeout=ORDER_TIMEOUT)
+        except Exception as e:
+            return {"error": str(e)}
+
+    def _fetch_prices(self, epic, resolution, max_points=None, from_date=None, to_date=None, lane=MARKET_DATA):
+        params = self._price_params(resolution, max_points, from_date, to_date)
+        return self._parse_prices(self._send("GET", f"/api/v1/prices/{epic}", params=params, lane=lane,
+                                             endpoint="/api/v1/prices"))
+
+    def get_price_history(self, epic, resolution="HOUR", max_points=None, from_date=None, to_date=None, lane=MARKET_DATA):
+        try:
+            return self._fetch_prices(epic, resolution, max_points, from_date, to_date, lane)
+        except Exception as e:
+            return []
+
+    def get_price_histories(self, epics, resolution="HOUR", window=None, from_date=None, to_date=None,
+                            lane=MARKET_DATA, concurrency=BULK_CONCURRENCY) -> PriceHistories:
+        # Fan out with bounded concurrency so wall time is ~one round trip, not N
+        candles, errors = {}, {}
+
+        def fetch(epic):
+            try:
+                candles[epic] = self._fetch_prices(epic, resolution, window, from_date, to_date, lane)
+                errors[epic] = None if candles[epic] else "no data"
+            except Exception as e:
+                errors[epic] = str(e)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(epics)))) as pool:
+            list(pool.map(fetch, epics))
+        return align_price_histories(epics, candles, errors)
+
+    def get_all_instruments(self, search_term=None):
+        params = {"searchTerm": search_term} if search_term else None
+        try:
+            return self._parse_instruments(self._send("GET", "/api/v1/markets", params=params, lane=MARKET_DATA))
+        except Exception as e:
+            return []
+
+    def get_assets(self):
+        return self.get_all_instruments()
+
+    def get_market_navigation(self, node_id=None):
+        path, params = self._navigation_request(node_id)
+        try:
+            return self._parse_navigation(self._send("GET", path, params=params, lane=MARKET_DATA,
+                                                     endpoint="/api/v1/marketnavigation"))
+        except Exception as e:
+            return {"error": str(e)}
+
+
+class AsyncCapitalComAPI(_CapitalComBase):
+    # Async twin of CapitalComAPI on a pooled httpx.AsyncClient, so one event
+    # loop can keep many broker calls in flight without tying up threads.
+    def __init__(self, identifier, password, api_key, demo, api_key_password=None, login_context=None):
+        super().__init__(identifier, password, api_key, demo, api_key_password, login_context)
+        self.client = get_async_client(self.base_url, self.api_key)
+
+    async def _do(self, method, url, params=None, payload=None, lane=ACCOUNT, timeout=None):
+        await self.limiter.acquire_async(lane)
+        headers = self._auth_headers()
+        if payload is not None:
+            headers["Content-Type"] = "application/json"
+        connect, read = timeout or self.timeout
+        return await self.client.request(method, url, params=params, json=payload, headers=headers,
+                                         timeout=httpx.Timeout(read, connect=connect))
+
+    async def _send(self, method, path, params=None, payload=None, lane=ACCOUNT, endpoint=None, timeout=None):
+        url = f"{self.base_url}{path}"
+        breaker, key, attempts = self._guard(method, path, params, endpoint)
+        if not breaker.allow():
+            return self._fallback(key, BrokerUnavailable(f"Circuit open for {endpoint or path}"))
+        error = None
+        for attempt in range(attempts):
+            try:
+                resp = await self._do(method, url, params, payload, lane, timeout)
+                if resp.status_code == 401 and self.reauthenticate:
+                    # Re-login is a blocking call shared with the sync client
+                    tokens = await asyncio.to_thread(self.reauthenticate, self.cst)
+                    if tokens:
+                        self.set_tokens(tokens)
+                        resp = await self._do(method, url, params, payload, lane, timeout)
+                data, error = self._accept(resp, breaker, key)
+                if error is None:
+                    return data
+                throttled = resp.status_code == 429
+            except httpx.TransportError as e:
+                error = e
+                throttled = False
+            # A 429 is our own key's budget, not a sign the broker is down
+            if not throttled:
+                breaker.record_failure()
+            if attempt + 1 == attempts or breaker.state == breaker.OPEN:
+                break
+            await asyncio.sleep(backoff_delay(attempt))
+        return self._fallback(key, error)
+
+    async def login(self, otp=None):
+        url = f"{self.base_url}/api/v1/session"
         headers = {
-            "X-CAP-API-KEY": self.api_key,
             "Content-Type": "application/json",
         }
-        # Add Authorization header if session_token is present
-        if self.session_token:
-            headers["Authorization"] = f"Bearer {self.session_token}"
-        payload = {
-            "epic": symbol,
-            "direction": side.upper(),
-            "size": amount,
-            "orderType": "MARKET",
-        }
-        if take_profit:
-            payload["takeProfit"] = take_profit
-        if stop_loss:
-            payload["stopLoss"] = stop_loss
         try:
-            resp = requests.post(url, json=payload, headers=headers)
-            return resp.json()
+            await self.limiter.acquire_async(ACCOUNT)
+            resp = await self.client.post(url, json=self._login_payload(otp), headers=headers)
+            return self._parse_login(resp.status_code, resp.json(), resp.headers)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    async def ping(self):
+        try:
+            return (await self._do("GET", f"{self.base_url}/api/v1/ping")).status_code == 200
+        except Exception:
+            return False
+
+    async def get_account_info(self):
+        try:
+            return await self._send("GET", "/api/v1/accounts")
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def get_trades(self):
+        try:
+            data = await self._send("GET", "/api/v1/history/transactions")
+            return data.get("transactions", [])
+        except Exception as e:
+            return []
+
+    async def get_trade_history(self, from_date=None, to_date=None):
+        try:
+            data = await self._send("GET", "/api/v1/history/transactions",
+                                    params=self._history_params(from_date, to_date))
+            return data.get("transactions", [])
+        except Exception as e:
+            return []
+
+    async def get_positions(self):
+        try:
+            return await self._send("GET", "/api/v1/positions")
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def place_trade(self, symbol, side, amount, take_profit=None, stop_loss=None):
+        payload = self._order_payload(symbol, side, amount, take_profit, stop_loss)
+        try:
+            return await self._send("POST", "/api/v1/orders", payload=payload, lane=ORDERS, timeout=ORDER_TIMEOUT)
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def _fetch_prices(self, epic, resolution, max_points=None, from_date=None, to_date=None, lane=MARKET_DATA):
+        params = self._price_params(resolution, max_points, from_date, to_date)
+        return self._parse_prices(await self._send("GET", f"/api/v1/prices/{epic}", params=params, lane=lane,
+                                                   endpoint="/api/v1/prices"))
+
+    async def get_price_history(self, epic, resolution="HOUR", max_points=None, from_date=None, to_date=None, lane=MARKET_DATA):
+        try:
+            return await self._fetch_prices(epic, resolution, max_points, from_date, to_date, lane)
+        except Exception as e:
+            return []
+
+    async def get_price_histories(self, epics, resolution="HOUR", window=None, from_date=None, to_date=None,
+                                  lane=MARKET_DATA, concurrency=BULK_CONCURRENCY) -> PriceHistories:
+        candles, errors = {}, {}
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def fetch(epic):
+            async with semaphore:
+                try:
+                    candles[epic] = await self._fetch_prices(epic, resolution, window, from_date, to_date, lane)
+                    errors[epic] = None if candles[epic] else "no data"
+                except Exception as e:
+                    errors[epic] = str(e)
+
+        await asyncio.gather(*(fetch(epic) for epic in epics))
+        return align_price_histories(epics, candles, errors)
+
+    async def get_all_instruments(self, search_term=None):
+        params = {"searchTerm": search_term} if search_term else None
+        try:
+            return self._parse_instruments(await self._send("GET", "/api/v1/markets", params=params, lane=MARKET_DATA))
+        except Exception as e:
+            return []
+
+    async def get_assets(self):
+        return await self.get_all_instruments()
+
+    async def get_market_navigation(self, node_id=None):
+        path, params = self._navigation_request(node_id)
+        try:
+            return self._parse_navigation(await self._send("GET", path, params=params, lane=MARKET_DATA,
+                                                           endpoint="/api/v1/marketnavigation"))
         except Exception as e:
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
@@ -1,49 +1,33 @@
 from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime, date, timedelta
 import numpy as np
 
 from .models import User
-from .capitalcom_api import CapitalComAPI
 from .auth import get_current_user
+from .capitalcom_api import AsyncCapitalComAPI
+from .broker_sessions import get_broker_api
+from .rate_limiter import REPORTS
+from .candle_store import candle_store
+from .candle_sync import candle_sync
+from .storage import db
+from .instrument_catalogue import instrument_catalogue
+from .indicators import first_valid, last_valid, rsi, volatility
 
 router = APIRouter()
 
-def get_percentage_change(prices):
-    if not prices or len(prices) < 2:
-        return 0
-    return ((prices[-1] - prices[0]) / prices[0]) * 100
-
-def get_volatility(prices):
-    if not prices or len(prices) < 2:
-        return 0
-    return float(np.std(prices))
-
-def get_rsi(prices, period=14):
-    if len(prices) < period + 1:
-        return None
-    deltas = np.diff(prices)
-    seed = deltas[:period]
-    up = seed[seed > 0].sum() / period
-    down = -seed[seed < 0].sum() / period
-    rs = up / down if down != 0 else 0
-    rsi = 100 - 100 / (1 + rs)
-    return float(rsi)
+def get_percentage_changes(closes):
+    # First to last valid close per row, in percent
+    first, last = first_valid(closes), last_valid(closes)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(first > 0, (last - first) / first * 100, 0.0)
 
 @router.get("/daily-report")
-def daily_report(user: User = Depends(get_current_user)):
-    api = CapitalComAPI(
-        identifier=user.username,
-        password=user.password,
-        api_key=user.api_key,
-        api_key_password=user.api_key_password,
-        demo=user.use_demo
-    )
-    api.session_token = user.cc_session_token
-
+async def daily_report(user: User = Depends(get_current_user), api: AsyncCapitalComAPI = Depends(get_broker_api)):
     today = date.today()
     from_date = datetime.combine(today, datetime.min.time()).isoformat() + "Z"
     to_date = datetime.combine(today + timedelta(days=1), datetime.min.time()).isoformat() + "Z"
-    trades_data = api.get_trade_history(from_date=from_date, to_date=to_date) or []
+    trades_data = await api.get_trade_history(from_date=from_date, to_date=to_date) or []
 
     # Debug: print trade history raw data and its type
     print("Trade history raw:", trades_data)
@@ -72,31 +56,31 @@ def daily_report(user: User = Depends(get_current_user)):
     wins = len([t for t in today_trades if t.get("profit", 0) > 0])
     losses = len([t for t in today_trades if t.get("profit", 0) < 0])
 
-    # Get major assets from Capital.com
-    assets = api.get_assets()
-    major_assets = [a for a in assets if a.get("symbol") in ["EURUSD", "GBPUSD", "USDJPY", "BTCUSD", "ETHUSD", "GOLD"]]
-    if not major_assets:  # fallback to first 6 if none found
-        major_assets = assets[:6]
+    # Major assets from the instrument catalogue (crawled only if none is stored yet)
+    await instrument_catalogue.ensure(api)
+    major_assets = instrument_catalogue.majors()
 
     # Analytics for each asset: percent change, volatility, RSI
+    symbols = [asset["symbol"] for asset in major_assets]
+    # Served from the local candle store; the sync only requests bars we do not have yet
+    sync_errors = await candle_sync.sync(api, symbols, "HOUR", lane=REPORTS)
+    for symbol, error in sync_errors.items():
+        if error:
+            print(f"Error fetching prices for {symbol}:", error)
+    histories = await run_in_threadpool(candle_store.window, symbols, "HOUR", 24)
+    # One vectorized pass over the (asset x bar) close matrix
+    percent_changes = get_percentage_changes(histories.close)
+    volatilities = volatility(histories.close) * 100
+    rsis = last_valid(rsi(histories.close))
     assets_report = []
-    for asset in major_assets:
-        symbol = asset["symbol"]
-        try:
-            prices = api.get_price_history(symbol, period="1d", interval="1h")
-            close_prices = [c["close"] for c in prices if isinstance(c, dict) and "close" in c]
-        except Exception as e:
-            print(f"Error fetching prices for {symbol}:", e)
-            close_prices = []
-        percent_change = get_percentage_change(close_prices)
-        volatility = get_volatility(close_prices)
-        rsi = get_rsi(close_prices)
+    for row, asset in enumerate(major_assets):
+        percent_change, vol, asset_rsi = percent_changes[row], volatilities[row], rsis[row]
         assets_report.append({
-            "symbol": symbol,
+            "symbol": asset["symbol"],
             "name": asset.get("name"),
-            "percent_change": round(percent_change, 3) if percent_change is not None else None,
-            "volatility": round(volatility, 3) if volatility is not None else None,
-            "rsi": round(rsi, 2) if rsi is not None else None,
+            "percent_change": round(float(percent_change), 3) if not np.isnan(percent_change) else None,
+            "volatility": round(float(vol), 3) if not np.isnan(vol) else None,
+            "rsi": round(float(asset_rsi), 2) if not np.isnan(asset_rsi) else None,
         })
 
     # Assets to Watch: top 3 by abs(% change) or RSI out of range
@@ -124,7 +108,7 @@ def daily_report(user: User = Depends(get_current_user)):
         trends.append("Most major assets are flat today.")
     market_insights = " | ".join(trends)
 
-    return {
+    report = {
         "date": today.isoformat(),
         "num_trades": len(today_trades),
         "total_profit": round(total_profit, 2),
@@ -133,4 +117,6 @@ def daily_report(user: User = Depends(get_current_user)):
         "trades": today_trades,
         "market_insights": market_insights,
         "assets_to_watch": assets_to_watch
-    }
\ No newline at end of file
+    }
+    await run_in_threadpool(db.save_report_snapshot, user.username, today.isoformat(), report)
+    return report
\ No newline at end of file
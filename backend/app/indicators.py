@@ -0,0 +1,444 @@
+import numpy as np
+
+# Technical indicators over price matrices (assets x bars), e.g. the close
+# matrix of a PriceHistories. Rows may have different lengths or gaps (NaN
+# from align_columns): each row is packed to its valid bars, computed, and
+# scattered back, so a missing bar is skipped instead of poisoning the rest
+# of the series. Outputs have the input's shape, NaN where undefined.
+# 1-D inputs are treated as a single row and return 1-D outputs.
+
+# Rolling sums are re-anchored every ROLLING_BLOCK bars to keep the
+# cumulative sums small and the variances accurate over long histories.
+ROLLING_BLOCK = 512
+
+
+def _as_matrix(x):
+    x = np.asarray(x, dtype=float)
+    return x[None, :] if x.ndim == 1 else x
+
+
+def _like(result, x):
+    return result[0] if np.ndim(x) == 1 else result
+
+
+def pack(x, valid=None):
+    # Left-justifies each row's valid values; returns (packed, index) where
+    # index is (rows, columns): the rows that had to move and, for each, the
+    # packed column of every bar. Rows whose valid bars already come first
+    # (full histories, trailing padding) are left in place, so aligned
+    # matrices pay for the rows with gaps only. index is None when no row moves.
+    x = _as_matrix(x)
+    if valid is None:
+        valid = ~np.isnan(x)
+    elif not valid.all():
+        x = np.where(valid, x, np.nan)
+    rows = np.flatnonzero((valid[:, 1:] & ~valid[:, :-1]).any(axis=1))
+    if not len(rows):
+        return x, None
+    valid = valid[rows]
+    counts = valid.sum(axis=1)
+    columns = np.where(valid, np.cumsum(valid, axis=1) - 1, counts[:, None] + np.cumsum(~valid, axis=1) - 1)
+    moved = np.empty((len(rows), x.shape[1]))
+    np.put_along_axis(moved, columns, np.where(valid, x[rows], np.nan), axis=1)
+    packed = x.copy()
+    packed[rows] = moved
+    return packed, (rows, columns)
+
+
+def unpack(packed, index, copy=True):
+    # copy=False moves the rows in place, for series nothing else refers to
+    if index is None:
+        return packed
+    rows, columns = index
+    out = packed.copy() if copy else packed
+    out[rows] = np.take_along_axis(packed[rows], columns, axis=1)
+    return out
+
+
+def _pack_like(index, *arrays):
+    # Packs companion arrays (high/low) with the index of the close matrix
+    packed = []
+    for x in arrays:
+        x = _as_matrix(x)
+        if index is not None:
+            rows, columns = index
+            moved = np.empty((len(rows), x.shape[1]))
+            np.put_along_axis(moved, columns, x[rows], axis=1)
+            x = x.copy()
+            x[rows] = moved
+        packed.append(x)
+    return packed
+
+
+def first_valid(x):
+    # First non-NaN value of each row, NaN for empty rows
+    x = _as_matrix(x)
+    if not x.shape[1]:
+        return np.full(x.shape[0], np.nan)
+    valid = ~np.isnan(x)
+    values = x[np.arange(x.shape[0]), np.argmax(valid, axis=1)]
+    return np.where(valid.any(axis=1), values, np.nan)
+
+
+def last_valid(x):
+    # Last non-NaN value of each row, NaN for empty rows
+    x = _as_matrix(x)
+    if not x.shape[1]:
+        return np.full(x.shape[0], np.nan)
+    valid = ~np.isnan(x)
+    values = x[np.arange(x.shape[0]), x.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)]
+    return np.where(valid.any(axis=1), values, np.nan)
+
+
+def _rolling_mean_std(packed, period, ddof=0):
+    rows, n = packed.shape
+    mean = np.full((rows, n), np.nan)
+    std = np.full((rows, n), np.nan)
+    missing = np.isnan(packed)
+    filled = np.where(missing, 0.0, packed) if missing.any() else packed
+    for start in range(period - 1, n, ROLLING_BLOCK):
+        stop = min(n, start + ROLLING_BLOCK)
+        segment = filled[:, start - period + 1:stop]
+        ref = segment[:, period - 1:period]
+        d = segment - ref
+        zero = np.zeros((rows, 1))
+        c1 = np.concatenate([zero, np.cumsum(d, axis=1)], axis=1)
+        c2 = np.concatenate([zero, np.cumsum(d * d, axis=1)], axis=1)
+        s1 = c1[:, period:] - c1[:, :-period]
+        s2 = c2[:, period:] - c2[:, :-period]
+        m = s1 / period
+        var = np.maximum(s2 / period - m * m, 0.0)
+        if ddof:
+            var *= period / (period - ddof) if period > ddof else np.nan
+        mean[:, start:stop] = m + ref
+        std[:, start:stop] = np.sqrt(var)
+    # Trailing padding of shorter rows
+    mean[missing] = np.nan
+    std[missing] = np.nan
+    return mean, std
+
+
+def _smooth(packed, alpha, first, period):
+    # Exponential smoothing along the bars, seeded with the mean of the first
+    # `period` values from column `first`. alpha/first/period are per row so
+    # several indicators can share one pass over the bars.
+    rows, n = packed.shape
+    alpha = np.broadcast_to(np.asarray(alpha, dtype=float), (rows,))
+    first = np.broadcast_to(np.asarray(first, dtype=np.int64), (rows,))
+    period = np.broadcast_to(np.asarray(period, dtype=np.int64), (rows,))
+    seed_at = first + period - 1
+    if not rows or not n:
+        return np.full((rows, n), np.nan)
+    head = packed[:, :min(n, int(seed_at.max()) + 1)]
+    cums = np.concatenate([np.zeros((rows, 1)), np.cumsum(np.where(np.isnan(head), 0.0, head), axis=1)], axis=1)
+    # Rows long enough to seed, grouped by the bar their seed lands on
+    seeded = np.flatnonzero(seed_at < n)
+    seeded = seeded[~np.isnan(packed[seeded, seed_at[seeded]])]
+    if not len(seeded):
+        return np.full((rows, n), np.nan)
+    seed_values = np.full(rows, np.nan)
+    seed_values[seeded] = (cums[seeded, seed_at[seeded] + 1] - cums[seeded, first[seeded]]) / period[seeded]
+    if (alpha == alpha[0]).all():
+        alpha = float(alpha[0])
+    # out[t] = keep * out[t - 1] + alpha * x[t], run in place on alpha * x with
+    # the seed written at each row's seed bar and zeros before it
+    out = np.ascontiguousarray((packed * (alpha if np.ndim(alpha) == 0 else alpha[:, None])).T)
+    keep = 1.0 - alpha
+    start = int(seed_at[seeded].min())
+    stop = int(seed_at[seeded].max()) + 1
+    before = np.arange(stop)[:, None] < seed_at[None, :]
+    out[:stop][before] = 0.0
+    out[seed_at[seeded], seeded] = seed_values[seeded]
+    step = np.empty(rows)
+    for t in range(start + 1, n):
+        np.multiply(out[t - 1], keep, out=step)
+        out[t] += step
+    out[:stop][before] = np.nan
+    unseeded = np.ones(rows, dtype=bool)
+    unseeded[seeded] = False
+    out[:, unseeded] = np.nan
+    return out.T
+
+
+def _rsi_from(avg_gain, avg_loss):
+    # 100 - 100 / (1 + gain / loss), written so a zero loss needs no special case
+    total = avg_gain + avg_loss
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100.0 * avg_gain / total
+    rsi[total == 0] = 50.0
+    return rsi
+
+
+def _diff(packed):
+    if not packed.shape[1]:
+        return packed.copy()
+    return np.concatenate([np.full((packed.shape[0], 1), np.nan), np.diff(packed, axis=1)], axis=1)
+
+
+def _true_range(high, low, close):
+    if not close.shape[1]:
+        return close.copy()
+    prev = np.concatenate([np.full((close.shape[0], 1), np.nan), close[:, :-1]], axis=1)
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev), np.abs(low - prev)))
+    tr[:, 0] = high[:, 0] - low[:, 0]
+    tr[np.isnan(close)] = np.nan
+    return tr
+
+
+def sma(x, period=20):
+    packed, index = pack(x)
+    return _like(unpack(_rolling_mean_std(packed, period)[0], index), x)
+
+
+def ema(x, period=20):
+    packed, index = pack(x)
+    return _like(unpack(_smooth(packed, 2.0 / (period + 1), 0, period), index), x)
+
+
+def wilder(x, period=14):
+    packed, index = pack(x)
+    return _like(unpack(_smooth(packed, 1.0 / period, 0, period), index), x)
+
+
+def rsi(close, period=14):
+    packed, index = pack(close)
+    d = _diff(packed)
+    smoothed = _smooth(np.vstack([np.maximum(d, 0), np.maximum(-d, 0)]), 1.0 / period, 1, period)
+    rows = packed.shape[0]
+    return _like(unpack(_rsi_from(smoothed[:rows], smoothed[rows:]), index), close)
+
+
+def atr(high, low, close, period=14):
+    packed, index = pack(close)
+    tr = _true_range(*_pack_like(index, high, low), packed)
+    return _like(unpack(_smooth(tr, 1.0 / period, 0, period), index), close)
+
+
+def bollinger(close, period=20, k=2.0):
+    # (middle, upper, lower) with the population std, as in the usual definition
+    packed, index = pack(close)
+    mid, std = _rolling_mean_std(packed, period)
+    return tuple(_like(unpack(band, index), close) for band in (mid, mid + k * std, mid - k * std))
+
+
+def log_returns(close):
+    packed, index = pack(close)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return _like(unpack(_diff(np.log(packed)), index), close)
+
+
+def _returns(packed):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return _diff(np.log(packed))
+
+
+def _rolling_returns_std(returns, period):
+    # Packed returns start with a NaN column; the window starts right after it
+    std = np.full(returns.shape, np.nan)
+    std[:, 1:] = _rolling_mean_std(returns[:, 1:], period, ddof=1)[1]
+    return std
+
+
+def volatility(close, period=None):
+    # Sample std of log returns: rolling series for a period, else one value per row
+    packed, index = pack(close)
+    returns = _returns(packed)
+    if period is not None:
+        return _like(unpack(_rolling_returns_std(returns, period), index), close)
+    valid = ~np.isnan(returns)
+    counts = valid.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(valid, returns, 0.0).sum(axis=1) / counts
+        var = np.where(valid, (returns - mean[:, None]) ** 2, 0.0).sum(axis=1) / (counts - 1)
+    result = np.where(counts > 1, np.sqrt(var), np.nan)
+    return result[0] if np.ndim(close) == 1 else result
+
+
+def zscore(x, period=20):
+    packed, index = pack(x)
+    mean, std = _rolling_mean_std(packed, period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(std > 0, (packed - mean) / std, np.nan)
+    return _like(unpack(z, index), x)
+
+
+def compute_indicators(close, high=None, low=None, ema_periods=(12, 26), sma_periods=(20,), rsi_period=14,
+                       atr_period=14, bb_period=20, bb_k=2.0, vol_period=20, z_period=20):
+    # All indicators in one pass: the close matrix is packed once, every
+    # recursive series (EMAs, RSI gains/losses, ATR) is smoothed in the same
+    # loop over the bars and rolling windows are shared between indicators.
+    packed, index = pack(close)
+    rows = packed.shape[0]
+    d = _diff(packed)
+    blocks = [(packed, 2.0 / (p + 1), 0, p) for p in ema_periods]
+    blocks.append((np.vstack([np.maximum(d, 0), np.maximum(-d, 0)]), 1.0 / rsi_period, 1, rsi_period))
+    with_atr = high is not None and low is not None
+    if with_atr:
+        blocks.append((_true_range(*_pack_like(index, high, low), packed), 1.0 / atr_period, 0, atr_period))
+    smoothed = _smooth(
+        np.vstack([b[0] for b in blocks]),
+        np.concatenate([np.full(len(b[0]), b[1]) for b in blocks]),
+        np.concatenate([np.full(len(b[0]), b[2]) for b in blocks]),
+        np.concatenate([np.full(len(b[0]), b[3]) for b in blocks]),
+    )
+
+    result = {}
+    offset = 0
+    for p in ema_periods:
+        result[f"ema_{p}"] = smoothed[offset:offset + rows]
+        offset += rows
+    result["rsi"] = _rsi_from(smoothed[offset:offset + rows], smoothed[offset + rows:offset + 2 * rows])
+    offset += 2 * rows
+    if with_atr:
+        result["atr"] = smoothed[offset:offset + rows]
+    windows = {}
+
+    def rolling(period):
+        if period not in windows:
+            windows[period] = _rolling_mean_std(packed, period)
+        return windows[period]
+
+    for p in sma_periods:
+        result[f"sma_{p}"] = rolling(p)[0]
+    mid, std = rolling(bb_period)
+    result["bb_mid"], result["bb_upper"], result["bb_lower"] = mid, mid + bb_k * std, mid - bb_k * std
+    z_mean, z_std = rolling(z_period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result["zscore"] = np.where(z_std > 0, (packed - z_mean) / z_std, np.nan)
+    result["volatility"] = _rolling_returns_std(_returns(packed), vol_period)
+    # Every series is fresh, so rows move in place; a series shared by two
+    # names (sma_20 and bb_mid) is moved once
+    unpacked = {}
+    for name, series in result.items():
+        if id(series) not in unpacked:
+            unpacked[id(series)] = _like(unpack(series, index, copy=False), close)
+        result[name] = unpacked[id(series)]
+    return result
+
+
+def _rolling_max(packed, window):
+    # Max over packed[t - window + 1 .. t] for every t (van Herk / Gil-Werman):
+    # block prefix and suffix maxima make it O(bars) whatever the window
+    rows, n = packed.shape
+    result = np.full(packed.shape, np.nan)
+    if window < 1 or n < window:
+        return result
+    blocks = -(-n // window)
+    padded = np.full((rows, blocks * window), -np.inf)
+    padded[:, :n] = packed
+    shaped = padded.reshape(rows, blocks, window)
+    prefix = np.maximum.accumulate(shaped, axis=2).reshape(rows, -1)
+    suffix = np.maximum.accumulate(shaped[:, :, ::-1], axis=2)[:, :, ::-1].reshape(rows, -1)
+    result[:, window - 1:] = np.maximum(suffix[:, :n - window + 1], prefix[:, window - 1:n])
+    return result
+
+
+class IndicatorCache:
+    # Packs a close matrix once and memoizes indicator series in packed
+    # space, so strategies scoring the same matrix share EMAs, RSI and
+    # rolling windows instead of recomputing them. latest() reads the last
+    # valid value of each row, latest(series, n) the value n bars earlier.
+    def __init__(self, close):
+        self.close = _as_matrix(close)
+        self.packed, self.index = pack(self.close)
+        self.counts = np.sum(~np.isnan(self.packed), axis=1)
+        self._rows = np.arange(self.packed.shape[0])
+        self._series = {}
+
+    def _memo(self, key, compute):
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = compute()
+        return series
+
+    def latest(self, series=None, bars_back=0):
+        series = self.packed if series is None else series
+        idx = self.counts - 1 - bars_back
+        ok = idx >= 0
+        values = np.full(len(idx), np.nan)
+        values[ok] = series[self._rows[ok], idx[ok]]
+        return values
+
+    def unpack(self, series):
+        return unpack(series, self.index)
+
+    def ema(self, period):
+        return self._memo(("ema", period), lambda: _smooth(self.packed, 2.0 / (period + 1), 0, period))
+
+    def rolling(self, period):
+        return self._memo(("rolling", period), lambda: _rolling_mean_std(self.packed, period))
+
+    def sma(self, period):
+        return self.rolling(period)[0]
+
+    def latest_rolling(self, period):
+        # (mean, std) of each row's last `period` values only, for features
+        # that need the latest bar and not the whole rolling series
+        def compute():
+            ok = self.counts >= period
+            columns = np.maximum(self.counts[:, None] - period + np.arange(period)[None, :], 0)
+            window = self.packed[self._rows[:, None], columns]
+            mean, std = window.mean(axis=1), window.std(axis=1)
+            return np.where(ok, mean, np.nan), np.where(ok, std, np.nan)
+        return self._memo(("latest_rolling", period), compute)
+
+    def bollinger(self, period=20, k=2.0):
+        mid, std = self.rolling(period)
+        return mid, mid + k * std, mid - k * std
+
+    def zscore(self, period=20):
+        def compute():
+            mean, std = self.rolling(period)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return np.where(std > 0, (self.packed - mean) / std, np.nan)
+        return self._memo(("zscore", period), compute)
+
+    def rsi(self, period=14):
+        def compute():
+            d = _diff(self.packed)
+            smoothed = _smooth(np.vstack([np.maximum(d, 0), np.maximum(-d, 0)]), 1.0 / period, 1, period)
+            rows = self.packed.shape[0]
+            return _rsi_from(smoothed[:rows], smoothed[rows:])
+        return self._memo(("rsi", period), compute)
+
+    def macd(self, fast=12, slow=26, signal=9):
+        # (macd line, signal line); the line starts at the slow EMA's first value
+        def compute():
+            line = self.ema(fast) - self.ema(slow)
+            return line, _smooth(line, 2.0 / (signal + 1), slow - 1, signal)
+        return self._memo(("macd", fast, slow, signal), compute)
+
+    def extremes(self, window):
+        # Highest/lowest close over the `window` bars before the latest one
+        def compute():
+            cols = np.arange(self.packed.shape[1])
+            last = (self.counts - 1)[:, None]
+            in_window = (cols >= last - window) & (cols < last)
+            enough = self.counts > window
+            highs = np.max(np.where(in_window, self.packed, -np.inf), axis=1, initial=-np.inf)
+            lows = np.min(np.where(in_window, self.packed, np.inf), axis=1, initial=np.inf)
+            return np.where(enough, highs, np.nan), np.where(enough, lows, np.nan)
+        return self._memo(("extremes", window), compute)
+
+    def lagged(self, bars):
+        # The close `bars` bars earlier, for every bar
+        def compute():
+            shifted = np.full(self.packed.shape, np.nan)
+            if bars < self.packed.shape[1]:
+                shifted[:, bars:] = self.packed[:, :self.packed.shape[1] - bars]
+            return shifted
+        return self._memo(("lagged", bars), compute)
+
+    def channel(self, window):
+        # extremes() for every bar: highest/lowest close of the `window` bars before it
+        def compute():
+            highs = np.full(self.packed.shape, np.nan)
+            lows = np.full(self.packed.shape, np.nan)
+            highs[:, 1:] = _rolling_max(self.packed, window)[:, :-1]
+            lows[:, 1:] = -_rolling_max(-self.packed, window)[:, :-1]
+            return highs, lows
+        return self._memo(("channel", window), compute)
+
+
+def indicator_cache(matrix):
+    return matrix if isinstance(matrix, IndicatorCache) else IndicatorCache(matrix)
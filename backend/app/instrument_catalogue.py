@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from fastapi.concurrency import run_in_threadpool
+from .storage import db
+
+# The broker's instrument universe, crawled from the market navigation tree,
+# kept in the database and indexed in memory by epic, symbol, type and
+# market status. Refreshes diff the crawl against what is stored, so only
+# changed instruments are written and the catalogue version (and the /assets
+# ETag) only moves when something changed.
+CATALOGUE_REFRESH_INTERVAL = float(os.getenv("CATALOGUE_REFRESH_INTERVAL", "86400"))
+CATALOGUE_POLL_INTERVAL = float(os.getenv("CATALOGUE_POLL_INTERVAL", "300"))
+CATALOGUE_CONCURRENCY = int(os.getenv("CATALOGUE_CONCURRENCY", "4"))
+CATALOGUE_MAJORS = [s for s in os.getenv("CATALOGUE_MAJORS", "EURUSD,GBPUSD,USDJPY,BTCUSD,ETHUSD,GOLD").split(",") if s]
+
+# Quotes move on every crawl; they are not part of the catalogue
+INSTRUMENT_FIELDS = ("epic", "symbol", "name", "type", "status")
+
+
+def _digest(instruments):
+    payload = json.dumps([instruments[epic] for epic in sorted(instruments)], sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class InstrumentCatalogue:
+    def __init__(self, database=db, concurrency=CATALOGUE_CONCURRENCY):
+        self.db = database
+        self.concurrency = concurrency
+        self.instruments = {}
+        self.by_symbol = {}
+        # type / status -> {epic: instrument}
+        self.by_type = {}
+        self.by_status = {}
+        self.digest = _digest({})
+        self.version = 0
+        self.refreshed_at = None
+        self._loaded = False
+        self._refreshing = None
+        self._task = None
+        # (version, key) -> serialized response, see assets.get_assets
+        self.responses = {}
+        # Called as listener(instruments) after every change to the index
+        self.listeners = []
+        self.stats = {"refreshes": 0, "requests": 0, "added": 0, "changed": 0, "removed": 0, "errors": 0}
+
+    def _index(self, instruments):
+        by_symbol, by_type, by_status = {}, {}, {}
+        for epic, inst in instruments.items():
+            by_symbol[inst["symbol"]] = inst
+            by_type.setdefault(inst["type"], {})[epic] = inst
+            by_status.setdefault(inst["status"], {})[epic] = inst
+        # Swapped in together so readers never see a half-built index
+        self.instruments, self.by_symbol, self.by_type, self.by_status = instruments, by_symbol, by_type, by_status
+        self.digest = _digest(instruments)
+        self.version += 1
+        self.responses = {}
+        for listener in self.listeners:
+            try:
+                listener(instruments)
+            except Exception as e:
+                print("Instrument catalogue listener error:", e)
+
+    def load(self):
+        # Blocking: the stored catalogue, once per process
+        if self._loaded:
+            return
+        stored, refreshed_at = self.db.instruments()
+        self._loaded = True
+        if stored:
+            self._index({inst["epic"]: inst for inst in stored})
+            self.refreshed_at = refreshed_at
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def get(self, epic):
+        return self.instruments.get(epic)
+
+    def find(self, symbol):
+        return self.by_symbol.get(symbol)
+
+    def select(self, type=None, status=None):
+        # Instruments matching both filters, from the smaller index
+        if type is None and status is None:
+            return list(self.instruments.values())
+        if type is None:
+            return list(self.by_status.get(status, {}).values())
+        of_type = self.by_type.get(type, {})
+        if status is None:
+            return list(of_type.values())
+        with_status = self.by_status.get(status, {})
+        small, other = (of_type, with_status) if len(of_type) <= len(with_status) else (with_status, of_type)
+        return [inst for epic, inst in small.items() if epic in other]
+
+    def majors(self, symbols=CATALOGUE_MAJORS):
+        found = [self.by_symbol[s] for s in symbols if s in self.by_symbol]
+        # Fall back to the first instruments when none of the majors are listed
+        return found or list(self.instruments.values())[:len(symbols)]
+
+    async def crawl(self, api):
+        # Walks the navigation tree breadth-first; an instrument listed under
+        # several nodes is kept once. Returns (instruments, complete)
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+        instruments, seen = {}, set()
+        complete = True
+
+        async def fetch(node_id):
+            async with semaphore:
+                self.stats["requests"] += 1
+                return await api.get_market_navigation(node_id)
+
+        level = [None]
+        while level:
+            pages = await asyncio.gather(*(fetch(node_id) for node_id in level))
+            level = []
+            for page in pages:
+                if "error" in page:
+                    complete = False
+                    continue
+                for market in page["markets"]:
+                    if market.get("epic"):
+                        instruments.setdefault(market["epic"], {f: market.get(f) or "" for f in INSTRUMENT_FIELDS})
+                for node in page["nodes"]:
+                    if node["id"] and node["id"] not in seen:
+                        seen.add(node["id"])
+                        level.append(node["id"])
+        return instruments, complete and bool(seen)
+
+    async def refresh(self, api):
+        # One crawl at a time; concurrent callers wait for the running one
+        if self._refreshing is not None and not self._refreshing.done():
+            return await asyncio.shield(self._refreshing)
+        self._refreshing = asyncio.ensure_future(self._refresh(api))
+        return await asyncio.shield(self._refreshing)
+
+    async def _refresh(self, api):
+        await run_in_threadpool(self.load)
+        crawled, complete = await self.crawl(api)
+        if not crawled:
+            self.stats["errors"] += 1
+            return {"error": "Market navigation returned no instruments"}
+        current = self.instruments
+        added = [inst for epic, inst in crawled.items() if epic not in current]
+        changed = [inst for epic, inst in crawled.items() if epic in current and current[epic] != inst]
+        # A partial crawl cannot tell a delisted instrument from an unvisited node
+        removed = [epic for epic in current if epic not in crawled] if complete else []
+        now = time.time()
+        await run_in_threadpool(self.db.save_instruments, added + changed, removed, now)
+        if added or changed or removed:
+            instruments = {epic: inst for epic, inst in current.items() if epic not in removed}
+            instruments.update(crawled)
+            self._index(instruments)
+        self.refreshed_at = now
+        self.stats["refreshes"] += 1
+        self.stats["added"] += len(added)
+        self.stats["changed"] += len(changed)
+        self.stats["removed"] += len(removed)
+        return {"added": len(added), "changed": len(changed), "removed": len(removed), "complete": complete}
+
+    async def ensure(self, api):
+        # Loads the stored catalogue, crawling only when there is none yet
+        if not self._loaded:
+            await run_in_threadpool(self.load)
+        if not self.instruments:
+            await self.refresh(api)
+
+    async def _refresh_loop(self, client_provider):
+        while True:
+            try:
+                await run_in_threadpool(self.load)
+                if self.refreshed_at is None or time.time() - self.refreshed_at >= CATALOGUE_REFRESH_INTERVAL:
+                    result = await self.refresh(client_provider())
+                    if "error" in result:
+                        print("Instrument catalogue refresh error:", result["error"])
+            except Exception as e:
+                self.stats["errors"] += 1
+                print("Instrument catalogue refresh error:", e)
+            await asyncio.sleep(CATALOGUE_POLL_INTERVAL)
+
+    def start(self, client_provider):
+        # client_provider() -> AsyncCapitalComAPI, raising if there is no live session
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop(client_provider))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self):
+        return {**self.stats, "instruments": len(self.instruments), "version": self.version,
+                "refreshed_at": self.refreshed_at}
+
+
+instrument_catalogue = InstrumentCatalogue()
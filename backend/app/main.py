@@ -1,11 +1,32 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .auth import authenticate_user, create_access_token, upsert_user, get_current_user, get_password_hash
+from fastapi.concurrency import run_in_threadpool
+from .auth import (
+    authenticate_user_async, create_access_token, get_password_hash_async, upsert_user, get_current_user, token_cache,
+)
+from .password_hashing import password_hasher
 from .models import User
-from .capitalcom_api import CapitalComAPI
+from .capitalcom_api import AsyncCapitalComAPI
+from .broker_transport import transport_stats, close_all as close_broker_sessions, aclose_all as aclose_broker_clients
+from .broker_sessions import broker_sessions, get_broker_api
+from .rate_limiter import limiter_stats
+from .resilience import resilience_stats
+from .quote_stream import quote_stream
+from .streaming_indicators import live_indicators
+from .risk_engine import risk_engine
+from .storage import db, DatabaseBusy
 from .schemas import SignupRequest, LoginRequest, Login2FARequest, TradeRequest
 from .daily_report import router as daily_report_router
-from .risk_settings import router as risk_settings_router
+from .risk_settings import router as risk_settings_router, risk_settings_store
+from .signals import router as signals_router, live_signals
+from .signal_pool import signal_pool
+from .analytics import router as analytics_router, backtest_cache
+from .signal_tracker import signal_tracker
+from .dynamic_asset_scan import router as dynamic_assets_router
+from .volatility_scanner import volatility_scanner
+from .assets import router as assets_router
+from .instrument_catalogue import instrument_catalogue
 
 app = FastAPI()
 
@@ -17,44 +38,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(DatabaseBusy)
+async def database_busy(request: Request, exc: DatabaseBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+def start_market_feeds(streaming_host):
+    # One market-data stream, scanner and catalogue per process. Each resolves
+    # whichever broker session is live when it connects or refreshes, so they
+    # carry on through another user's session when the one they used is gone
+    if streaming_host:
+        quote_stream.start(broker_sessions.stream_session)
+    volatility_scanner.start(broker_sessions.shared_async_client)
+    instrument_catalogue.start(broker_sessions.shared_async_client)
+
 @app.post("/signup")
-def signup(req: SignupRequest):
+async def signup(req: SignupRequest):
     user = User(
         username=req.username,
-        password=get_password_hash(req.password),
+        password=await get_password_hash_async(req.password),
         api_key=req.api_key,
         api_key_password=req.api_key_password,
         use_demo=req.use_demo,
     )
-    upsert_user(user)
+    await run_in_threadpool(upsert_user, user)
     return {"msg": "User created"}
 
 @app.post("/login")
-def login(req: LoginRequest):
-    print("Login request data:", req.dict())
-    user = authenticate_user(req.username, req.password)
+async def login(req: LoginRequest):
+    user = await authenticate_user_async(req.username, req.password)
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
-    print("Sending to CapitalComAPI:", {
-        "identifier": req.username,
-        "password": req.password,
-        "api_key": req.api_key,
-        "demo": req.use_demo,
-    })
-    api = CapitalComAPI(
+    api = AsyncCapitalComAPI(
         identifier=req.username,
         password=req.password,
         api_key=req.api_key,
         demo=req.use_demo,
     )
-    login_result = api.login()
-    print("CapitalComAPI login_result:", login_result)
+    login_result = await api.login()
     if login_result.get("2fa_required"):
         user.api_key = req.api_key
         user.api_key_password = req.api_key_password
         user.use_demo = req.use_demo
         user.temp_cc_login_data = api.get_login_context()
-        upsert_user(user)
+        await run_in_threadpool(upsert_user, user)
         return {"2fa_required": True}
     elif not login_result.get("success"):
         raise HTTPException(
@@ -76,12 +102,15 @@ def login(req: LoginRequest):
             "hasActiveLiveAccounts": login_result.get("hasActiveLiveAccounts"),
             "trailingStopsEnabled": login_result.get("trailingStopsEnabled"),
         }
+        broker_sessions.register(user.username, api, password=req.password,
+                                 streaming_host=login_result.get("streamingHost"))
+        start_market_feeds(login_result.get("streamingHost"))
         token = create_access_token(user.username)
         user.api_key = req.api_key
         user.api_key_password = req.api_key_password
         user.use_demo = req.use_demo
         user.account_info = account_info
-        upsert_user(user)
+        await run_in_threadpool(upsert_user, user)
         return {
             "access_token": token,
             "token_type": "bearer",
@@ -89,21 +118,21 @@ def login(req: LoginRequest):
         }
 
 @app.post("/login-2fa")
-def login_2fa(req: Login2FARequest):
-    user = authenticate_user(req.username, req.password)
+async def login_2fa(req: Login2FARequest):
+    user = await authenticate_user_async(req.username, req.password)
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
     login_context = getattr(user, "temp_cc_login_data", None)
     if not login_context:
         raise HTTPException(status_code=400, detail="2FA context missing. Please login again.")
-    api = CapitalComAPI(
+    api = AsyncCapitalComAPI(
         identifier=req.username,
         password=req.password,
         api_key=req.api_key,
         demo=req.use_demo,
         login_context=login_context
     )
-    login_result = api.login(otp=req.otp)
+    login_result = await api.login(otp=req.otp)
     if not login_result.get("success"):
         raise HTTPException(status_code=401, detail=login_result.get("error", "2FA failed."))
     else:
@@ -121,9 +150,12 @@ def login_2fa(req: Login2FARequest):
             "hasActiveLiveAccounts": login_result.get("hasActiveLiveAccounts"),
             "trailingStopsEnabled": login_result.get("trailingStopsEnabled"),
         }
+        broker_sessions.register(user.username, api, password=req.password,
+                                 streaming_host=login_result.get("streamingHost"))
+        start_market_feeds(login_result.get("streamingHost"))
         user.account_info = account_info
         user.temp_cc_login_data = None
-        upsert_user(user)
+        await run_in_threadpool(upsert_user, user)
         token = create_access_token(user.username)
         return {
             "access_token": token,
@@ -132,31 +164,111 @@ def login_2fa(req: Login2FARequest):
         }
 
 @app.get("/account")
-def get_account(user: User = Depends(get_current_user)):
+async def get_account(user: User = Depends(get_current_user)):
     if user.account_info:
         return user.account_info
     else:
         raise HTTPException(status_code=404, detail="No account info available. Please log in again.")
 
 @app.post("/trade")
-def place_trade(req: TradeRequest, user: User = Depends(get_current_user)):
-    api = CapitalComAPI(
-        identifier=user.username,
-        password=user.password,
-        api_key=user.api_key,
-        demo=user.use_demo
-    )
-    return api.place_trade(req.symbol, req.side, req.amount, req.take_profit, req.stop_loss)
+async def place_trade(req: TradeRequest, user: User = Depends(get_current_user),
+                      api: AsyncCapitalComAPI = Depends(get_broker_api)):
+    price = None
+    if risk_engine.needs_price(user, req.symbol, req.side, req.amount):
+        # No streamed quote for this epic: size the order against the latest minute close
+        candles = await api.get_price_history(req.symbol, "MINUTE", 1)
+        price = candles[-1]["close"] if candles else None
+    rejection, kind = risk_engine.check(user, req.symbol, req.side, req.amount, req.stop_loss, price=price)
+    if rejection:
+        raise HTTPException(status_code=400, detail=f"Order rejected by risk check: {rejection}")
+    result = {"error": "Order not sent"}
+    try:
+        result = await api.place_trade(req.symbol, req.side, req.amount, req.take_profit, req.stop_loss)
+    finally:
+        risk_engine.settle(user.username, req.symbol, req.side, req.amount, result, kind)
+    await run_in_threadpool(db.record_trade, user.username, req.symbol, req.side.upper(), req.amount,
+                            req.take_profit, req.stop_loss, result)
+    return result
 
 @app.get("/trades")
-def get_trades(user: User = Depends(get_current_user)):
-    api = CapitalComAPI(
-        identifier=user.username,
-        password=user.password,
-        api_key=user.api_key,
-        demo=user.use_demo
-    )
-    return api.get_trades()
+async def get_trades(api: AsyncCapitalComAPI = Depends(get_broker_api)):
+    return await api.get_trades()
+
+@app.get("/risk/status")
+async def risk_status(user: User = Depends(get_current_user)):
+    return risk_engine.status(user)
+
+@app.get("/quotes")
+async def get_quotes(user: User = Depends(get_current_user)):
+    return quote_stream.snapshot()
+
+@app.get("/quotes/{epic}")
+async def get_quote(epic: str, user: User = Depends(get_current_user)):
+    quote = quote_stream.latest(epic)
+    if quote is None:
+        raise HTTPException(status_code=404, detail=f"No quote for {epic} yet")
+    return quote._asdict()
+
+@app.get("/quotes/{epic}/indicators")
+async def get_quote_indicators(epic: str, user: User = Depends(get_current_user)):
+    values = live_indicators.values(epic)
+    if values is None:
+        raise HTTPException(status_code=404, detail=f"No bars for {epic} yet")
+    return values
+
+@app.get("/auth/stats")
+async def auth_stats(user: User = Depends(get_current_user)):
+    return {"token_cache": token_cache.get_stats(), "password_hashing": password_hasher.get_stats()}
+
+@app.get("/broker/stats")
+async def broker_stats(user: User = Depends(get_current_user)):
+    return {
+        "transport": transport_stats(),
+        "sessions": broker_sessions.get_stats(),
+        "rate_limits": limiter_stats(),
+        "resilience": resilience_stats(),
+        "quote_stream": quote_stream.stats,
+        "risk_engine": risk_engine.get_stats(),
+        "risk_settings": risk_settings_store.get_stats(),
+        "live_signals": live_signals.get_stats(),
+        "signal_pool": signal_pool.get_stats(),
+        "backtests": backtest_cache.get_stats(),
+        "signal_tracker": signal_tracker.get_stats(),
+        "volatility_scanner": volatility_scanner.get_stats(),
+        "instruments": instrument_catalogue.get_stats(),
+    }
+
+@app.on_event("startup")
+async def start_broker_keepalive():
+    password_hasher.start()
+    signal_pool.start()
+    broker_sessions.start()
+    await run_in_threadpool(risk_settings_store.load)
+    risk_settings_store.start()
+    risk_engine.start(broker_sessions.async_client_for_username)
+    backtest_cache.start(broker_sessions.shared_async_client)
+    await run_in_threadpool(signal_tracker.load)
+    signal_tracker.start()
+    await run_in_threadpool(instrument_catalogue.load)
+
+@app.on_event("shutdown")
+async def shutdown_broker_transport():
+    broker_sessions.stop()
+    password_hasher.shutdown()
+    signal_pool.shutdown()
+    await quote_stream.stop()
+    await risk_engine.stop()
+    await risk_settings_store.stop()
+    await backtest_cache.stop()
+    await signal_tracker.stop()
+    await volatility_scanner.stop()
+    await instrument_catalogue.stop()
+    close_broker_sessions()
+    await aclose_broker_clients()
 
 app.include_router(daily_report_router)
-app.include_router(risk_settings_router)
\ No newline at end of file
+app.include_router(risk_settings_router)
+app.include_router(signals_router)
+app.include_router(analytics_router)
+app.include_router(dynamic_assets_router)
+app.include_router(assets_router)
\ No newline at end of file
@@ -0,0 +1,123 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from passlib.context import CryptContext
+
+# bcrypt runs in a small dedicated process pool so a login storm cannot
+# saturate the request threadpool or hold the GIL. Hashes made with a cost
+# other than BCRYPT_ROUNDS are rewritten on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_INFLIGHT = int(os.getenv("PASSWORD_HASH_MAX_INFLIGHT", str(PASSWORD_HASH_WORKERS * 2)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "500"))
+
+
+@lru_cache(maxsize=None)
+def build_context(rounds=BCRYPT_ROUNDS) -> CryptContext:
+    # min == max == default so any other cost is reported as needing an update
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+def _hash(password, rounds):
+    return build_context(rounds).hash(password)
+
+
+def _verify_and_update(password, hashed, rounds):
+    return build_context(rounds).verify_and_update(password, hashed)
+
+
+def _warm_up():
+    return True
+
+
+class HashingBusy(Exception):
+    # The hashing queue is full; auth maps this to a 503
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_inflight=PASSWORD_HASH_MAX_INFLIGHT,
+                 max_queue=PASSWORD_HASH_MAX_QUEUE, rounds=BCRYPT_ROUNDS):
+        self.workers = workers
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self._executor = None
+        self._semaphore = None
+        self.stats = {"queued": 0, "inflight": 0, "completed": 0, "rejected": 0, "rehashed": 0,
+                      "wait_total": 0.0, "wait_max": 0.0, "run_total": 0.0}
+
+    def start(self):
+        if self._executor is None:
+            # Spawned, not forked: the process already runs threads (broker
+            # keep-alive, DB pool) whose locks a forked child could inherit held
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            # Fork the workers now rather than on the first login
+            for _ in range(self.workers):
+                self._executor.submit(_warm_up)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self.stats["queued"] >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise HashingBusy("Too many login attempts in progress. Please retry shortly.")
+        self.start()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_inflight)
+        queued_at = time.perf_counter()
+        self.stats["queued"] += 1
+        waiting = True
+        try:
+            async with self._semaphore:
+                started = time.perf_counter()
+                waiting = False
+                self.stats["queued"] -= 1
+                self.stats["inflight"] += 1
+                waited = started - queued_at
+                self.stats["wait_total"] += waited
+                self.stats["wait_max"] = max(self.stats["wait_max"], waited)
+                try:
+                    return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+                finally:
+                    self.stats["inflight"] -= 1
+                    self.stats["completed"] += 1
+                    self.stats["run_total"] += time.perf_counter() - started
+        finally:
+            # Cancelled before reaching the pool
+            if waiting:
+                self.stats["queued"] -= 1
+
+    async def hash(self, password):
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password, hashed):
+        # Returns (ok, new_hash); new_hash is set when the stored cost is outdated
+        ok, new_hash = await self._run(_verify_and_update, password, hashed, self.rounds)
+        if ok and new_hash:
+            self.stats["rehashed"] += 1
+        return ok, new_hash
+
+    def get_stats(self):
+        done = self.stats["completed"]
+        return {
+            **self.stats,
+            "avg_wait": self.stats["wait_total"] / done if done else 0.0,
+            "avg_run": self.stats["run_total"] / done if done else 0.0,
+        }
+
+
+password_hasher = PasswordHasher()
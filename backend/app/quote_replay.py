@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import json
+import websockets
+
+# Local stand-in for the Capital.com streaming endpoint. Replays recorded
+# quote payloads (one JSON object per line, Capital.com "quote" payload
+# format: epic, bid, ofr, timestamp) to every client for the epics it
+# subscribed to. Usage:
+#   python -m app.quote_replay ticks.jsonl --port 8765 --speed 10
+# then point the stream at ws://localhost:8765/
+
+
+def load_ticks(path):
+    ticks = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                ticks.append(json.loads(line))
+    ticks.sort(key=lambda t: t["timestamp"])
+    return ticks
+
+
+def make_handler(ticks, speed=1.0, loop=False):
+    async def handler(ws, *args):
+        subscribed = set()
+        started = asyncio.Event()
+
+        async def replay():
+            await started.wait()
+            while True:
+                previous = None
+                for tick in ticks:
+                    if previous is not None and speed > 0:
+                        await asyncio.sleep(max(0, (tick["timestamp"] - previous) / 1000 / speed))
+                    previous = tick["timestamp"]
+                    if tick["epic"] in subscribed:
+                        await ws.send(json.dumps({"status": "OK", "destination": "quote", "payload": tick}))
+                if not loop:
+                    return
+
+        task = asyncio.create_task(replay())
+        try:
+            async for raw in ws:
+                message = json.loads(raw)
+                destination = message.get("destination")
+                if destination == "marketData.subscribe":
+                    epics = message.get("payload", {}).get("epics", [])
+                    subscribed.update(epics)
+                    await ws.send(json.dumps({
+                        "status": "OK",
+                        "destination": destination,
+                        "correlationId": message.get("correlationId"),
+                        "payload": {"subscriptions": {e: "PROCESSED" for e in epics}},
+                    }))
+                    started.set()
+                elif destination == "ping":
+                    await ws.send(json.dumps({
+                        "status": "OK", "destination": "ping", "correlationId": message.get("correlationId"),
+                    }))
+        finally:
+            task.cancel()
+
+    return handler
+
+
+async def serve(path, host="localhost", port=8765, speed=1.0, loop=False):
+    handler = make_handler(load_ticks(path), speed, loop)
+    async with websockets.serve(handler, host, port):
+        print(f"Replaying {path} on ws://{host}:{port}/")
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded Capital.com quotes over WebSocket")
+    parser.add_argument("ticks")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier, 0 = as fast as possible")
+    parser.add_argument("--loop", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(serve(args.ticks, args.host, args.port, args.speed, args.loop))
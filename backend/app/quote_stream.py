@@ -0,0 +1,203 @@
+import asyncio
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+import numpy as np
+import websockets
+from .candle_store import candle_store
+
+# Capital.com streaming API: quotes for up to 40 epics per subscription,
+# and the session has to be pinged at least every 10 minutes.
+QUOTE_WATCHLIST = [e for e in os.getenv("QUOTE_WATCHLIST", "EURUSD,GBPUSD,USDJPY,BTCUSD,ETHUSD,GOLD").split(",") if e]
+STREAM_PING_INTERVAL = float(os.getenv("STREAM_PING_INTERVAL", "300"))
+STREAM_RECONNECT_MIN = float(os.getenv("STREAM_RECONNECT_MIN", "1"))
+STREAM_RECONNECT_MAX = float(os.getenv("STREAM_RECONNECT_MAX", "30"))
+MAX_EPICS_PER_SUBSCRIPTION = 40
+
+
+class Quote(NamedTuple):
+    bid: float
+    ask: float
+    timestamp: int  # epoch milliseconds
+
+
+class BarBuilder:
+    # Rolling OHLC bar per epic, built from mid prices
+    __slots__ = ("seconds", "start", "open", "high", "low", "close", "ticks")
+
+    def __init__(self, seconds=60):
+        self.seconds = seconds
+        self.start = None
+        self.open = self.high = self.low = self.close = 0.0
+        self.ticks = 0
+
+    def update(self, price, timestamp_ms):
+        # Returns the completed bar when this tick opens a new one
+        bucket = (timestamp_ms // 1000) // self.seconds * self.seconds
+        finished = None
+        if self.start is not None and bucket > self.start:
+            finished = (self.start, self.open, self.high, self.low, self.close, self.ticks)
+            self.start = None
+        if self.start is None:
+            self.start = bucket
+            self.open = self.high = self.low = self.close = price
+            self.ticks = 1
+        elif bucket == self.start:
+            self.high = max(self.high, price)
+            self.low = min(self.low, price)
+            self.close = price
+            self.ticks += 1
+        return finished
+
+
+# Bars are written from one thread, off the event loop and in the order they completed
+_bar_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bar-writer")
+
+
+def _bar_written(future):
+    if future.exception() is not None:
+        print("Minute bar write error:", future.exception())
+
+
+def store_minute_bar(epic, bar):
+    start, open_, high, low, close, ticks = bar
+    future = _bar_writer.submit(candle_store.append, epic, "MINUTE", {
+        "time": np.array([start], dtype=np.int64),
+        "open": np.array([open_]),
+        "high": np.array([high]),
+        "low": np.array([low]),
+        "close": np.array([close]),
+        "volume": np.array([ticks], dtype=float),
+    })
+    future.add_done_callback(_bar_written)
+    return future
+
+
+class QuoteStream:
+    def __init__(self, epics=None, bar_seconds=60):
+        self.epics = list(epics or QUOTE_WATCHLIST)
+        self.bar_seconds = bar_seconds
+        # epic -> Quote; entries are replaced whole so readers never need a lock
+        self.quotes = {}
+        self.bars = {}
+        self.tick_listeners = []
+        self.bar_listeners = [store_minute_bar]
+        self.session_provider = None
+        # Tokens of the current connection
+        self._tokens = None
+        self._task = None
+        self._ws = None
+        self._ids = itertools.count(1)
+        self.stats = {"connects": 0, "ticks": 0, "bars": 0, "errors": 0, "listener_errors": 0}
+
+    def latest(self, epic):
+        return self.quotes.get(epic)
+
+    def snapshot(self):
+        return {epic: q._asdict() for epic, q in list(self.quotes.items())}
+
+    def on_quote(self, epic, bid, ask, timestamp):
+        self.quotes[epic] = Quote(bid, ask, timestamp)
+        self.stats["ticks"] += 1
+        for listener in self.tick_listeners:
+            try:
+                listener(epic, bid, ask, timestamp)
+            except Exception as e:
+                self.stats["listener_errors"] += 1
+                print(f"Tick listener error for {epic}:", e)
+        builder = self.bars.get(epic)
+        if builder is None:
+            builder = self.bars[epic] = BarBuilder(self.bar_seconds)
+        finished = builder.update((bid + ask) / 2, timestamp)
+        if finished is not None:
+            self.stats["bars"] += 1
+            for listener in self.bar_listeners:
+                try:
+                    listener(epic, finished)
+                except Exception as e:
+                    self.stats["listener_errors"] += 1
+                    print(f"Bar listener error for {epic}:", e)
+
+    def _message(self, destination, tokens, payload=None):
+        message = {
+            "destination": destination,
+            "correlationId": str(next(self._ids)),
+            "cst": tokens.get("cst"),
+            "securityToken": tokens.get("security_token"),
+        }
+        if payload is not None:
+            message["payload"] = payload
+        return json.dumps(message)
+
+    async def _subscribe(self, ws, tokens):
+        for i in range(0, len(self.epics), MAX_EPICS_PER_SUBSCRIPTION):
+            chunk = self.epics[i:i + MAX_EPICS_PER_SUBSCRIPTION]
+            await ws.send(self._message("marketData.subscribe", tokens, {"epics": chunk}))
+
+    async def subscribe(self, epics):
+        new = [e for e in epics if e not in self.epics]
+        self.epics.extend(new)
+        if self._ws is not None and new and self._tokens:
+            await self._ws.send(self._message("marketData.subscribe", self._tokens, {"epics": new}))
+
+    async def _ping(self, ws, tokens):
+        while True:
+            await asyncio.sleep(STREAM_PING_INTERVAL)
+            await ws.send(self._message("ping", tokens))
+
+    async def _run(self):
+        delay = STREAM_RECONNECT_MIN
+        while True:
+            pinger = None
+            try:
+                # Resolved on every connect: the broker session may have been
+                # renewed, or dropped and another user's taken over
+                session = self.session_provider()
+                if not session or not session[0] or not session[1].get("cst"):
+                    raise ConnectionError("no live broker session to stream with")
+                streaming_host, tokens = session
+                async with websockets.connect(streaming_host.rstrip("/") + "/connect") as ws:
+                    self._ws, self._tokens = ws, tokens
+                    self.stats["connects"] += 1
+                    await self._subscribe(ws, tokens)
+                    pinger = asyncio.create_task(self._ping(ws, tokens))
+                    delay = STREAM_RECONNECT_MIN
+                    async for raw in ws:
+                        message = json.loads(raw)
+                        if message.get("destination") != "quote":
+                            continue
+                        p = message.get("payload") or {}
+                        self.on_quote(p["epic"], p["bid"], p["ofr"], p["timestamp"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                print("Quote stream error, reconnecting:", e)
+            finally:
+                self._ws = self._tokens = None
+                if pinger is not None:
+                    pinger.cancel()
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            delay = min(delay * 2, STREAM_RECONNECT_MAX)
+
+    def start(self, session_provider):
+        # session_provider() -> (streaming_host, tokens) or None; streaming_host as
+        # returned by /session, e.g. wss://api-streaming-capital.backend-capital.com/
+        self.session_provider = session_provider
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+quote_stream = QuoteStream()
@@ -0,0 +1,181 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+
+# Priority lanes, lowest number is served first. Orders never wait behind
+# account polling, market data or report traffic on the same API key.
+ORDERS = 0
+ACCOUNT = 1
+MARKET_DATA = 2
+REPORTS = 3
+LANE_NAMES = {ORDERS: "orders", ACCOUNT: "account", MARKET_DATA: "market_data", REPORTS: "reports"}
+
+# Capital.com allows 10 requests/second per user
+RATE_LIMIT = float(os.getenv("CAPITALCOM_RATE_LIMIT", "10"))
+RATE_BURST = float(os.getenv("CAPITALCOM_RATE_BURST", "10"))
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class PriorityRateLimiter:
+    # Token bucket with a priority queue of waiters. Callers queue instead of
+    # failing; `clock`, `sleep` and `async_sleep` can be swapped for a fake
+    # clock in tests.
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST, clock=time.monotonic, sleep=None, async_sleep=asyncio.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.tokens = burst
+        self.updated = clock()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        # ticket -> (loop, future) of async waiters parked behind the head
+        self._wakers = {}
+        self.queued = {lane: 0 for lane in LANE_NAMES}
+        self.granted = {lane: 0 for lane in LANE_NAMES}
+        self.wait_total = {lane: 0.0 for lane in LANE_NAMES}
+        self.wait_max = {lane: 0.0 for lane in LANE_NAMES}
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def _enqueue(self, lane):
+        ticket = (lane, next(self._seq))
+        heapq.heappush(self._waiting, ticket)
+        self.queued[lane] += 1
+        return ticket
+
+    def _try_grant(self, ticket, started):
+        # Returns 0 when the ticket got a token, otherwise how long to wait
+        now = self.clock()
+        self._refill(now)
+        if self._waiting[0] == ticket and self.tokens >= 1:
+            heapq.heappop(self._waiting)
+            self.tokens -= 1
+            lane = ticket[0]
+            waited = now - started
+            self.queued[lane] -= 1
+            self.granted[lane] += 1
+            self.wait_total[lane] += waited
+            self.wait_max[lane] = max(self.wait_max[lane], waited)
+            self._wake_head()
+            return 0
+        return max((1 - self.tokens) / self.rate, 1e-3)
+
+    def _wake_head(self):
+        # Only the head of the queue waits on the clock; an async waiter parked
+        # behind it is woken once it moves to the front
+        if self._waiting:
+            waker = self._wakers.pop(self._waiting[0], None)
+            if waker is not None:
+                loop, future = waker
+                loop.call_soon_threadsafe(_wake, future)
+
+    def _abandon(self, ticket):
+        # A waiter that leaves without a token (cancelled, timed out, interrupted)
+        # must not stay at the head of the queue and stall everyone behind it
+        try:
+            self._waiting.remove(ticket)
+        except ValueError:
+            return
+        heapq.heapify(self._waiting)
+        self.queued[ticket[0]] -= 1
+        self._wake_head()
+        self._cond.notify_all()
+
+    def acquire(self, lane=ACCOUNT):
+        with self._cond:
+            started = self.clock()
+            ticket = self._enqueue(lane)
+            granted = False
+            try:
+                while True:
+                    delay = self._try_grant(ticket, started)
+                    if delay == 0:
+                        granted = True
+                        self._cond.notify_all()
+                        return
+                    if self.sleep is None:
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.release()
+                        try:
+                            self.sleep(delay)
+                        finally:
+                            self._cond.acquire()
+            finally:
+                if not granted:
+                    self._abandon(ticket)
+
+    async def acquire_async(self, lane=ACCOUNT):
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            started = self.clock()
+            ticket = self._enqueue(lane)
+        granted = False
+        try:
+            while True:
+                future = None
+                with self._cond:
+                    delay = self._try_grant(ticket, started)
+                    if delay == 0:
+                        granted = True
+                        self._cond.notify_all()
+                        return
+                    if self._waiting[0] != ticket:
+                        future = loop.create_future()
+                        self._wakers[ticket] = (loop, future)
+                if future is None:
+                    await self.async_sleep(delay)
+                    continue
+                try:
+                    await future
+                finally:
+                    with self._cond:
+                        self._wakers.pop(ticket, None)
+        finally:
+            if not granted:
+                with self._cond:
+                    self._abandon(ticket)
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                LANE_NAMES[lane]: {
+                    "queue_depth": self.queued[lane],
+                    "granted": self.granted[lane],
+                    "avg_wait": self.wait_total[lane] / self.granted[lane] if self.granted[lane] else 0.0,
+                    "max_wait": self.wait_max[lane],
+                }
+                for lane in LANE_NAMES
+            }
+
+
+_limiters = {}
+_lock = threading.Lock()
+
+
+def get_limiter(api_key: str) -> PriorityRateLimiter:
+    limiter = _limiters.get(api_key)
+    if limiter is None:
+        with _lock:
+            limiter = _limiters.get(api_key)
+            if limiter is None:
+                limiter = _limiters[api_key] = PriorityRateLimiter()
+    return limiter
+
+
+def limiter_stats():
+    return {(api_key or "")[:4] + "***": limiter.get_stats() for api_key, limiter in list(_limiters.items())}
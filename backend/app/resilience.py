@@ -0,0 +1,130 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+# Retry, circuit breaker and last-good-response cache for broker calls. Only
+# idempotent GETs are retried; orders fail fast so they are never duplicated.
+MAX_RETRIES = int(os.getenv("CAPITALCOM_MAX_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("CAPITALCOM_BACKOFF_BASE", "0.2"))
+BACKOFF_CAP = float(os.getenv("CAPITALCOM_BACKOFF_CAP", "2.0"))
+BREAKER_THRESHOLD = int(os.getenv("CAPITALCOM_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET = float(os.getenv("CAPITALCOM_BREAKER_RESET", "30"))
+RESPONSE_CACHE_SIZE = int(os.getenv("CAPITALCOM_RESPONSE_CACHE_SIZE", "2048"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class BrokerUnavailable(Exception):
+    pass
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    # Full jitter: uniform in [0, min(cap, base * 2**attempt)]
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self.probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                # Let one probe through at a time; everyone else keeps failing fast.
+                # A probe that never reported back is replaced after reset_timeout.
+                now = self.clock()
+                if not self._probing or now - self.probe_started >= self.reset_timeout:
+                    self._probing = True
+                    self.probe_started = now
+                    return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+                self._probing = False
+
+
+class ResponseCache:
+    # Last successful GET payload per request, served while the breaker is open
+    def __init__(self, max_size=RESPONSE_CACHE_SIZE):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.served = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            self.served += 1
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+_breakers = {}
+_lock = threading.Lock()
+response_cache = ResponseCache()
+
+
+def get_breaker(base_url, endpoint) -> CircuitBreaker:
+    key = (base_url, endpoint)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.get(key)
+            if breaker is None:
+                breaker = _breakers[key] = CircuitBreaker()
+    return breaker
+
+
+def cache_key(api_key, method, path, params):
+    return (api_key, method, path, tuple(sorted((params or {}).items())))
+
+
+def resilience_stats():
+    return {
+        "breakers": {
+            f"{base_url}{endpoint}": {"state": b.state, "failures": b.failures, "trips": b.trips}
+            for (base_url, endpoint), b in list(_breakers.items())
+        },
+        "cache_served": response_cache.served,
+    }
@@ -0,0 +1,327 @@
+import asyncio
+import os
+import time
+from .models import User
+from .quote_stream import quote_stream
+from .risk_settings import RiskSettings, risk_settings_store
+
+# Pre-trade checks for /trade. Settings and counters are kept per user in
+# memory and updated incrementally (fills, quote ticks, periodic broker
+# reconciliation), so a check is a few dict lookups and never reads SQLite or
+# calls the broker. Everything here runs on the event loop thread.
+RISK_RECONCILE_INTERVAL = float(os.getenv("RISK_RECONCILE_INTERVAL", "30"))
+
+
+class Position:
+    # Net position in one epic; size is signed (BUY > 0, SELL < 0)
+    # pnl and exposure are as of the last mark, the book totals are sums of them
+    __slots__ = ("size", "price", "mark", "pnl", "exposure")
+
+    def __init__(self, size=0.0, price=None):
+        self.size = size
+        self.price = price
+        self.mark = None
+        self.pnl = 0.0
+        self.exposure = 0.0
+
+
+class RiskBook:
+    __slots__ = ("settings", "balance", "start_balance", "day", "open_trades", "pending", "pending_opens", "fills",
+                 "realized", "unrealized", "gross_exposure", "positions")
+
+    def __init__(self, settings, balance=0.0):
+        self.settings = settings
+        self.balance = balance
+        self.start_balance = balance
+        self.day = None
+        # Epics with an open net position, and orders in flight (pending_opens
+        # of them would open a new position)
+        self.open_trades = 0
+        self.pending = 0
+        self.pending_opens = 0
+        self.fills = 0
+        self.realized = 0.0
+        self.unrealized = 0.0
+        self.gross_exposure = 0.0
+        self.positions = {}
+
+    def snapshot(self):
+        return {
+            "settings": dict(self.settings),
+            "balance": self.balance,
+            "start_balance": self.start_balance,
+            "open_trades": self.open_trades,
+            "pending_orders": self.pending,
+            "realized_pnl": self.realized,
+            "unrealized_pnl": self.unrealized,
+            "daily_pnl": self.realized + self.unrealized,
+            "gross_exposure": self.gross_exposure,
+            "exposure": {epic: p.exposure for epic, p in self.positions.items()},
+        }
+
+
+def _account_balance(user: User):
+    info = (user.account_info or {}).get("accountInfo") or {}
+    try:
+        return float(info.get("balance") or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class RiskEngine:
+    def __init__(self, settings_loader=None, clock=time.time, quotes=None):
+        self.settings_loader = settings_loader or risk_settings_store.get
+        self.clock = clock
+        # Anything with latest(epic) -> Quote; the simulator passes its own stream
+        self.quotes = quotes or quote_stream
+        self._books = {}
+        # epic -> usernames holding a position, so a tick only touches those books
+        self._holders = {}
+        self._task = None
+        self.stats = {"checks": 0, "rejected": 0, "fills": 0, "reconciles": 0}
+
+    def _fill_price(self, epic, direction):
+        quote = self.quotes.latest(epic)
+        if quote is None:
+            return None
+        return quote.ask if direction == "BUY" else quote.bid
+
+    def book(self, user: User) -> RiskBook:
+        book = self._books.get(user.username)
+        if book is None:
+            settings = self.settings_loader(user.username) or RiskSettings().dict()
+            book = self._books[user.username] = RiskBook(settings, _account_balance(user))
+        return book
+
+    def update_settings(self, username, settings, version=None):
+        book = self._books.get(username)
+        if book is not None:
+            # None: the user's settings were deleted, so the defaults apply again
+            book.settings = dict(settings) if settings is not None else RiskSettings().dict()
+
+    def _roll_day(self, book):
+        day = int(self.clock() // 86400)
+        if book.day != day:
+            book.day = day
+            book.realized = 0.0
+            book.start_balance = book.balance
+
+    @staticmethod
+    def _order_kind(book, epic, signed_size):
+        # "open": no position in the epic yet; "add": same side as the open
+        # position; "reduce": opposite side, at most the open size; "flip":
+        # opposite side and larger, so it opens the other way
+        position = book.positions.get(epic)
+        if position is None or position.size == 0:
+            return "open"
+        if (position.size > 0) == (signed_size > 0):
+            return "add"
+        return "reduce" if abs(signed_size) <= abs(position.size) else "flip"
+
+    def needs_price(self, user: User, epic, direction, size):
+        # True when check() would size the order but there is no streamed quote
+        book = self.book(user)
+        signed = size if direction.upper() == "BUY" else -size
+        return (bool(book.balance) and self._order_kind(book, epic, signed) != "reduce"
+                and self._fill_price(epic, direction.upper()) is None)
+
+    def check(self, user: User, epic, direction, size, stop_loss=None, price=None):
+        # Returns (rejection reason, None), or (None, kind) after reserving a slot
+        # for the order; every accepted check must be followed by settle() with
+        # that kind, since fills in between can change what the order would be.
+        # `price` stands in for the fill price when the epic has no streamed quote.
+        self.stats["checks"] += 1
+        book = self.book(user)
+        self._roll_day(book)
+        settings = book.settings
+        direction = direction.upper()
+        kind = self._order_kind(book, epic, size if direction == "BUY" else -size)
+        price = self._fill_price(epic, direction) or price
+        daily_pnl = book.realized + book.unrealized
+        reason = None
+        if size <= 0:
+            reason = "Order size must be positive"
+        elif kind == "reduce":
+            # Reducing or closing a position is never blocked by the opening limits
+            pass
+        elif kind == "open" and book.open_trades + book.pending_opens >= settings["concurrentTrades"]:
+            reason = f"Max concurrent trades reached ({settings['concurrentTrades']})"
+        elif book.start_balance and daily_pnl <= -book.start_balance * settings["maxDailyLoss"] / 100:
+            reason = f"Daily loss limit of {settings['maxDailyLoss']}% reached"
+        elif book.start_balance and daily_pnl >= book.start_balance * settings["profitTarget"] / 100:
+            reason = f"Daily profit target of {settings['profitTarget']}% reached"
+        elif book.balance:
+            if price is None:
+                reason = f"No price for {epic} to check the order against"
+            elif stop_loss and size * abs(price - stop_loss) > book.balance * settings["riskPerTrade"] / 100:
+                reason = f"Stop loss risks more than {settings['riskPerTrade']}% of balance"
+            elif book.gross_exposure + size * price > book.balance * settings["leverage"]:
+                reason = f"Exposure would exceed {settings['leverage']}x leverage"
+        if reason is not None:
+            self.stats["rejected"] += 1
+            return reason, None
+        book.pending += 1
+        if kind == "open":
+            book.pending_opens += 1
+        return None, kind
+
+    def settle(self, username, epic, direction, size, result, kind):
+        # `kind` is what check() reserved the order as
+        book = self._books.get(username)
+        if book is None:
+            return
+        direction = direction.upper()
+        signed = size if direction == "BUY" else -size
+        book.pending = max(0, book.pending - 1)
+        if kind == "open":
+            book.pending_opens = max(0, book.pending_opens - 1)
+        if not isinstance(result, dict) or result.get("error"):
+            return
+        # A fill level in the result (simulated broker) wins over the current quote
+        price = result.get("level") or self._fill_price(epic, direction)
+        held = epic in book.positions
+        self._fill(username, book, epic, signed, price)
+        # open_trades counts epics with an open position
+        book.open_trades += int(epic in book.positions) - int(held)
+        book.fills += 1
+        self.stats["fills"] += 1
+
+    def _mark(self, book, position, mark):
+        position.mark = mark
+        if position.price is None:
+            position.price = mark
+        pnl = position.size * (mark - position.price)
+        exposure = abs(position.size) * mark
+        book.unrealized += pnl - position.pnl
+        book.gross_exposure += exposure - position.exposure
+        position.pnl, position.exposure = pnl, exposure
+
+    def _fill(self, username, book, epic, signed_size, price):
+        position = book.positions.get(epic)
+        if position is None:
+            position = book.positions[epic] = Position()
+            self._holders.setdefault(epic, set()).add(username)
+        if price is None:
+            price = position.mark
+        if position.size == 0 or (position.size > 0) == (signed_size > 0):
+            if price is not None and position.price is not None:
+                total = abs(position.size) + abs(signed_size)
+                position.price = (position.price * abs(position.size) + price * abs(signed_size)) / total
+            elif price is not None:
+                position.price = price
+            position.size += signed_size
+        else:
+            # Opposite side on a netted position realizes the closed part
+            closed = min(abs(signed_size), abs(position.size))
+            if price is not None and position.price is not None:
+                book.realized += closed * (price - position.price) * (1 if position.size > 0 else -1)
+            remainder = position.size + signed_size
+            if remainder and (remainder > 0) != (position.size > 0):
+                position.price = price
+            position.size = remainder
+        if price is not None:
+            self._mark(book, position, price)
+        if position.size == 0:
+            self._remove(username, book, epic)
+
+    def _remove(self, username, book, epic):
+        position = book.positions.pop(epic)
+        book.unrealized -= position.pnl
+        book.gross_exposure -= position.exposure
+        holders = self._holders.get(epic)
+        if holders is not None:
+            holders.discard(username)
+            if not holders:
+                del self._holders[epic]
+
+    def on_tick(self, epic, bid, ask, timestamp):
+        usernames = self._holders.get(epic)
+        if not usernames:
+            return
+        mid = (bid + ask) / 2
+        for username in usernames:
+            book = self._books[username]
+            self._mark(book, book.positions[epic], mid)
+
+    def reconcile(self, username, positions):
+        # Rebuilds a book from the broker's /positions; a position that shrank or
+        # closed since the last look realizes its last marked P&L
+        book = self._books.get(username)
+        if book is None:
+            return
+        self._roll_day(book)
+        rebuilt = {}
+        for item in positions:
+            p, market = item.get("position") or {}, item.get("market") or {}
+            epic = market.get("epic")
+            size = float(p.get("size") or 0.0)
+            if not epic or not size:
+                continue
+            signed = size if p.get("direction") == "BUY" else -size
+            level = float(p.get("level") or 0.0)
+            position = rebuilt.get(epic)
+            if position is None:
+                rebuilt[epic] = Position(signed, level)
+            else:
+                total = abs(position.size) + size
+                position.price = (position.price * abs(position.size) + level * size) / total
+                position.size += signed
+        for epic, old in book.positions.items():
+            new_size = abs(rebuilt[epic].size) if epic in rebuilt else 0.0
+            if abs(old.size) > new_size:
+                book.realized += old.pnl * (abs(old.size) - new_size) / abs(old.size)
+        for epic in list(book.positions):
+            self._remove(username, book, epic)
+        # Start the running sums from zero again so float drift cannot build up
+        book.unrealized = book.gross_exposure = 0.0
+        book.open_trades = len(rebuilt)
+        for epic, position in rebuilt.items():
+            book.positions[epic] = position
+            self._holders.setdefault(epic, set()).add(username)
+            quote = self.quotes.latest(epic)
+            self._mark(book, position, (quote.bid + quote.ask) / 2 if quote else position.price)
+        self.stats["reconciles"] += 1
+
+    async def _reconcile_loop(self, client_for):
+        while True:
+            await asyncio.sleep(RISK_RECONCILE_INTERVAL)
+            for username, book in list(self._books.items()):
+                try:
+                    api = client_for(username)
+                    fills = book.fills
+                    data = await api.get_positions()
+                except Exception:
+                    continue
+                if "error" in data:
+                    continue
+                # Skip if an order went out while we were fetching
+                if book.pending or book.fills != fills:
+                    continue
+                self.reconcile(username, data.get("positions", []))
+
+    def start(self, client_for):
+        # client_for(username) -> AsyncCapitalComAPI, raising if there is no live session
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._reconcile_loop(client_for))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self, user: User):
+        book = self.book(user)
+        self._roll_day(book)
+        return book.snapshot()
+
+    def get_stats(self):
+        return {**self.stats, "books": len(self._books), "epics_held": len(self._holders)}
+
+
+risk_engine = RiskEngine()
+quote_stream.tick_listeners.append(risk_engine.on_tick)
+risk_settings_store.subscribe(risk_engine.update_settings)
@@ -1,16 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
-from fastapi.security import OAuth2PasswordBearer
+import asyncio
+import jwt
+import os
+import threading
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
-import json
-import os
+from .auth import get_current_user, SECRET_KEY, ALGORITHM
+from .models import User
+from .storage import db
 
 router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# In-memory storage for demonstration (replace with a proper database in production)
+# Legacy JSON file, only read by `python -m app.storage migrate`
 RISK_SETTINGS_FILE = "risk_settings.json"
+# How often each worker looks for settings written by other workers
+RISK_SETTINGS_POLL_INTERVAL = float(os.getenv("RISK_SETTINGS_POLL_INTERVAL", "2"))
 
 class RiskSettings(BaseModel):
     concurrentTrades: int = 1
@@ -19,31 +24,157 @@ class RiskSettings(BaseModel):
     profitTarget: float = 50
     leverage: int = 10
 
-def load_all_settings():
-    if os.path.exists(RISK_SETTINGS_FILE):
-        with open(RISK_SETTINGS_FILE, "r") as f:
-            return json.load(f)
-    return {}
 
-def save_all_settings(data):
-    with open(RISK_SETTINGS_FILE, "w") as f:
-        json.dump(data, f)
+def _token_subject(key):
+    # Older versions stored settings under the raw bearer token; the signature
+    # is still checked so arbitrary strings posted as tokens are not adopted
+    if key.count(".") != 2:
+        return None
+    try:
+        payload = jwt.decode(key, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
+    except jwt.PyJWTError:
+        return None
+    return payload.get("sub")
+
+
+class RiskSettingsStore:
+    # username -> (version, settings) held in memory. Writes go through set()
+    # and delete(), which persist the change and push it to every listener
+    # (risk engine, schedulers). Writes made by other workers are noticed
+    # through the risk_settings_version counter, checked every
+    # RISK_SETTINGS_POLL_INTERVAL, and pushed to the listeners the same way.
+    def __init__(self, database=db):
+        self.db = database
+        self._settings = None
+        self._version = None
+        self._lock = threading.Lock()
+        self._task = None
+        self.listeners = []
+        self.stats = {"reloads": 0, "remote_changes": 0}
+
+    def _rows(self):
+        return {user_id: (version, settings) for user_id, settings, version, _ in self.db.risk_settings_rows()}
+
+    def load(self):
+        with self._lock:
+            if self._settings is None:
+                self.migrate_token_keys()
+                self._version = self.db.risk_settings_version()
+                self._settings = self._rows()
+            return self._settings
+
+    def reload(self):
+        # Blocking: re-reads the rows when any worker wrote since the last look;
+        # returns [(username, version, settings)] that changed, settings None
+        # for deleted entries
+        self.load()
+        version = self.db.risk_settings_version()
+        if version == self._version:
+            return []
+        rows = self._rows()
+        with self._lock:
+            changed = [(username, entry[0], dict(entry[1])) for username, entry in rows.items()
+                       if self._settings.get(username) != entry]
+            changed += [(username, 0, None) for username in self._settings if username not in rows]
+            self._settings, self._version = rows, version
+        self.stats["reloads"] += 1
+        self.stats["remote_changes"] += len(changed)
+        return changed
+
+    def _notify(self, username, settings, version):
+        for listener in self.listeners:
+            try:
+                listener(username, dict(settings) if settings is not None else None, version)
+            except Exception as e:
+                print(f"Risk settings listener error for {username}:", e)
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(RISK_SETTINGS_POLL_INTERVAL)
+            try:
+                for username, version, settings in await run_in_threadpool(self.reload):
+                    self._notify(username, settings, version)
+            except Exception as e:
+                print("Risk settings reload error:", e)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._poll_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def migrate_token_keys(self):
+        rows = self.db.risk_settings_rows()
+        keys = {user_id for user_id, _, _, _ in rows}
+        by_user = {}
+        for user_id, settings, _, updated_at in rows:
+            username = _token_subject(user_id)
+            if username:
+                by_user.setdefault(username, []).append((updated_at, user_id, settings))
+        for username, entries in by_user.items():
+            entries.sort()
+            settings = entries[-1][2]
+            if username in keys:
+                # Settings already saved under the username win over token-keyed ones
+                settings = self.db.get_risk_settings(username)
+            self.db.rekey_risk_settings(username, settings, [user_id for _, user_id, _ in entries])
+        return sum(len(entries) for entries in by_user.values())
+
+    def get(self, username):
+        entry = self.load().get(username)
+        return dict(entry[1]) if entry else None
+
+    def version(self, username):
+        entry = self.load().get(username)
+        return entry[0] if entry else 0
+
+    def set(self, username, settings):
+        self.load()
+        version = self.db.set_risk_settings(username, settings)
+        with self._lock:
+            self._settings[username] = (version, dict(settings))
+        self._notify(username, settings, version)
+        return version
+
+    def delete(self, username):
+        self.load()
+        if not self.db.delete_risk_settings(username):
+            return False
+        with self._lock:
+            self._settings.pop(username, None)
+        self._notify(username, None, 0)
+        return True
+
+    def subscribe(self, listener):
+        # listener(username, settings, version) is called after every change;
+        # settings is None when the entry was deleted
+        self.listeners.append(listener)
+
+    def get_stats(self):
+        return {**self.stats, "users": len(self.load()), "listeners": len(self.listeners)}
+
+
+risk_settings_store = RiskSettingsStore()
 
-def get_user_id_from_token(token: str):
-    # Replace with your real authentication logic.
-    # For now, use token as username for demo.
-    return token
 
 @router.get("/risk-settings")
-async def get_risk_settings(token: str = Depends(oauth2_scheme)):
-    user_id = get_user_id_from_token(token)
-    all_settings = load_all_settings()
-    return all_settings.get(user_id, RiskSettings().dict())
+async def get_risk_settings(user: User = Depends(get_current_user)):
+    return await run_in_threadpool(risk_settings_store.get, user.username) or RiskSettings().dict()
 
 @router.post("/risk-settings")
-async def set_risk_settings(settings: RiskSettings, token: str = Depends(oauth2_scheme)):
-    user_id = get_user_id_from_token(token)
-    all_settings = load_all_settings()
-    all_settings[user_id] = settings.dict()
-    save_all_settings(all_settings)
-    return settings.dict()
\ No newline at end of file
+async def set_risk_settings(settings: RiskSettings, user: User = Depends(get_current_user)):
+    await run_in_threadpool(risk_settings_store.set, user.username, settings.dict())
+    return settings.dict()
+
+@router.delete("/risk-settings")
+async def delete_risk_settings(user: User = Depends(get_current_user)):
+    # Back to the defaults
+    await run_in_threadpool(risk_settings_store.delete, user.username)
+    return RiskSettings().dict()
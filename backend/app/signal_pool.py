@@ -0,0 +1,167 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from .strategy_manager import score_matrix
+from .strategy_plugins import discover
+
+# Full-universe signal sweeps sharded by symbol over a persistent process
+# pool. The close matrix is copied once into shared memory and each worker
+# maps it and scores a contiguous block of rows, so only the small
+# (rows x strategies) results travel back through pickling. Small universes
+# are scored inline, where the round trip would cost more than it saves.
+SIGNAL_WORKERS = int(os.getenv("SIGNAL_WORKERS") or os.cpu_count() or 1)
+SIGNAL_POOL_MIN_ROWS = int(os.getenv("SIGNAL_POOL_MIN_ROWS", "64"))
+# Workers come from a fork server (a clean single-threaded process), never
+# from the app process: it runs threads (broker keep-alive, DB pool, the
+# hashing pool's manager) whose locks a forked child could inherit held, and
+# the pool is also started lazily from request threads
+SIGNAL_POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _warm_up():
+    # Worker initializer: loads plugins (a fresh worker has not seen the
+    # parent's) and runs numpy once so the first sweep is not paying for it
+    discover()
+    score_matrix(["ema_crossover"], np.ones((1, 30)))
+    return os.getpid()
+
+
+def _score_block(matrix, names):
+    return score_matrix(names, matrix)
+
+
+def _run_shard(func, name, shape, start, stop, args):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        matrix = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        result = func(matrix[start:stop], *args)
+        # The view has to go before the segment can be closed
+        del matrix
+        return result
+    finally:
+        shm.close()
+
+
+def _run_tasks(func, name, shape, tasks):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        matrix = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        results = [func(matrix, task) for task in tasks]
+        del matrix
+        return results
+    finally:
+        shm.close()
+
+
+class SignalPool:
+    def __init__(self, workers=SIGNAL_WORKERS, min_rows=SIGNAL_POOL_MIN_ROWS):
+        self.workers = max(1, workers)
+        self.min_rows = max(1, min_rows)
+        self._executor = None
+        self.stats = {"sweeps": 0, "inline": 0, "shards": 0, "rows": 0, "run_total": 0.0}
+
+    def start(self):
+        if self._executor is None and self.workers > 1:
+            # Workers must share the parent's tracker; one of their own would
+            # unlink the segments it saw when the worker exits
+            resource_tracker.ensure_running()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_warm_up,
+                mp_context=multiprocessing.get_context(SIGNAL_POOL_START_METHOD),
+            )
+            # Start the workers now rather than on the first sweep
+            for _ in range(self.workers):
+                self._executor.submit(_warm_up)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def run(self, func, matrix, *args, shard_rows=None):
+        # [func(block, *args) for each block of rows], in row order. func must
+        # be a module-level function; blocks are at most shard_rows rows when given.
+        started = time.perf_counter()
+        matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+        rows = matrix.shape[0]
+        shards = min(self.workers, rows // self.min_rows)
+        if shard_rows:
+            shards = max(shards, -(-rows // shard_rows))
+        self.stats["sweeps"] += 1
+        self.stats["rows"] += rows
+        try:
+            if shards < 2 or self.workers < 2:
+                self.stats["inline"] += 1
+                if shards < 2:
+                    return [func(matrix, *args)]
+                bounds = np.linspace(0, rows, shards + 1).astype(int)
+                return [func(matrix[start:stop], *args) for start, stop in zip(bounds[:-1], bounds[1:])]
+            bounds = np.linspace(0, rows, shards + 1).astype(int)
+            with self._shared(matrix) as name:
+                futures = [
+                    self._executor.submit(_run_shard, func, name, matrix.shape, start, stop, args)
+                    for start, stop in zip(bounds[:-1], bounds[1:])
+                ]
+                results = [f.result() for f in futures]
+            self.stats["shards"] += shards
+            return results
+        finally:
+            self.stats["run_total"] += time.perf_counter() - started
+
+    def map(self, func, matrix, tasks, batch=8):
+        # [func(matrix, task) for task in tasks] with the matrix shared once and
+        # tasks sent to the workers in batches; func must be module level
+        started = time.perf_counter()
+        matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+        tasks = list(tasks)
+        self.stats["sweeps"] += 1
+        try:
+            if self.workers < 2 or len(tasks) < 2:
+                self.stats["inline"] += 1
+                return [func(matrix, task) for task in tasks]
+            with self._shared(matrix) as name:
+                futures = [
+                    self._executor.submit(_run_tasks, func, name, matrix.shape, tasks[i:i + batch])
+                    for i in range(0, len(tasks), batch)
+                ]
+                results = [result for f in futures for result in f.result()]
+            self.stats["shards"] += len(futures)
+            return results
+        finally:
+            self.stats["run_total"] += time.perf_counter() - started
+
+    @contextmanager
+    def _shared(self, matrix):
+        # Copies the matrix into a fresh shared memory segment for the workers
+        self.start()
+        shm = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+        try:
+            shared = np.ndarray(matrix.shape, dtype=np.float64, buffer=shm.buf)
+            shared[:] = matrix
+            del shared
+            yield shm.name
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def score(self, names, matrix):
+        # Same result as strategy_manager.score_matrix(names, matrix)
+        results = self.run(_score_block, matrix, names)
+        return (np.concatenate([signals for signals, _ in results]),
+                np.concatenate([raw for _, raw in results]))
+
+    def get_stats(self):
+        sweeps = self.stats["sweeps"]
+        return {
+            **self.stats,
+            "workers": self.workers,
+            "running": self._executor is not None,
+            "avg_run": self.stats["run_total"] / sweeps if sweeps else 0.0,
+        }
+
+
+signal_pool = SignalPool()
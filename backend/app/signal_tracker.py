@@ -0,0 +1,315 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from .quote_stream import quote_stream
+from .strategy import HOLD
+
+# Outcomes of emitted signals. A signal is recorded with its entry price and
+# resolved SIGNAL_HORIZON seconds later against the latest price of its
+# symbol: a win when the move went its way. A signal whose symbol has had no
+# price since its entry is expired rather than scored against a stale price. Everything is array-backed:
+# pending signals sit in one FIFO ring (due time, pair, side, entry) and
+# every (symbol, strategy) pair owns a row of a fixed-width outcome ring, so
+# recording and resolving are slice assignments and win-rate queries are a
+# dict lookup and a division.
+SIGNAL_HORIZON = float(os.getenv("SIGNAL_HORIZON", "3600"))
+SIGNAL_WINDOW = int(os.getenv("SIGNAL_WINDOW", "100"))
+# The same side for the same pair is not recorded again within this many seconds
+SIGNAL_MIN_GAP = float(os.getenv("SIGNAL_MIN_GAP", "60"))
+SIGNAL_MIN_SAMPLES = int(os.getenv("SIGNAL_MIN_SAMPLES", "5"))
+SIGNAL_TRACKER_SNAPSHOT = os.getenv("SIGNAL_TRACKER_SNAPSHOT", "signal_tracker.npz")
+SIGNAL_TRACKER_SNAPSHOT_INTERVAL = float(os.getenv("SIGNAL_TRACKER_SNAPSHOT_INTERVAL", "300"))
+
+# Per-pair arrays, grown together
+PAIR_ARRAYS = ("_outcomes", "_returns", "_pos", "_count", "_wins", "_return_sum", "_last_time", "_last_side")
+# Pending ring columns
+PENDING_ARRAYS = ("_due", "_pair", "_side", "_entry")
+
+
+def _grow(array, size):
+    grown = np.zeros((size,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class SignalTracker:
+    def __init__(self, horizon=SIGNAL_HORIZON, window=SIGNAL_WINDOW, min_gap=SIGNAL_MIN_GAP,
+                 path=SIGNAL_TRACKER_SNAPSHOT, capacity=1024):
+        self.horizon = horizon
+        self.window = window
+        self.min_gap = min_gap
+        self.path = path
+        self._lock = threading.Lock()
+        self._task = None
+        self.stats = {"recorded": 0, "skipped": 0, "resolved": 0, "expired": 0, "snapshots": 0}
+        self._reset(capacity)
+
+    def _reset(self, capacity):
+        # (symbol, strategy) -> row, and symbol -> {strategy: row} for queries
+        self.pairs = {}
+        self.by_symbol = {}
+        self._pair_symbol = []
+        self.symbol_ids = {}
+        self.last_price = np.full(16, np.nan)
+        self.price_time = np.full(16, -np.inf)
+        self._outcomes = np.zeros((16, self.window), dtype=np.int8)
+        self._returns = np.zeros((16, self.window))
+        self._pos = np.zeros(16, dtype=np.int64)
+        self._count = np.zeros(16, dtype=np.int64)
+        self._wins = np.zeros(16, dtype=np.int64)
+        self._return_sum = np.zeros(16)
+        self._last_time = np.full(16, -np.inf)
+        self._last_side = np.zeros(16, dtype=np.int8)
+        self._due = np.zeros(capacity)
+        self._pair = np.zeros(capacity, dtype=np.int64)
+        self._side = np.zeros(capacity, dtype=np.int8)
+        self._entry = np.zeros(capacity)
+        self._head = 0
+        self._size = 0
+
+    def _symbol_id(self, symbol):
+        sid = self.symbol_ids.get(symbol)
+        if sid is None:
+            sid = self.symbol_ids[symbol] = len(self.symbol_ids)
+            if sid >= len(self.last_price):
+                self.last_price = _grow(self.last_price, 2 * len(self.last_price))
+                self.last_price[sid:] = np.nan
+                self.price_time = _grow(self.price_time, len(self.last_price))
+                self.price_time[sid:] = -np.inf
+        return sid
+
+    def _pair_id(self, symbol, strategy):
+        key = (symbol, strategy)
+        row = self.pairs.get(key)
+        if row is None:
+            row = self.pairs[key] = len(self.pairs)
+            self.by_symbol.setdefault(symbol, {})[strategy] = row
+            self._pair_symbol.append(self._symbol_id(symbol))
+            if row >= len(self._pos):
+                size = 2 * len(self._pos)
+                for name in PAIR_ARRAYS:
+                    setattr(self, name, _grow(getattr(self, name), size))
+                self._last_time[row:] = -np.inf
+        return row
+
+    def _push(self, due, pairs, sides, entries):
+        n = len(pairs)
+        capacity = len(self._due)
+        if self._size + n > capacity:
+            # Unroll the ring into a larger one
+            order = (self._head + np.arange(self._size)) % capacity
+            size = max(2 * capacity, self._size + n)
+            for name in PENDING_ARRAYS:
+                array = getattr(self, name)
+                grown = np.zeros(size, dtype=array.dtype)
+                grown[:self._size] = array[order]
+                setattr(self, name, grown)
+            self._head, capacity = 0, size
+        slots = (self._head + self._size + np.arange(n)) % capacity
+        self._due[slots] = due
+        self._pair[slots] = pairs
+        self._side[slots] = sides
+        self._entry[slots] = entries
+        self._size += n
+
+    def record(self, symbol, strategies, signals, price, timestamp=None):
+        # One symbol's signals, one per strategy, emitted at `price`
+        self.record_batch([symbol], strategies, np.asarray(signals).reshape(1, -1), [price], timestamp)
+
+    def record_batch(self, symbols, strategies, signals, prices, timestamp=None):
+        # signals: (symbols, strategies) LONG / SHORT / HOLD; prices: (symbols,) entry prices
+        timestamp = time.time() if timestamp is None else timestamp
+        signals = np.asarray(signals)
+        prices = np.asarray(prices, dtype=float)
+        with self._lock:
+            rows = np.array([[self._pair_id(symbol, name) for name in strategies] for symbol in symbols],
+                            dtype=np.int64).reshape(signals.shape)
+            for row, symbol in enumerate(symbols):
+                if not np.isnan(prices[row]):
+                    sid = self._symbol_id(symbol)
+                    self.last_price[sid] = prices[row]
+                    self.price_time[sid] = timestamp
+            entries = np.broadcast_to(prices[:, None], signals.shape)
+            keep = (signals != HOLD) & ~np.isnan(entries)
+            # Repeats of the same side within min_gap are the same signal
+            repeat = (self._last_side[rows] == signals) & (timestamp - self._last_time[rows] < self.min_gap)
+            self.stats["skipped"] += int((keep & repeat).sum())
+            keep &= ~repeat
+            if keep.any():
+                pairs = rows[keep]
+                self._push(timestamp + self.horizon, pairs, signals[keep], entries[keep])
+                self._last_time[pairs] = timestamp
+                self._last_side[pairs] = signals[keep]
+                self.stats["recorded"] += len(pairs)
+        self.resolve(timestamp)
+
+    def on_price(self, symbol, price, timestamp=None):
+        sid = self.symbol_ids.get(symbol)
+        if sid is not None:
+            self.last_price[sid] = price
+            self.price_time[sid] = time.time() if timestamp is None else timestamp
+
+    def on_tick(self, epic, bid, ask, timestamp):
+        # Stamped on arrival, on the same clock as record()
+        self.on_price(epic, (bid + ask) / 2)
+
+    def on_signals(self, symbol, strategies, signals, bar):
+        # StrategyManager listener: live signals on a completed bar, entered at its close
+        self.record(symbol, strategies, signals, bar[4])
+
+    def resolve(self, now=None):
+        # Scores every pending signal whose horizon has passed against the latest price
+        now = time.time() if now is None else now
+        with self._lock:
+            capacity = len(self._due)
+            resolved = 0
+            while self._size:
+                order = (self._head + np.arange(min(self._size, 4096))) % capacity
+                ready = self._due[order] <= now
+                count = len(order) if ready.all() else int(np.argmin(ready))
+                if not count:
+                    break
+                self._settle(order[:count])
+                self._head = (self._head + count) % capacity
+                self._size -= count
+                resolved += count
+            return resolved
+
+    def _settle(self, slots):
+        pairs = self._pair[slots]
+        sides = self._side[slots]
+        symbols = np.asarray(self._pair_symbol, dtype=np.int64)[pairs]
+        with np.errstate(invalid="ignore"):
+            returns = sides * (self.last_price[symbols] / self._entry[slots] - 1)
+        # Only a price that arrived after the entry says anything about the outcome
+        fresh = self.price_time[symbols] > self._due[slots] - self.horizon
+        known = fresh & ~np.isnan(returns)
+        self.stats["expired"] += int((~known).sum())
+        pairs, returns = pairs[known], returns[known]
+        if not len(pairs):
+            return
+        # Position of each outcome within its pair's ring, in arrival order
+        order = np.argsort(pairs, kind="stable")
+        pairs, returns = pairs[order], returns[order]
+        starts = np.r_[0, np.nonzero(np.diff(pairs))[0] + 1]
+        counts = np.diff(np.r_[starts, len(pairs)])
+        rank = np.arange(len(pairs)) - np.repeat(starts, counts)
+        slots = (self._pos[pairs] + rank) % self.window
+        self._outcomes[pairs, slots] = returns > 0
+        self._returns[pairs, slots] = returns
+        touched = pairs[starts]
+        self._pos[touched] += counts
+        self._count[touched] = np.minimum(self._count[touched] + counts, self.window)
+        self._wins[touched] = self._outcomes[touched].sum(axis=1)
+        self._return_sum[touched] = self._returns[touched].sum(axis=1)
+        self.stats["resolved"] += len(pairs)
+
+    def win_rate(self, symbol, strategy, min_samples=SIGNAL_MIN_SAMPLES):
+        row = self.pairs.get((symbol, strategy))
+        if row is None or self._count[row] < max(min_samples, 1):
+            return None
+        return float(self._wins[row] / self._count[row])
+
+    def performance(self, symbols, min_samples=SIGNAL_MIN_SAMPLES):
+        # {symbol: {strategy: {"win_rate", "avg_return", "samples"}}}
+        results = {}
+        for symbol in symbols:
+            per_strategy = {}
+            for strategy, row in self.by_symbol.get(symbol, {}).items():
+                count = int(self._count[row])
+                if count >= max(min_samples, 1):
+                    per_strategy[strategy] = {
+                        "win_rate": float(self._wins[row] / count),
+                        "avg_return": float(self._return_sum[row] / count),
+                        "samples": count,
+                    }
+            results[symbol] = per_strategy
+        return results
+
+    # --- persistence ---
+
+    def snapshot(self, path=None):
+        path = path or self.path
+        with self._lock:
+            order = (self._head + np.arange(self._size)) % len(self._due)
+            n = len(self.pairs)
+            arrays = {name.lstrip("_"): getattr(self, name)[:n] for name in PAIR_ARRAYS}
+            arrays.update({"pending" + name: getattr(self, name)[order] for name in PENDING_ARRAYS})
+            arrays["last_price"] = self.last_price[:len(self.symbol_ids)]
+            arrays["price_time"] = self.price_time[:len(self.symbol_ids)]
+            meta = {"pairs": list(self.pairs), "symbols": list(self.symbol_ids), "window": self.window}
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, path)
+        self.stats["snapshots"] += 1
+
+    def load(self, path=None):
+        path = path or self.path
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta["window"] != self.window:
+                    print("Signal tracker snapshot has another window size; starting empty")
+                    return False
+                with self._lock:
+                    self._reset(max(1024, len(data["pending_due"])))
+                    for symbol in meta["symbols"]:
+                        self._symbol_id(symbol)
+                    for symbol, strategy in meta["pairs"]:
+                        self._pair_id(symbol, strategy)
+                    n = len(self.pairs)
+                    for name in PAIR_ARRAYS:
+                        getattr(self, name)[:n] = data[name.lstrip("_")]
+                    self.last_price[:len(self.symbol_ids)] = data["last_price"]
+                    if "price_time" in data:
+                        self.price_time[:len(self.symbol_ids)] = data["price_time"]
+                    self._size = len(data["pending_due"])
+                    for name in PENDING_ARRAYS:
+                        getattr(self, name)[:self._size] = data["pending" + name]
+        except Exception as e:
+            print("Error loading signal tracker snapshot:", e)
+            return False
+        return True
+
+    async def _loop(self):
+        last_snapshot = time.time()
+        while True:
+            await asyncio.sleep(1.0)
+            self.resolve()
+            if time.time() - last_snapshot >= SIGNAL_TRACKER_SNAPSHOT_INTERVAL:
+                last_snapshot = time.time()
+                try:
+                    await run_in_threadpool(self.snapshot)
+                except Exception as e:
+                    print("Error saving signal tracker snapshot:", e)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            self.snapshot()
+        except Exception as e:
+            print("Error saving signal tracker snapshot:", e)
+
+    def get_stats(self):
+        return {**self.stats, "pairs": len(self.pairs), "pending": self._size}
+
+
+signal_tracker = SignalTracker()
+quote_stream.tick_listeners.append(signal_tracker.on_tick)
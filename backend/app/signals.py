@@ -0,0 +1,67 @@
+from typing import Optional
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from .auth import get_current_user
+from .models import User
+from .analytics import get_backtest_win_rates, get_recent_signal_performance
+from .capitalcom_api import AsyncCapitalComAPI
+from .broker_sessions import get_broker_api
+from .candle_store import candle_store, RESOLUTION_SECONDS
+from .candle_sync import candle_sync
+from .indicators import last_valid, volatility
+from .quote_stream import QUOTE_WATCHLIST, quote_stream
+from .streaming_indicators import live_indicators
+from .strategy_manager import StrategyManager, rates_matrix
+from .signal_pool import signal_pool
+from .signal_tracker import signal_tracker
+from .strategy_plugins import PLUGINS, discover
+
+router = APIRouter()
+
+# Signals on the quote stream's minute bars, updated bar by bar per plugin
+live_signals = StrategyManager(discover(), mode="incremental")
+live_signals.attach(quote_stream)
+live_signals.signal_listeners.append(signal_tracker.on_signals)
+
+
+def _split(value):
+    return [v for v in (value or "").split(",") if v]
+
+
+def compute_signals(symbols, resolution, bars, strategies):
+    # Arrays all the way through; dicts are only built for the response
+    histories = candle_store.window(symbols, resolution, bars)
+    manager = StrategyManager(strategies, mode="parallel", pool=signal_pool)
+    names = manager.strategy_names()
+    win_rates = rates_matrix(histories.epics, names, get_backtest_win_rates(symbols, resolution))
+    recent = rates_matrix(histories.epics, names, get_recent_signal_performance(symbols))
+    batch = manager.get_signals_batch(histories.epics, histories.close, backtest_win_rates=win_rates,
+                                      recent_perf=recent, volatility=volatility(histories.close))
+    # Served signals are tracked against the latest close
+    signal_tracker.record_batch(batch.symbols, batch.strategies, batch.signals, last_valid(histories.close))
+    return manager.to_dict(batch)
+
+
+@router.get("/signals")
+async def get_signals(api: AsyncCapitalComAPI = Depends(get_broker_api), symbols: Optional[str] = None,
+                      strategies: Optional[str] = None, resolution: str = "HOUR", bars: int = 200):
+    if resolution not in RESOLUTION_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Unknown resolution {resolution}")
+    symbols = _split(symbols) or QUOTE_WATCHLIST
+    strategies = _split(strategies) or list(PLUGINS)
+    # Only bars newer than what the store already has are requested
+    sync_errors = await candle_sync.sync(api, symbols, resolution)
+    for symbol, error in sync_errors.items():
+        if error:
+            print(f"Error fetching prices for {symbol}:", error)
+    return await run_in_threadpool(compute_signals, symbols, resolution, bars, strategies)
+
+
+@router.get("/signals/live")
+async def get_live_signals(symbols: Optional[str] = None, user: User = Depends(get_current_user)):
+    symbols = [s for s in (_split(symbols) or QUOTE_WATCHLIST) if s in live_signals.plugins]
+    vol = np.array([(live_indicators.values(s) or {}).get("volatility") or np.nan for s in symbols])
+    recent = rates_matrix(symbols, live_signals.strategy_names(), get_recent_signal_performance(symbols))
+    return live_signals.to_dict(live_signals.get_signals_batch(symbols, recent_perf=recent, volatility=vol))
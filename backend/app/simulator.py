@@ -0,0 +1,346 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from typing import NamedTuple, Optional
+import numpy as np
+from . import strategy_plugins
+from .backtest import periods_per_year
+from .candle_store import candle_store, RESOLUTION_SECONDS
+from .models import User
+from .quote_stream import Quote, QuoteStream
+from .risk_engine import RiskEngine
+from .risk_settings import RiskSettings
+from .signal_pool import signal_pool
+from .storage import db
+from .strategy import HOLD
+
+# Event-driven backtests: bars or ticks are replayed through the live pieces
+# (QuoteStream bar building, strategy plugins, RiskEngine pre-trade checks
+# and settlement) against a simulated broker that fills with spread,
+# slippage and latency and honours stop-loss / take-profit levels. Each run
+# holds at most one position, like the vectorized backtest: the strategy's
+# signal is the target side and HOLD goes flat. A position still open at the
+# end of the data is closed at the last quote.
+# Parameter sweeps fan the runs out over the signal pool, with the price data
+# in shared memory, and results cached by (strategy, params, data hash, model).
+SIM_SPREAD = float(os.getenv("SIM_SPREAD", "0.0002"))
+SIM_SLIPPAGE = float(os.getenv("SIM_SLIPPAGE", "0.0001"))
+SIM_LATENCY_MS = int(os.getenv("SIM_LATENCY_MS", "0"))
+SIM_BALANCE = float(os.getenv("SIM_BALANCE", "10000"))
+
+SIDES = {1: "BUY", -1: "SELL"}
+# Rows of the shared data matrix used by sweeps
+DATA_FIELDS = ("time", "open", "high", "low", "close")
+
+
+class FillModel(NamedTuple):
+    spread: float = SIM_SPREAD        # bid/ask spread as a fraction of mid, for bar data
+    slippage: float = SIM_SLIPPAGE    # fraction of price lost on every market fill
+    latency_ms: int = SIM_LATENCY_MS  # from signal to the order reaching the market
+
+    def quote(self, mid):
+        half = mid * self.spread / 2
+        return mid - half, mid + half
+
+    def market(self, bid, ask, side):
+        # side 1 buys at the ask, -1 sells at the bid, both slipped against the order
+        return ask * (1 + self.slippage) if side > 0 else bid * (1 - self.slippage)
+
+
+class RunConfig(NamedTuple):
+    size: float = 1.0
+    stop_loss: Optional[float] = None    # distance from the entry as a fraction of price
+    take_profit: Optional[float] = None
+    balance: float = SIM_BALANCE
+    settings: Optional[dict] = None      # risk settings, RiskSettings() defaults when None
+
+
+class Simulator:
+    def __init__(self, epic, plugin, fill=FillModel(), config=RunConfig(), bar_seconds=60):
+        self.epic = epic
+        self.plugin = plugin
+        self.fill = fill
+        self.config = config
+        self.now = 0.0
+        settings = dict(config.settings or RiskSettings().dict())
+        self.stream = QuoteStream([epic], bar_seconds=bar_seconds)
+        self.risk = RiskEngine(settings_loader=lambda username: dict(settings), clock=lambda: self.now,
+                               quotes=self.stream)
+        self.stream.tick_listeners = [self.risk.on_tick]
+        self.stream.bar_listeners = [self._on_stream_bar]
+        self.user = User(username="simulator", password="", api_key="", api_key_password="", use_demo=True,
+                         account_info={"accountInfo": {"balance": config.balance}})
+        self.balance = config.balance
+        # (side, size, entry, stop, limit) of the simulated broker's open position
+        self.position = None
+        self.orders = []
+        self.trade_returns = []
+        self.equity = []
+        self.stats = {"bars": 0, "ticks": 0, "orders": 0, "rejected": 0, "stops": 0, "limits": 0}
+
+    # --- simulated broker ---
+
+    def _open(self, side, bid, ask):
+        direction = SIDES[side]
+        estimate = ask if side > 0 else bid
+        stop = estimate * (1 - side * self.config.stop_loss) if self.config.stop_loss else None
+        rejection, kind = self.risk.check(self.user, self.epic, direction, self.config.size, stop)
+        if rejection is not None:
+            self.stats["rejected"] += 1
+            return
+        price = self.fill.market(bid, ask, side)
+        stop = price * (1 - side * self.config.stop_loss) if self.config.stop_loss else None
+        limit = price * (1 + side * self.config.take_profit) if self.config.take_profit else None
+        self.position = (side, self.config.size, price, stop, limit)
+        self.stats["orders"] += 1
+        self.risk.settle(self.user.username, self.epic, direction, self.config.size,
+                         {"dealReference": f"SIM{self.stats['orders']}", "level": price}, kind)
+
+    def _close(self, price):
+        side, size, entry, _, _ = self.position
+        self.position = None
+        self.balance += side * size * (price - entry)
+        self.trade_returns.append(side * (price / entry - 1))
+        # The risk book learns about the close the way it does live: from the broker's positions
+        self.risk.reconcile(self.user.username, [])
+        self.risk.book(self.user).balance = self.balance
+
+    def _target(self, side, bid, ask):
+        if self.position is not None and self.position[0] != side:
+            self._close(self.fill.market(bid, ask, -self.position[0]))
+        if self.position is None and side != HOLD:
+            self._open(side, bid, ask)
+
+    def _exits(self, bid_low, bid_high, ask_low, ask_high, open_bid=None, open_ask=None):
+        # Stop first when both levels are inside the range; gaps fill at the open
+        if self.position is None:
+            return
+        side, _, _, stop, limit = self.position
+        # A long closes by selling at the bid, a short by buying at the ask
+        adverse, favourable, start = (bid_low, bid_high, open_bid) if side > 0 else (ask_high, ask_low, open_ask)
+        if stop is not None and side * (adverse - stop) <= 0:
+            level = start if start is not None and side * (start - stop) < 0 else stop
+            self.stats["stops"] += 1
+            self._close(level * (1 - side * self.fill.slippage))
+        elif limit is not None and side * (favourable - limit) >= 0:
+            level = start if start is not None and side * (start - limit) > 0 else limit
+            self.stats["limits"] += 1
+            self._close(level)
+
+    def _mark(self, bid, ask):
+        pnl = 0.0
+        if self.position is not None:
+            side, size, entry, _, _ = self.position
+            pnl = side * size * ((bid if side > 0 else ask) - entry)
+        self.equity.append(self.balance + pnl)
+
+    # --- replay ---
+
+    def _tick(self, bid, ask, timestamp_ms):
+        # Bar replay has no ticks to build bars from, only quotes for the risk engine
+        self.stream.quotes[self.epic] = Quote(bid, ask, timestamp_ms)
+        self.risk.on_tick(self.epic, bid, ask, timestamp_ms)
+        self.plugin.on_tick(bid, ask, timestamp_ms)
+
+    def run_bars(self, time_s, open_, high, low, close, resolution="HOUR"):
+        # One pass over candle columns; a signal on a bar's close is traded at that
+        # close, or at the next bar's open when there is latency
+        seconds = RESOLUTION_SECONDS[resolution]
+        quote = self.fill.quote
+        due = None
+        for i in range(len(close)):
+            start, o, h, l, c = float(time_s[i]), float(open_[i]), float(high[i]), float(low[i]), float(close[i])
+            if c != c:
+                continue
+            self.now = start
+            open_bid, open_ask = quote(o)
+            if due is not None:
+                self._tick(open_bid, open_ask, int(start * 1000))
+                self._target(due, open_bid, open_ask)
+                due = None
+            (bid_low, ask_low), (bid_high, ask_high) = quote(l), quote(h)
+            self._exits(bid_low, bid_high, ask_low, ask_high, open_bid, open_ask)
+            self.now = start + seconds
+            bid, ask = quote(c)
+            self._tick(bid, ask, int(self.now * 1000))
+            signal, _ = self.plugin.on_bar((int(start), o, h, l, c, 0))
+            self.stats["bars"] += 1
+            if self.fill.latency_ms:
+                due = signal
+            else:
+                self._target(signal, bid, ask)
+            self._mark(bid, ask)
+        if self.position is not None:
+            self._close(self.fill.market(bid, ask, -self.position[0]))
+        return self.result(periods_per_year(resolution))
+
+    def _on_stream_bar(self, epic, bar):
+        signal, _ = self.plugin.on_bar(bar)
+        self.stats["bars"] += 1
+        self.orders.append((self.now * 1000 + self.fill.latency_ms, signal))
+
+    def run_ticks(self, timestamp_ms, bid, ask):
+        # Ticks go through QuoteStream.on_quote, so bars are built exactly as live.
+        # Orders come from completed bars and fill on the first tick at or after
+        # their latency has passed.
+        for i in range(len(timestamp_ms)):
+            ts, b, a = int(timestamp_ms[i]), float(bid[i]), float(ask[i])
+            self.now = ts / 1000
+            self._fill_orders(ts, b, a)
+            self._exits(b, b, a, a)
+            bars = self.stats["bars"]
+            self.stream.on_quote(self.epic, b, a, ts)
+            self.plugin.on_tick(b, a, ts)
+            self.stats["ticks"] += 1
+            if self.stats["bars"] != bars:
+                self._fill_orders(ts, b, a)
+                self._mark(b, a)
+        if self.position is not None:
+            self._close(self.fill.market(b, a, -self.position[0]))
+        return self.result(365 * 86400 / self.stream.bar_seconds)
+
+    def _fill_orders(self, ts, bid, ask):
+        while self.orders and self.orders[0][0] <= ts:
+            self._target(self.orders.pop(0)[1], bid, ask)
+
+    def result(self, annualize):
+        returns = np.asarray(self.trade_returns)
+        curve = np.concatenate([[self.config.balance], self.equity])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bar_returns = np.diff(curve) / curve[:-1]
+            std = bar_returns.std(ddof=1) if len(bar_returns) > 1 else 0.0
+        trades = len(returns)
+        return {
+            "trades": trades,
+            "win_rate": float((returns > 0).mean()) if trades else None,
+            "expectancy": float(returns.mean()) if trades else None,
+            "total_return": self.balance / self.config.balance - 1,
+            "max_drawdown": float(np.max(1 - curve / np.maximum.accumulate(curve))),
+            "sharpe": float(bar_returns.mean() / std * np.sqrt(annualize)) if std > 0 else None,
+            "final_balance": self.balance,
+            **self.stats,
+        }
+
+
+def data_hash(columns):
+    # Fingerprint of a candle series for the sweep result cache
+    digest = hashlib.blake2b(digest_size=16)
+    for name in DATA_FIELDS:
+        digest.update(np.ascontiguousarray(columns[name], dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def run_key(strategy, params, digest, fill, config, resolution):
+    payload = json.dumps([strategy, params, digest, list(fill), config._asdict(), resolution],
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _simulate(matrix, task):
+    # Sweep worker: one run over columns [offset, offset + length) of the shared data
+    epic, strategy, params, offset, length, fill, config, resolution = task
+    plugin = strategy_plugins.create(strategy, **params)
+    if plugin is None:
+        return {"error": f"Unknown strategy {strategy}"}
+    data = matrix[:, offset:offset + length]
+    simulator = Simulator(epic, plugin, FillModel(*fill), RunConfig(**config))
+    return simulator.run_bars(*data, resolution=resolution)
+
+
+def param_grid(grid):
+    # {"fast": [8, 12], "slow": [26]} -> [{"fast": 8, "slow": 26}, {"fast": 12, "slow": 26}]
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def sweep(epics, strategy, grid, resolution="HOUR", fill=FillModel(), config=RunConfig(), bars=None,
+          pool=signal_pool, database=db):
+    # Every epic x parameter combination over the stored candles; cached runs
+    # are read back instead of simulated
+    started = time.perf_counter()
+    columns, offsets, digests, width = [], {}, {}, 0
+    for epic in epics:
+        data = candle_store.read(epic, resolution)
+        if bars:
+            data = {name: values[-bars:] for name, values in data.items()}
+        if not len(data["time"]):
+            continue
+        columns.append(np.vstack([np.asarray(data[name], dtype=np.float64) for name in DATA_FIELDS]))
+        offsets[epic] = (width, len(data["time"]))
+        digests[epic] = data_hash(data)
+        width += len(data["time"])
+    matrix = np.hstack(columns) if columns else np.empty((len(DATA_FIELDS), 0))
+
+    runs, tasks, keys = [], [], []
+    combos = param_grid(grid)
+    for epic, (offset, length) in offsets.items():
+        for params in combos:
+            key = run_key(strategy, params, digests[epic], fill, config, resolution)
+            runs.append({"epic": epic, "strategy": strategy, "params": params, "key": key})
+            keys.append(key)
+            tasks.append((epic, strategy, params, offset, length, tuple(fill), config._asdict(), resolution))
+    cached = database.sim_results(keys)
+    todo = [i for i, key in enumerate(keys) if key not in cached]
+    results = pool.map(_simulate, matrix, [tasks[i] for i in todo]) if todo else []
+    fresh = dict(zip(todo, results))
+    database.save_sim_results([
+        (keys[i], strategy, json.dumps(runs[i]["params"], sort_keys=True), digests[runs[i]["epic"]], result)
+        for i, result in fresh.items() if "error" not in result
+    ])
+    for i, run in enumerate(runs):
+        run["cached"] = i not in fresh
+        run["result"] = fresh[i] if i in fresh else cached[keys[i]]
+    elapsed = time.perf_counter() - started
+    return {
+        "runs": runs,
+        "stats": {
+            "runs": len(runs),
+            "simulated": len(fresh),
+            "cached": len(runs) - len(fresh),
+            "elapsed": elapsed,
+            "runs_per_sec": len(runs) / elapsed if elapsed else 0.0,
+            "simulated_per_sec": len(fresh) / elapsed if elapsed else 0.0,
+            "workers": pool.workers,
+        },
+    }
+
+
+def _parse_param(value):
+    name, _, values = value.partition("=")
+    return name, [json.loads(v) for v in values.split(",") if v]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event-driven parameter sweep over stored candles")
+    parser.add_argument("epics", help="comma separated epics")
+    parser.add_argument("strategy")
+    parser.add_argument("--param", action="append", default=[], help="name=v1,v2,... (JSON values)")
+    parser.add_argument("--resolution", default="HOUR")
+    parser.add_argument("--bars", type=int, default=None)
+    parser.add_argument("--spread", type=float, default=SIM_SPREAD)
+    parser.add_argument("--slippage", type=float, default=SIM_SLIPPAGE)
+    parser.add_argument("--latency", type=int, default=SIM_LATENCY_MS, help="milliseconds")
+    parser.add_argument("--size", type=float, default=1.0)
+    parser.add_argument("--stop-loss", type=float, default=None)
+    parser.add_argument("--take-profit", type=float, default=None)
+    parser.add_argument("--balance", type=float, default=SIM_BALANCE)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    strategy_plugins.discover()
+    signal_pool.start()
+    try:
+        report = sweep(
+            [e for e in args.epics.split(",") if e], args.strategy, dict(_parse_param(p) for p in args.param),
+            resolution=args.resolution, bars=args.bars,
+            fill=FillModel(args.spread, args.slippage, args.latency),
+            config=RunConfig(args.size, args.stop_loss, args.take_profit, args.balance),
+        )
+    finally:
+        signal_pool.shutdown()
+    ranked = sorted(report["runs"], key=lambda r: r["result"].get("sharpe") or float("-inf"), reverse=True)
+    for run in ranked[:args.top]:
+        print(json.dumps({k: run[k] for k in ("epic", "params", "cached", "result")}))
+    print(json.dumps(report["stats"]))
@@ -0,0 +1,408 @@
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# SQLite persistence for users, risk settings, the trade journal, report
+# snapshots and backtest / simulation results. WAL mode lets several uvicorn workers read while one writes, and
+# every change touches a single row instead of rewriting a whole JSON file.
+DATABASE_PATH = os.getenv("DATABASE_PATH", "trading_bot.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+# Seconds to wait for a pooled connection before giving up
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    api_key TEXT NOT NULL,
+    api_key_password TEXT NOT NULL,
+    use_demo INTEGER NOT NULL,
+    cc_session_token TEXT,
+    temp_cc_login_data TEXT,
+    account_info TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS risk_settings (
+    user_id TEXT PRIMARY KEY,
+    settings TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trade_journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    epic TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    size REAL NOT NULL,
+    take_profit REAL,
+    stop_loss REAL,
+    deal_reference TEXT,
+    response TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_trade_journal_user_time ON trade_journal (username, created_at);
+CREATE TABLE IF NOT EXISTS report_snapshots (
+    username TEXT NOT NULL,
+    report_date TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (username, report_date)
+);
+CREATE TABLE IF NOT EXISTS backtest_results (
+    symbol TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    data TEXT NOT NULL,
+    computed_at REAL NOT NULL,
+    PRIMARY KEY (symbol, resolution)
+);
+CREATE TABLE IF NOT EXISTS sim_results (
+    key TEXT PRIMARY KEY,
+    strategy TEXT NOT NULL,
+    params TEXT NOT NULL,
+    data_hash TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS instruments (
+    epic TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('users_version', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('risk_settings_version', 0);
+"""
+
+USER_COLUMNS = (
+    "username", "password", "api_key", "api_key_password", "use_demo",
+    "cc_session_token", "temp_cc_login_data", "account_info",
+)
+JSON_USER_COLUMNS = ("temp_cc_login_data", "account_info")
+
+SQL_GET_USER = f"SELECT {', '.join(USER_COLUMNS)} FROM users WHERE username = ?"
+SQL_UPSERT_USER = (
+    f"INSERT INTO users ({', '.join(USER_COLUMNS)}, updated_at) VALUES ({', '.join('?' * (len(USER_COLUMNS) + 1))}) "
+    "ON CONFLICT(username) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in USER_COLUMNS[1:] + ("updated_at",))
+)
+SQL_BUMP_USERS_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'users_version'"
+SQL_USERS_VERSION = "SELECT value FROM meta WHERE key = 'users_version'"
+SQL_BUMP_RISK_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'risk_settings_version'"
+SQL_RISK_VERSION = "SELECT value FROM meta WHERE key = 'risk_settings_version'"
+SQL_GET_RISK = "SELECT settings, version FROM risk_settings WHERE user_id = ?"
+SQL_ALL_RISK = "SELECT user_id, settings, version FROM risk_settings"
+SQL_RISK_ROWS = "SELECT user_id, settings, version, updated_at FROM risk_settings"
+SQL_DELETE_RISK = "DELETE FROM risk_settings WHERE user_id = ?"
+SQL_UPSERT_RISK = (
+    "INSERT INTO risk_settings (user_id, settings, version, updated_at) VALUES (?, ?, 1, ?) "
+    "ON CONFLICT(user_id) DO UPDATE SET settings = excluded.settings, "
+    "version = risk_settings.version + 1, updated_at = excluded.updated_at"
+)
+SQL_INSERT_TRADE = (
+    "INSERT INTO trade_journal (username, epic, direction, size, take_profit, stop_loss, deal_reference, response, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+SQL_TRADES_SINCE = (
+    "SELECT id, epic, direction, size, take_profit, stop_loss, deal_reference, response, created_at "
+    "FROM trade_journal WHERE username = ? AND created_at >= ? ORDER BY created_at"
+)
+SQL_UPSERT_REPORT = (
+    "INSERT INTO report_snapshots (username, report_date, data, created_at) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(username, report_date) DO UPDATE SET data = excluded.data, created_at = excluded.created_at"
+)
+SQL_GET_REPORT = "SELECT data FROM report_snapshots WHERE username = ? AND report_date = ?"
+SQL_UPSERT_BACKTEST = (
+    "INSERT INTO backtest_results (symbol, resolution, data, computed_at) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(symbol, resolution) DO UPDATE SET data = excluded.data, computed_at = excluded.computed_at"
+)
+SQL_BACKTEST_RESULTS = "SELECT symbol, data, computed_at FROM backtest_results WHERE resolution = ?"
+SQL_INSERT_SIM = (
+    "INSERT OR REPLACE INTO sim_results (key, strategy, params, data_hash, result, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+SQL_GET_SIM = "SELECT result FROM sim_results WHERE key = ?"
+SQL_UPSERT_INSTRUMENT = (
+    "INSERT INTO instruments (epic, data, updated_at) VALUES (?, ?, ?) "
+    "ON CONFLICT(epic) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at"
+)
+SQL_DELETE_INSTRUMENT = "DELETE FROM instruments WHERE epic = ?"
+SQL_ALL_INSTRUMENTS = "SELECT data FROM instruments"
+SQL_SET_INSTRUMENTS_REFRESHED = (
+    "INSERT INTO meta (key, value) VALUES ('instruments_refreshed', ?) "
+    "ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+)
+SQL_INSTRUMENTS_REFRESHED = "SELECT value FROM meta WHERE key = 'instruments_refreshed'"
+
+
+class DatabaseBusy(Exception):
+    pass
+
+
+class Database:
+    def __init__(self, path=DATABASE_PATH, pool_size=DB_POOL_SIZE, pool_timeout=DB_POOL_TIMEOUT):
+        self.path = path
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self._pool = queue.Queue()
+        self._created = 0
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # cached_statements keeps the prepared statements for the SQL above
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False,
+                               isolation_level=None, cached_statements=128)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        if not self._initialized:
+            conn.executescript(SCHEMA)
+            self._initialized = True
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._created < self.pool_size
+                if grow:
+                    conn = self._connect()
+                    self._created += 1
+            if not grow:
+                try:
+                    conn = self._pool.get(timeout=self.pool_timeout)
+                except queue.Empty:
+                    raise DatabaseBusy(f"No database connection free after {self.pool_timeout}s")
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    # --- users ---
+
+    @staticmethod
+    def _user_from_row(row):
+        user = dict(zip(USER_COLUMNS, row))
+        user["use_demo"] = bool(user["use_demo"])
+        for column in JSON_USER_COLUMNS:
+            if user[column] is not None:
+                user[column] = json.loads(user[column])
+        return user
+
+    @staticmethod
+    def _user_params(user):
+        values = []
+        for column in USER_COLUMNS:
+            value = user.get(column)
+            if column in JSON_USER_COLUMNS and value is not None:
+                value = json.dumps(value)
+            elif column == "use_demo":
+                value = int(bool(value))
+            values.append(value)
+        return values + [time.time()]
+
+    def get_user(self, username):
+        with self.connection() as conn:
+            row = conn.execute(SQL_GET_USER, (username,)).fetchone()
+        return self._user_from_row(row) if row else None
+
+    def upsert_user(self, user):
+        with self.transaction() as conn:
+            conn.execute(SQL_UPSERT_USER, self._user_params(user))
+            conn.execute(SQL_BUMP_USERS_VERSION)
+
+    def upsert_users(self, users):
+        with self.transaction() as conn:
+            conn.executemany(SQL_UPSERT_USER, [self._user_params(u) for u in users])
+            conn.execute(SQL_BUMP_USERS_VERSION)
+
+    def users_version(self):
+        # Bumped on every user write, lets each worker's cache notice other workers' writes
+        with self.connection() as conn:
+            return conn.execute(SQL_USERS_VERSION).fetchone()[0]
+
+    # --- risk settings ---
+
+    def risk_settings_version(self):
+        # Bumped on every risk settings write, the users_version counterpart
+        with self.connection() as conn:
+            return conn.execute(SQL_RISK_VERSION).fetchone()[0]
+
+    def get_risk_settings(self, user_id):
+        with self.connection() as conn:
+            row = conn.execute(SQL_GET_RISK, (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all_risk_settings(self):
+        with self.connection() as conn:
+            rows = conn.execute(SQL_ALL_RISK).fetchall()
+        return {user_id: json.loads(settings) for user_id, settings, _ in rows}
+
+    def risk_settings_rows(self):
+        # (user_id, settings, version, updated_at) for every stored entry
+        with self.connection() as conn:
+            rows = conn.execute(SQL_RISK_ROWS).fetchall()
+        return [(user_id, json.loads(settings), version, updated_at) for user_id, settings, version, updated_at in rows]
+
+    def set_risk_settings(self, user_id, settings):
+        # Returns the new version of the entry
+        with self.transaction() as conn:
+            conn.execute(SQL_UPSERT_RISK, (user_id, json.dumps(settings), time.time()))
+            conn.execute(SQL_BUMP_RISK_VERSION)
+            return conn.execute(SQL_GET_RISK, (user_id,)).fetchone()[1]
+
+    def delete_risk_settings(self, user_id):
+        # True when there was an entry to delete
+        with self.transaction() as conn:
+            deleted = conn.execute(SQL_DELETE_RISK, (user_id,)).rowcount
+            if deleted:
+                conn.execute(SQL_BUMP_RISK_VERSION)
+            return bool(deleted)
+
+    def rekey_risk_settings(self, user_id, settings, stale_ids):
+        # Moves settings stored under old keys to user_id in one transaction
+        with self.transaction() as conn:
+            for stale_id in stale_ids:
+                conn.execute(SQL_DELETE_RISK, (stale_id,))
+            conn.execute(SQL_UPSERT_RISK, (user_id, json.dumps(settings), time.time()))
+            conn.execute(SQL_BUMP_RISK_VERSION)
+            return conn.execute(SQL_GET_RISK, (user_id,)).fetchone()[1]
+
+    # --- trade journal ---
+
+    def record_trade(self, username, epic, direction, size, take_profit=None, stop_loss=None, response=None):
+        deal_reference = response.get("dealReference") if isinstance(response, dict) else None
+        with self.transaction() as conn:
+            cur = conn.execute(SQL_INSERT_TRADE, (
+                username, epic, direction, size, take_profit, stop_loss, deal_reference,
+                json.dumps(response) if response is not None else None, time.time(),
+            ))
+            return cur.lastrowid
+
+    def trades_since(self, username, since=0.0):
+        with self.connection() as conn:
+            rows = conn.execute(SQL_TRADES_SINCE, (username, since)).fetchall()
+        keys = ("id", "epic", "direction", "size", "take_profit", "stop_loss", "deal_reference", "response", "created_at")
+        trades = []
+        for row in rows:
+            trade = dict(zip(keys, row))
+            trade["response"] = json.loads(trade["response"]) if trade["response"] else None
+            trades.append(trade)
+        return trades
+
+    # --- report snapshots ---
+
+    def save_report_snapshot(self, username, report_date, data):
+        with self.transaction() as conn:
+            conn.execute(SQL_UPSERT_REPORT, (username, report_date, json.dumps(data), time.time()))
+
+    def get_report_snapshot(self, username, report_date):
+        with self.connection() as conn:
+            row = conn.execute(SQL_GET_REPORT, (username, report_date)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # --- backtest results ---
+
+    def save_backtest_results(self, resolution, results, computed_at=None):
+        # results: {symbol: {strategy: metrics}}
+        computed_at = time.time() if computed_at is None else computed_at
+        with self.transaction() as conn:
+            conn.executemany(SQL_UPSERT_BACKTEST, [
+                (symbol, resolution, json.dumps(per_strategy), computed_at)
+                for symbol, per_strategy in results.items()
+            ])
+
+    def backtest_results(self, resolution):
+        # {symbol: (per_strategy, computed_at)}
+        with self.connection() as conn:
+            rows = conn.execute(SQL_BACKTEST_RESULTS, (resolution,)).fetchall()
+        return {symbol: (json.loads(data), computed_at) for symbol, data, computed_at in rows}
+
+    def save_sim_results(self, rows):
+        # rows: (key, strategy, params_json, data_hash, result)
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(SQL_INSERT_SIM, [(key, strategy, params, digest, json.dumps(result), now)
+                                              for key, strategy, params, digest, result in rows])
+
+    def sim_results(self, keys):
+        # {key: result} for the keys that have a stored run
+        found = {}
+        with self.connection() as conn:
+            for key in keys:
+                row = conn.execute(SQL_GET_SIM, (key,)).fetchone()
+                if row:
+                    found[key] = json.loads(row[0])
+        return found
+
+    # --- instrument catalogue ---
+
+    def save_instruments(self, changed, removed=(), refreshed_at=None):
+        # changed: instrument dicts keyed by their "epic"; removed: epics
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(SQL_UPSERT_INSTRUMENT, [(i["epic"], json.dumps(i), now) for i in changed])
+            conn.executemany(SQL_DELETE_INSTRUMENT, [(epic,) for epic in removed])
+            conn.execute(SQL_SET_INSTRUMENTS_REFRESHED, (int(now if refreshed_at is None else refreshed_at),))
+
+    def instruments(self):
+        # ([instrument], time of the last refresh or None)
+        with self.connection() as conn:
+            rows = conn.execute(SQL_ALL_INSTRUMENTS).fetchall()
+            refreshed = conn.execute(SQL_INSTRUMENTS_REFRESHED).fetchone()
+        return [json.loads(data) for data, in rows], (refreshed[0] if refreshed else None)
+
+
+db = Database()
+
+
+def migrate(users_file=None, risk_settings_file=None, database=None):
+    # One-shot import of the legacy JSON files
+    database = database or db
+    imported = {"users": 0, "risk_settings": 0}
+    if users_file and os.path.exists(users_file):
+        with open(users_file, "r") as f:
+            users = json.load(f)
+        database.upsert_users(users.values())
+        imported["users"] = len(users)
+    if risk_settings_file and os.path.exists(risk_settings_file):
+        with open(risk_settings_file, "r") as f:
+            settings = json.load(f)
+        for user_id, values in settings.items():
+            database.set_risk_settings(user_id, values)
+        imported["risk_settings"] = len(settings)
+    return imported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trading bot storage tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    m = sub.add_parser("migrate", help="Import users.json / risk_settings.json into SQLite")
+    m.add_argument("--users", default=os.getenv("USERS_FILE", "users.json"))
+    m.add_argument("--risk-settings", default="risk_settings.json")
+    m.add_argument("--database", default=DATABASE_PATH)
+    args = parser.parse_args()
+    if args.command == "migrate":
+        result = migrate(args.users, args.risk_settings, Database(args.database))
+        print(f"Imported {result['users']} users and {result['risk_settings']} risk settings into {args.database}")
@@ -0,0 +1,254 @@
+import numpy as np
+from .indicators import indicator_cache
+
+# Strategies score the latest bar of every row of an (asset x bar) close
+# matrix at once. generate_signals(matrix) returns (signals, confidence):
+# int8 directions (LONG / SHORT / HOLD) and confidences in [0, 1], one per
+# row. generate_signal(prices) is the single-series form used by older code.
+# Each strategy is split into features() (indicator values from the matrix)
+# and score() (the decision), so incremental plugins can feed score() with
+# streaming indicator values and get exactly the same signals. series() gives
+# the same inputs for every bar, which generate_series() scores for backtests.
+LONG, SHORT, HOLD = 1, -1, 0
+SIGNAL_NAMES = {LONG: "long", SHORT: "short", HOLD: "hold"}
+
+
+def _clip(x):
+    return np.clip(np.nan_to_num(x), 0.0, 1.0)
+
+
+def _side(long_mask, short_mask):
+    return np.where(long_mask, LONG, np.where(short_mask, SHORT, HOLD)).astype(np.int8)
+
+
+class Strategy:
+    name = "base"
+
+    def features(self, prices):
+        # Inputs of score() for the latest bar of every row of an IndicatorCache
+        raise NotImplementedError
+
+    def score(self, *features):
+        # Works on arrays (batch) and on scalars (incremental plugins) alike
+        raise NotImplementedError
+
+    def generate_signals(self, matrix):
+        # matrix: (asset x bar) closes or an IndicatorCache shared between strategies
+        signals, confidence = self.score(*self.features(indicator_cache(matrix)))
+        return np.atleast_1d(signals), np.atleast_1d(confidence)
+
+    def series(self, prices):
+        # Inputs of score() for every bar, in the cache's packed space
+        raise NotImplementedError
+
+    def generate_series(self, matrix):
+        # (signals, confidence) for every bar of every row, packed like the cache
+        signals, confidence = self.score(*self.series(indicator_cache(matrix)))
+        return signals, confidence
+
+    def generate_signal(self, prices):
+        signals, confidence = self.generate_signals(np.asarray(prices, dtype=float)[None, :])
+        return SIGNAL_NAMES[int(signals[0])], float(confidence[0])
+
+
+class RSIReversion(Strategy):
+    name = "rsi_reversion"
+
+    def __init__(self, period=14, lower=30, upper=70):
+        self.period, self.lower, self.upper = period, lower, upper
+
+    def features(self, prices):
+        return (prices.latest(prices.rsi(self.period)),)
+
+    def series(self, prices):
+        return (prices.rsi(self.period),)
+
+    def score(self, value):
+        with np.errstate(invalid="ignore"):
+            signals = _side(value < self.lower, value > self.upper)
+            confidence = np.where(value < self.lower, (self.lower - value) / self.lower,
+                                  (value - self.upper) / (100 - self.upper))
+        return signals, np.where(signals != HOLD, _clip(0.5 + confidence), 0.0)
+
+
+class RSITrend(Strategy):
+    name = "rsi_trend"
+
+    def __init__(self, period=14, band=5):
+        self.period, self.band = period, band
+
+    def features(self, prices):
+        return (prices.latest(prices.rsi(self.period)),)
+
+    def series(self, prices):
+        return (prices.rsi(self.period),)
+
+    def score(self, value):
+        with np.errstate(invalid="ignore"):
+            signals = _side(value > 50 + self.band, value < 50 - self.band)
+        return signals, np.where(signals != HOLD, _clip(np.abs(value - 50) / 25), 0.0)
+
+
+class EMACrossover(Strategy):
+    name = "ema_crossover"
+
+    def __init__(self, fast=12, slow=26):
+        self.fast, self.slow = fast, slow
+
+    def features(self, prices):
+        return prices.latest(prices.ema(self.fast)), prices.latest(prices.ema(self.slow))
+
+    def series(self, prices):
+        return prices.ema(self.fast), prices.ema(self.slow)
+
+    def score(self, fast, slow):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            spread = (fast - slow) / slow
+            signals = _side(spread > 0, spread < 0)
+        return signals, np.where(signals != HOLD, _clip(0.5 + np.abs(spread) * 100), 0.0)
+
+
+class TripleEMATrend(Strategy):
+    name = "triple_ema"
+
+    def __init__(self, periods=(5, 20, 50)):
+        self.periods = periods
+
+    def features(self, prices):
+        return tuple(prices.latest(prices.ema(p)) for p in self.periods)
+
+    def series(self, prices):
+        return tuple(prices.ema(p) for p in self.periods)
+
+    def score(self, a, b, c):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            signals = _side((a > b) & (b > c), (a < b) & (b < c))
+            strength = np.abs(a - c) / c
+        return signals, np.where(signals != HOLD, _clip(0.5 + strength * 100), 0.0)
+
+
+class SMATrend(Strategy):
+    name = "sma_trend"
+
+    def __init__(self, period=50):
+        self.period = period
+
+    def features(self, prices):
+        return prices.latest_rolling(self.period)[0], prices.latest()
+
+    def series(self, prices):
+        return prices.sma(self.period), prices.packed
+
+    def score(self, average, close):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            distance = (close - average) / average
+            signals = _side(distance > 0, distance < 0)
+        return signals, np.where(signals != HOLD, _clip(0.4 + np.abs(distance) * 50), 0.0)
+
+
+class MACD(Strategy):
+    name = "macd"
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast, self.slow, self.signal = fast, slow, signal
+
+    def features(self, prices):
+        line, signal_line = prices.macd(self.fast, self.slow, self.signal)
+        return prices.latest(line) - prices.latest(signal_line), prices.latest()
+
+    def series(self, prices):
+        line, signal_line = prices.macd(self.fast, self.slow, self.signal)
+        return line - signal_line, prices.packed
+
+    def score(self, histogram, close):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            signals = _side(histogram > 0, histogram < 0)
+            strength = np.abs(histogram) / close
+        return signals, np.where(signals != HOLD, _clip(0.5 + strength * 500), 0.0)
+
+
+class BollingerReversion(Strategy):
+    name = "bollinger_reversion"
+
+    def __init__(self, period=20, k=2.0):
+        self.period, self.k = period, k
+
+    def features(self, prices):
+        mid, std = prices.latest_rolling(self.period)
+        return mid, mid + self.k * std, mid - self.k * std, prices.latest()
+
+    def series(self, prices):
+        return (*prices.bollinger(self.period, self.k), prices.packed)
+
+    def score(self, mid, upper, lower, close):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            signals = _side(close < lower, close > upper)
+            overshoot = np.where(close < lower, lower - close, close - upper) / (upper - mid)
+        return signals, np.where(signals != HOLD, _clip(0.5 + overshoot), 0.0)
+
+
+class ZScoreReversion(Strategy):
+    name = "zscore_reversion"
+
+    def __init__(self, period=20, threshold=2.0):
+        self.period, self.threshold = period, threshold
+
+    def features(self, prices):
+        mean, std = prices.latest_rolling(self.period)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (np.where(std > 0, (prices.latest() - mean) / std, np.nan),)
+
+    def series(self, prices):
+        return (prices.zscore(self.period),)
+
+    def score(self, z):
+        with np.errstate(invalid="ignore"):
+            signals = _side(z < -self.threshold, z > self.threshold)
+        return signals, np.where(signals != HOLD, _clip(np.abs(z) / (2 * self.threshold)), 0.0)
+
+
+class Momentum(Strategy):
+    name = "momentum"
+
+    def __init__(self, lookback=10, threshold=0.002):
+        self.lookback, self.threshold = lookback, threshold
+
+    def features(self, prices):
+        return prices.latest(bars_back=self.lookback), prices.latest()
+
+    def series(self, prices):
+        return prices.lagged(self.lookback), prices.packed
+
+    def score(self, past, close):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = (close - past) / past
+            signals = _side(change > self.threshold, change < -self.threshold)
+        return signals, np.where(signals != HOLD, _clip(np.abs(change) / (self.threshold * 5)), 0.0)
+
+
+class Breakout(Strategy):
+    name = "breakout"
+
+    def __init__(self, window=20):
+        self.window = window
+
+    def features(self, prices):
+        highs, lows = prices.extremes(self.window)
+        return highs, lows, prices.latest()
+
+    def series(self, prices):
+        return (*prices.channel(self.window), prices.packed)
+
+    def score(self, highs, lows, close):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            signals = _side(close > highs, close < lows)
+            beyond = np.where(close > highs, close - highs, lows - close) / (highs - lows)
+        return signals, np.where(signals != HOLD, _clip(0.6 + beyond), 0.0)
+
+
+STRATEGIES = {
+    s.name: s for s in (
+        RSIReversion(), RSITrend(), EMACrossover(), TripleEMATrend(), SMATrend(),
+        MACD(), BollingerReversion(), ZScoreReversion(), Momentum(), Breakout(),
+    )
+}
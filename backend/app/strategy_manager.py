@@ -1,10 +1,264 @@
-from typing import Dict, List
-from .strategy import STRATEGIES
-from .analytics import get_backtest_win_rates, get_recent_signal_performance
+from typing import Dict, List, NamedTuple, Optional
+import numpy as np
+from .indicators import IndicatorCache
+from .strategy import STRATEGIES, SIGNAL_NAMES, LONG, SHORT, HOLD
+from . import strategy_plugins
+from .strategy_plugins import Bar, StrategyPlugin
+
+# "batch" scores whole histories on every call; "parallel" does the same with
+# the symbols sharded across a process pool; "incremental" keeps one plugin
+# per symbol x strategy fed bar by bar, so a call only reads state
+MODES = ("batch", "parallel", "incremental")
+
+# Direction order for the majority vote; ties go to the first, as before
+DIRECTIONS = (LONG, SHORT, HOLD)
+
+
+class SignalBatch(NamedTuple):
+    # Signals for every symbol x active strategy, computed as array ops
+    symbols: List[str]
+    strategies: List[str]
+    signals: np.ndarray            # (symbols, strategies) int8, LONG / SHORT / HOLD
+    raw_confidence: np.ndarray     # (symbols, strategies)
+    final_confidence: np.ndarray   # (symbols, strategies) after win-rate weighting
+    backtest_win_rates: np.ndarray  # (symbols, strategies), NaN where unknown
+    recent_win_rates: np.ndarray    # (symbols, strategies), NaN where unknown
+    signal: np.ndarray             # (symbols,) ensemble direction
+    confidence: np.ndarray         # (symbols,)
+    agreement: np.ndarray          # (symbols,)
+    volatility_factor: np.ndarray  # (symbols,)
+
+
+def prices_to_matrix(asset_prices: Dict[str, List[float]]):
+    # Right-aligns price lists of different lengths into one NaN-padded matrix
+    symbols = list(asset_prices)
+    width = max((len(p) for p in asset_prices.values()), default=0)
+    matrix = np.full((len(symbols), width), np.nan)
+    for row, symbol in enumerate(symbols):
+        prices = asset_prices[symbol]
+        if len(prices):
+            matrix[row, width - len(prices):] = np.asarray(prices, dtype=float)
+    return symbols, matrix
+
+
+def rates_matrix(symbols, strategies, rates: Optional[Dict[str, Dict[str, float]]]):
+    # {symbol: {strategy: rate}} -> (symbols, strategies) array, NaN where missing
+    matrix = np.full((len(symbols), len(strategies)), np.nan)
+    if rates:
+        columns = {name: col for col, name in enumerate(strategies)}
+        for row, symbol in enumerate(symbols):
+            for name, rate in (rates.get(symbol) or {}).items():
+                col = columns.get(name)
+                if col is not None:
+                    matrix[row, col] = rate
+    return matrix
+
+
+def _replay(name, prices):
+    # Whole-history mode for plugin-only strategies: feed each row from scratch
+    signals = np.zeros(prices.packed.shape[0], dtype=np.int8)
+    raw = np.zeros(prices.packed.shape[0])
+    for row, count in enumerate(prices.counts):
+        plugin = strategy_plugins.create(name)
+        for close in prices.packed[row, :count]:
+            close = float(close)
+            signals[row], raw[row] = plugin.on_bar(Bar(0, close, close, close, close, 0))
+    return signals, raw
+
+
+def score_matrix(names, matrix):
+    # (symbols, strategies) signals and raw confidences for a close matrix.
+    # Strategies share one packed matrix and its indicator series.
+    prices = IndicatorCache(matrix)
+    signals = np.zeros((prices.packed.shape[0], len(names)), dtype=np.int8)
+    raw = np.zeros(signals.shape)
+    for col, name in enumerate(names):
+        if name in STRATEGIES:
+            signals[:, col], raw[:, col] = STRATEGIES[name].generate_signals(prices)
+        else:
+            signals[:, col], raw[:, col] = _replay(name, prices)
+    return signals, raw
+
 
 class StrategyManager:
-    def __init__(self, active_strategies: List[str]):
+    def __init__(self, active_strategies: List[str], mode: str = "batch", pool=None):
+        if mode not in MODES or (mode == "parallel" and pool is None):
+            raise ValueError(f"Unknown strategy manager mode {mode}")
         self.active_strategies = active_strategies
+        self.mode = mode
+        # parallel mode: a SignalPool sharding the symbols across processes
+        self.pool = pool
+        # incremental mode: symbol -> plugins, and their latest outputs
+        self.plugins = {}
+        self.live_signals = {}
+        self.live_confidence = {}
+        # Called as listener(symbol, strategy_names, signals, bar) after each live bar
+        self.signal_listeners = []
+        self.stats = {"bars": 0, "ticks": 0, "primed": 0}
+
+    def strategy_names(self):
+        if self.mode == "incremental":
+            return [name for name in self.active_strategies if name in strategy_plugins.PLUGINS]
+        return [name for name in self.active_strategies
+                if name in STRATEGIES or name in strategy_plugins.PLUGINS]
+
+    # Incremental mode
+
+    def _plugins_for(self, symbol):
+        plugins = self.plugins.get(symbol)
+        if plugins is None:
+            names = self.strategy_names()
+            plugins = self.plugins[symbol] = [strategy_plugins.create(name) for name in names]
+            self.live_signals[symbol] = np.zeros(len(names), dtype=np.int8)
+            self.live_confidence[symbol] = np.zeros(len(names))
+        return plugins
+
+    def _update(self, symbol, bar):
+        plugins = self._plugins_for(symbol)
+        signals, confidence = self.live_signals[symbol], self.live_confidence[symbol]
+        for col, plugin in enumerate(plugins):
+            signals[col], confidence[col] = plugin.on_bar(bar)
+        self.stats["bars"] += 1
+
+    def on_bar(self, symbol, bar):
+        self._update(symbol, bar)
+        for listener in self.signal_listeners:
+            try:
+                listener(symbol, self.strategy_names(), self.live_signals[symbol], bar)
+            except Exception as e:
+                print("Signal listener error:", e)
+
+    def on_tick(self, symbol, bid, ask, timestamp):
+        plugins = self.plugins.get(symbol)
+        if not plugins:
+            return
+        signals, confidence = self.live_signals[symbol], self.live_confidence[symbol]
+        for col, plugin in enumerate(plugins):
+            # Skip the call for plugins that only act on bars
+            if type(plugin).on_tick is not StrategyPlugin.on_tick:
+                signals[col], confidence[col] = plugin.on_tick(bid, ask, timestamp)
+        self.stats["ticks"] += 1
+
+    def prime(self, symbol, closes):
+        # Replays a symbol's close history once; later bars arrive via on_bar
+        self.plugins.pop(symbol, None)
+        self.live_signals.pop(symbol, None)
+        self.live_confidence.pop(symbol, None)
+        self._plugins_for(symbol)
+        for close in closes:
+            if not np.isnan(close):
+                close = float(close)
+                self._update(symbol, Bar(0, close, close, close, close, 0))
+        self.stats["primed"] += 1
+
+    def attach(self, stream):
+        # Follows a QuoteStream's ticks and completed bars
+        stream.tick_listeners.append(self.on_tick)
+        stream.bar_listeners.append(self.on_bar)
+
+    def snapshot(self):
+        return {symbol: [p.snapshot() for p in plugins] for symbol, plugins in list(self.plugins.items())}
+
+    def restore(self, state):
+        for symbol, states in state.items():
+            plugins = self._plugins_for(symbol)
+            for col, (plugin, plugin_state) in enumerate(zip(plugins, states)):
+                plugin.restore(plugin_state)
+                self.live_signals[symbol][col] = plugin.signal
+                self.live_confidence[symbol][col] = plugin.confidence
+
+    def get_stats(self):
+        return {"mode": self.mode, "symbols": len(self.plugins), **self.stats}
+
+    def get_signals_batch(
+        self,
+        symbols: List[str],
+        matrix: np.ndarray = None,                    # (symbols, bars) closes, NaN-padded
+        backtest_win_rates: np.ndarray = None,        # (symbols, strategies)
+        recent_perf: np.ndarray = None,               # (symbols, strategies)
+        volatility: np.ndarray = None,                # (symbols,)
+        max_volatility: float = None,
+    ) -> SignalBatch:
+        names = self.strategy_names()
+        rows = len(symbols)
+        if self.mode == "incremental":
+            signals = np.zeros((rows, len(names)), dtype=np.int8)
+            raw = np.zeros((rows, len(names)))
+            # State is read as is; the matrix only primes symbols seen for the first time
+            for row, symbol in enumerate(symbols):
+                if symbol not in self.plugins and matrix is not None:
+                    self.prime(symbol, matrix[row])
+                if symbol in self.plugins:
+                    signals[row], raw[row] = self.live_signals[symbol], self.live_confidence[symbol]
+        elif self.mode == "parallel":
+            signals, raw = self.pool.score(names, matrix)
+        else:
+            signals, raw = score_matrix(names, matrix)
+
+        # 60% base, 40% scaled by backtest win rate; 70/30 for recent performance
+        backtest = np.full(raw.shape, np.nan) if backtest_win_rates is None else backtest_win_rates
+        recent = np.full(raw.shape, np.nan) if recent_perf is None else recent_perf
+        final = raw * np.where(np.isnan(backtest), 1.0, 0.6 + 0.4 * backtest)
+        final *= np.where(np.isnan(recent), 1.0, 0.7 + 0.3 * recent)
+
+        # Majority vote for direction
+        votes = np.stack([signals == d for d in DIRECTIONS])            # (3, symbols, strategies)
+        counts = votes.sum(axis=2)                                      # (3, symbols)
+        winner = np.argmax(counts, axis=0)
+        chosen = votes[winner, np.arange(rows)]                         # (symbols, strategies)
+        chosen_count = counts[winner, np.arange(rows)]
+        agreement = chosen_count / len(self.active_strategies) if self.active_strategies else np.zeros(rows)
+        with np.errstate(invalid="ignore"):
+            mean_conf = np.where(chosen_count > 0, (final * chosen).sum(axis=1) / chosen_count, 0.0)
+
+        # Volatility penalty: scale [0, max_vol] to [1, 0.7]
+        vol_factor = np.ones(rows)
+        if volatility is not None:
+            if max_volatility is None:
+                max_volatility = np.nanmax(volatility) if np.any(~np.isnan(volatility)) else 0.0
+            if max_volatility:
+                vol_factor = np.where(np.isnan(volatility), 1.0,
+                                      np.maximum(0.7, 1.0 - 0.3 * (volatility / max_volatility)))
+
+        return SignalBatch(
+            symbols=list(symbols),
+            strategies=names,
+            signals=signals,
+            raw_confidence=raw,
+            final_confidence=final,
+            backtest_win_rates=backtest,
+            recent_win_rates=recent,
+            signal=np.asarray(DIRECTIONS, dtype=np.int8)[winner],
+            confidence=np.round(agreement * mean_conf * vol_factor, 2),
+            agreement=agreement,
+            volatility_factor=vol_factor,
+        )
+
+    @staticmethod
+    def to_dict(batch: SignalBatch) -> Dict[str, Dict]:
+        # The per-symbol dict shape the API has always returned
+        results = {}
+        for row, symbol in enumerate(batch.symbols):
+            details = {}
+            for col, name in enumerate(batch.strategies):
+                detail = {
+                    "signal": SIGNAL_NAMES[int(batch.signals[row, col])],
+                    "raw_confidence": float(batch.raw_confidence[row, col]),
+                }
+                if not np.isnan(batch.backtest_win_rates[row, col]):
+                    detail["backtest_win_rate"] = float(batch.backtest_win_rates[row, col])
+                if not np.isnan(batch.recent_win_rates[row, col]):
+                    detail["recent_win_rate"] = float(batch.recent_win_rates[row, col])
+                detail["final_confidence"] = float(batch.final_confidence[row, col])
+                details[name] = detail
+            results[symbol] = {
+                "signal": SIGNAL_NAMES[int(batch.signal[row])],
+                "confidence": float(batch.confidence[row]),
+                "agreement": float(batch.agreement[row]),
+                "volatility_factor": float(batch.volatility_factor[row]),
+                "per_strategy": details,
+            }
+        return results
 
     def get_signals(
         self,
@@ -13,49 +267,17 @@ class StrategyManager:
         recent_perf: Dict[str, Dict[str, float]] = None,         # {symbol: {strategy: recent_win_rate}}
         volatility: Dict[str, float] = None                      # {symbol: volatility}
     ) -> Dict[str, Dict]:
-        results = {}
-        for symbol, prices in asset_prices.items():
-            signals = []
-            details = {}
-            for strat_name in self.active_strategies:
-                strat = STRATEGIES.get(strat_name)
-                if strat:
-                    s, c = strat.generate_signal(prices)
-                    details[strat_name] = {"signal": s, "raw_confidence": c}
-                    # Factor in backtest win rate and recent performance
-                    strat_conf = c
-                    if backtest_win_rates and symbol in backtest_win_rates and strat_name in backtest_win_rates[symbol]:
-                        strat_conf *= (0.6 + 0.4 * backtest_win_rates[symbol][strat_name])  # 60% base, 40% scaled by win rate
-                        details[strat_name]["backtest_win_rate"] = backtest_win_rates[symbol][strat_name]
-                    if recent_perf and symbol in recent_perf and strat_name in recent_perf[symbol]:
-                        strat_conf *= (0.7 + 0.3 * recent_perf[symbol][strat_name])
-                        details[strat_name]["recent_win_rate"] = recent_perf[symbol][strat_name]
-                    signals.append((s, strat_conf))
-                    details[strat_name]["final_confidence"] = strat_conf
-
-            direction_counts = {"long": 0, "short": 0, "hold": 0}
-            conf_by_dir = {"long": [], "short": [], "hold": []}
-            for s, adj_conf in signals:
-                direction_counts[s] += 1
-                conf_by_dir[s].append(adj_conf)
-            # Majority vote for direction
-            main_signal = max(direction_counts, key=direction_counts.get)
-            # Confidence: ensemble = agreement * mean(confidence) * volatility factor
-            agreement = direction_counts[main_signal] / len(self.active_strategies) if self.active_strategies else 0
-            mean_conf = sum(conf_by_dir[main_signal]) / len(conf_by_dir[main_signal]) if conf_by_dir[main_signal] else 0
-            # Volatility penalty: high volatility reduces confidence
-            vol_factor = 1.0
-            if volatility and symbol in volatility:
-                # e.g. scale [0, max_vol] to [1, 0.7]
-                max_vol = max(volatility.values()) if volatility.values() else 1.0
-                vol = volatility[symbol]
-                vol_factor = max(0.7, 1.0 - 0.3 * (vol / max_vol))
-            final_confidence = round(agreement * mean_conf * vol_factor, 2)
-            results[symbol] = {
-                "signal": main_signal,
-                "confidence": final_confidence,
-                "agreement": agreement,
-                "volatility_factor": vol_factor,
-                "per_strategy": details
-            }
-        return results
\ No newline at end of file
+        symbols, matrix = prices_to_matrix(asset_prices)
+        names = self.strategy_names()
+        vol, max_vol = None, None
+        if volatility:
+            vol = np.array([volatility.get(s, np.nan) for s in symbols], dtype=float)
+            max_vol = max(volatility.values())
+        batch = self.get_signals_batch(
+            symbols, matrix,
+            backtest_win_rates=rates_matrix(symbols, names, backtest_win_rates),
+            recent_perf=rates_matrix(symbols, names, recent_perf),
+            volatility=vol,
+            max_volatility=max_vol,
+        )
+        return self.to_dict(batch)
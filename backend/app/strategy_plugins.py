@@ -0,0 +1,249 @@
+import importlib
+import os
+from importlib import metadata
+from typing import NamedTuple
+from . import strategy
+from .strategy import HOLD
+from .streaming_indicators import Indicator, EMA, RSI, RollingStats, RollingMinMax
+
+# Stateful strategies for live running. A plugin instance follows one symbol:
+# on_bar() / on_tick() update its own incremental state in O(1) and return the
+# current (signal, confidence), LONG / SHORT / HOLD and [0, 1] like the batch
+# strategies. Third-party plugins are found through the entry point group
+# below or by module path in STRATEGY_PLUGINS ("package.module" modules that
+# call register() on import, or "package.module:Class").
+STRATEGY_PLUGIN_GROUP = "trading_bot.strategies"
+STRATEGY_PLUGINS = [p for p in os.getenv("STRATEGY_PLUGINS", "").split(",") if p]
+
+
+class Bar(NamedTuple):
+    # Same layout as the quote stream's completed bars
+    start: int
+    open: float
+    high: float
+    low: float
+    close: float
+    ticks: float
+
+
+class StrategyPlugin:
+    name = "base"
+
+    def __init__(self):
+        self.signal, self.confidence = HOLD, 0.0
+
+    def on_bar(self, bar):
+        raise NotImplementedError
+
+    def on_tick(self, bid, ask, timestamp):
+        # Most strategies only act on completed bars
+        return self.signal, self.confidence
+
+    def snapshot(self):
+        return {"signal": self.signal, "confidence": self.confidence}
+
+    def restore(self, state):
+        self.signal, self.confidence = state["signal"], state["confidence"]
+
+
+def _ready(*values):
+    return None if any(v is None for v in values) else values
+
+
+class IndicatorPlugin(StrategyPlugin):
+    # Drives a batch strategy's score() with streaming indicators, so the live
+    # signal equals what generate_signals() gives on the full history
+    def __init__(self, strategy_obj=None):
+        super().__init__()
+        self.strategy = strategy_obj or strategy.STRATEGIES[self.name]
+        self.indicators = self.make_indicators()
+
+    def make_indicators(self):
+        raise NotImplementedError
+
+    def features(self, close):
+        # Updates the indicators with the bar's close; None until all are defined
+        raise NotImplementedError
+
+    def on_bar(self, bar):
+        features = self.features(bar[4])
+        if features is None:
+            self.signal, self.confidence = HOLD, 0.0
+        else:
+            signal, confidence = self.strategy.score(*features)
+            self.signal, self.confidence = int(signal), float(confidence)
+        return self.signal, self.confidence
+
+    def snapshot(self):
+        state = super().snapshot()
+        state["indicators"] = {key: ind.snapshot() for key, ind in self.indicators.items()}
+        return state
+
+    def restore(self, state):
+        super().restore(state)
+        self.indicators = {key: Indicator.restore(s) for key, s in state["indicators"].items()}
+
+
+class RSIReversionPlugin(IndicatorPlugin):
+    name = "rsi_reversion"
+
+    def make_indicators(self):
+        return {"rsi": RSI(self.strategy.period)}
+
+    def features(self, close):
+        return _ready(self.indicators["rsi"].update(close))
+
+
+class RSITrendPlugin(RSIReversionPlugin):
+    name = "rsi_trend"
+
+
+class EMACrossoverPlugin(IndicatorPlugin):
+    name = "ema_crossover"
+
+    def make_indicators(self):
+        return {"fast": EMA(self.strategy.fast), "slow": EMA(self.strategy.slow)}
+
+    def features(self, close):
+        return _ready(self.indicators["fast"].update(close), self.indicators["slow"].update(close))
+
+
+class TripleEMAPlugin(IndicatorPlugin):
+    name = "triple_ema"
+
+    def make_indicators(self):
+        return {str(p): EMA(p) for p in self.strategy.periods}
+
+    def features(self, close):
+        return _ready(*(self.indicators[str(p)].update(close) for p in self.strategy.periods))
+
+
+class SMATrendPlugin(IndicatorPlugin):
+    name = "sma_trend"
+
+    def make_indicators(self):
+        return {"stats": RollingStats(self.strategy.period)}
+
+    def features(self, close):
+        stats = self.indicators["stats"]
+        average = stats.update(close)
+        return (average, close) if stats.ready else None
+
+
+class MACDPlugin(IndicatorPlugin):
+    name = "macd"
+
+    def make_indicators(self):
+        return {"fast": EMA(self.strategy.fast), "slow": EMA(self.strategy.slow),
+                "signal": EMA(self.strategy.signal)}
+
+    def features(self, close):
+        fast = self.indicators["fast"].update(close)
+        slow = self.indicators["slow"].update(close)
+        if fast is None or slow is None:
+            return None
+        # The signal line starts with the first MACD value, as in IndicatorCache.macd
+        line = fast - slow
+        signal_line = self.indicators["signal"].update(line)
+        return None if signal_line is None else (line - signal_line, close)
+
+
+class BollingerPlugin(IndicatorPlugin):
+    name = "bollinger_reversion"
+
+    def make_indicators(self):
+        return {"stats": RollingStats(self.strategy.period)}
+
+    def features(self, close):
+        stats = self.indicators["stats"]
+        mid = stats.update(close)
+        if not stats.ready:
+            return None
+        band = self.strategy.k * stats.std()
+        return mid, mid + band, mid - band, close
+
+
+class ZScorePlugin(IndicatorPlugin):
+    name = "zscore_reversion"
+
+    def make_indicators(self):
+        return {"stats": RollingStats(self.strategy.period)}
+
+    def features(self, close):
+        stats = self.indicators["stats"]
+        stats.update(close)
+        return _ready(stats.zscore())
+
+
+class MomentumPlugin(IndicatorPlugin):
+    name = "momentum"
+
+    def make_indicators(self):
+        # Only the window's oldest value is used: the close `lookback` bars ago
+        return {"closes": RollingStats(self.strategy.lookback + 1)}
+
+    def features(self, close):
+        closes = self.indicators["closes"]
+        closes.update(close)
+        return (closes.values[0], close) if closes.ready else None
+
+
+class BreakoutPlugin(IndicatorPlugin):
+    name = "breakout"
+
+    def make_indicators(self):
+        return {"range": RollingMinMax(self.strategy.window)}
+
+    def features(self, close):
+        # Extremes of the window before this bar, read before it is added
+        extremes = self.indicators["range"]
+        features = (extremes.max, extremes.min, close) if extremes.index >= self.strategy.window else None
+        extremes.update(close)
+        return features
+
+
+PLUGINS = {}
+
+
+def register(cls):
+    # Usable as a class decorator; a later registration replaces the name
+    PLUGINS[cls.name] = cls
+    return cls
+
+
+for _cls in (RSIReversionPlugin, RSITrendPlugin, EMACrossoverPlugin, TripleEMAPlugin, SMATrendPlugin,
+             MACDPlugin, BollingerPlugin, ZScorePlugin, MomentumPlugin, BreakoutPlugin):
+    register(_cls)
+
+
+def _register_object(obj):
+    if isinstance(obj, type) and issubclass(obj, StrategyPlugin):
+        register(obj)
+
+
+def discover(group=STRATEGY_PLUGIN_GROUP, modules=None):
+    # Loads entry points and STRATEGY_PLUGINS; a broken plugin is reported and skipped
+    for entry_point in metadata.entry_points(group=group):
+        try:
+            _register_object(entry_point.load())
+        except Exception as e:
+            print(f"Error loading strategy plugin {entry_point.name}:", e)
+    for path in STRATEGY_PLUGINS if modules is None else modules:
+        module_name, _, attr = path.partition(":")
+        try:
+            module = importlib.import_module(module_name)
+            if attr:
+                _register_object(getattr(module, attr))
+        except Exception as e:
+            print(f"Error loading strategy plugin {path}:", e)
+    return list(PLUGINS)
+
+
+def create(name, **params):
+    # Built-in plugins take their parameters through the batch strategy class
+    cls = PLUGINS.get(name)
+    if cls is None:
+        return None
+    if params and issubclass(cls, IndicatorPlugin):
+        return cls(type(strategy.STRATEGIES[cls.name])(**params))
+    return cls(**params)
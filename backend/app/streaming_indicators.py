@@ -0,0 +1,275 @@
+import math
+from collections import deque
+from .quote_stream import quote_stream
+
+# Incremental counterparts of app.indicators: each object keeps a few floats
+# of state and updates in O(1) per bar, so indicators can follow the live
+# stream for hundreds of epics. Seeding matches the batch functions (SMA of
+# the first `period` values), so the latest value equals the last element of
+# the batch series. update() returns None until the indicator is defined.
+# snapshot() returns plain JSON-able state; Indicator.restore() rebuilds it.
+
+
+class Indicator:
+    __slots__ = ()
+    # Slots holding deques, restored with the given maxlen slot
+    _deques = {}
+
+    def snapshot(self):
+        state = {"type": type(self).__name__}
+        for cls in type(self).__mro__:
+            for slot in getattr(cls, "__slots__", ()):
+                value = getattr(self, slot)
+                if isinstance(value, deque):
+                    value = list(value)
+                elif isinstance(value, Indicator):
+                    value = value.snapshot()
+                state[slot] = value
+        return state
+
+    @staticmethod
+    def restore(state):
+        cls = INDICATOR_TYPES[state["type"]]
+        obj = cls.__new__(cls)
+        for klass in cls.__mro__:
+            for slot in getattr(klass, "__slots__", ()):
+                value = state[slot]
+                if isinstance(value, dict) and "type" in value:
+                    value = Indicator.restore(value)
+                elif slot in cls._deques:
+                    maxlen = cls._deques[slot]
+                    value = deque(value, maxlen=state[maxlen] if maxlen else None)
+                setattr(obj, slot, value)
+        return obj
+
+
+class EMA(Indicator):
+    __slots__ = ("period", "alpha", "count", "total", "value")
+
+    def __init__(self, period=20, alpha=None):
+        self.period = period
+        self.alpha = alpha if alpha is not None else 2.0 / (period + 1)
+        self.count = 0
+        self.total = 0.0
+        self.value = None
+
+    def update(self, x):
+        if self.value is not None:
+            self.value += self.alpha * (x - self.value)
+        else:
+            self.count += 1
+            self.total += x
+            if self.count == self.period:
+                self.value = self.total / self.period
+        return self.value
+
+
+class Wilder(EMA):
+    __slots__ = ()
+
+    def __init__(self, period=14):
+        super().__init__(period, 1.0 / period)
+
+
+class RSI(Indicator):
+    __slots__ = ("prev", "gain", "loss", "value")
+
+    def __init__(self, period=14):
+        self.prev = None
+        self.gain = Wilder(period)
+        self.loss = Wilder(period)
+        self.value = None
+
+    def update(self, close):
+        prev, self.prev = self.prev, close
+        if prev is None:
+            return None
+        delta = close - prev
+        gain = self.gain.update(delta if delta > 0 else 0.0)
+        loss = self.loss.update(-delta if delta < 0 else 0.0)
+        if gain is None:
+            return None
+        if loss == 0:
+            self.value = 50.0 if gain == 0 else 100.0
+        else:
+            self.value = 100.0 - 100.0 / (1.0 + gain / loss)
+        return self.value
+
+
+class ATR(Indicator):
+    __slots__ = ("prev_close", "smoother")
+
+    def __init__(self, period=14):
+        self.prev_close = None
+        self.smoother = Wilder(period)
+
+    @property
+    def value(self):
+        return self.smoother.value
+
+    def update(self, high, low, close):
+        tr = high - low
+        if self.prev_close is not None:
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        return self.smoother.update(tr)
+
+
+class RollingStats(Indicator):
+    # Windowed Welford mean/variance. The window is re-summed every
+    # `window * 64` updates so rounding from the removals cannot accumulate.
+    __slots__ = ("window", "values", "mean", "m2", "updates")
+    _deques = {"values": "window"}
+
+    def __init__(self, window=20):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+
+    def update(self, x):
+        values = self.values
+        if len(values) == self.window:
+            old = values[0]
+            values.append(x)
+            delta = x - old
+            old_mean = self.mean
+            self.mean += delta / self.window
+            self.m2 += delta * (x - self.mean + old - old_mean)
+        else:
+            values.append(x)
+            delta = x - self.mean
+            self.mean += delta / len(values)
+            self.m2 += delta * (x - self.mean)
+        self.updates += 1
+        if self.updates % (self.window * 64) == 0:
+            self.mean = math.fsum(values) / len(values)
+            self.m2 = math.fsum((v - self.mean) ** 2 for v in values)
+        return self.mean
+
+    @property
+    def ready(self):
+        return len(self.values) == self.window
+
+    def variance(self, ddof=0):
+        n = len(self.values)
+        return max(self.m2, 0.0) / (n - ddof) if n > ddof else None
+
+    def std(self, ddof=0):
+        var = self.variance(ddof)
+        return math.sqrt(var) if var is not None else None
+
+    def zscore(self, x=None):
+        std = self.std()
+        if not self.ready or not std:
+            return None
+        return ((self.values[-1] if x is None else x) - self.mean) / std
+
+
+class RollingMinMax(Indicator):
+    # Monotonic deques of (index, value); both ends are O(1) amortized
+    __slots__ = ("window", "index", "mins", "maxs")
+    _deques = {"mins": None, "maxs": None}
+
+    def __init__(self, window=20):
+        self.window = window
+        self.index = 0
+        self.mins = deque()
+        self.maxs = deque()
+
+    def update(self, x):
+        i = self.index
+        self.index += 1
+        mins, maxs = self.mins, self.maxs
+        while mins and mins[-1][1] >= x:
+            mins.pop()
+        mins.append((i, x))
+        while maxs and maxs[-1][1] <= x:
+            maxs.pop()
+        maxs.append((i, x))
+        start = i - self.window + 1
+        if mins[0][0] < start:
+            mins.popleft()
+        if maxs[0][0] < start:
+            maxs.popleft()
+        return mins[0][1], maxs[0][1]
+
+    @property
+    def min(self):
+        return self.mins[0][1] if self.mins else None
+
+    @property
+    def max(self):
+        return self.maxs[0][1] if self.maxs else None
+
+
+class IndicatorSet(Indicator):
+    # The usual indicator bundle for one epic, fed with completed bars
+    __slots__ = ("ema_fast", "ema_slow", "rsi", "atr", "stats", "range", "returns", "prev_close")
+
+    def __init__(self, fast=12, slow=26, rsi_period=14, atr_period=14, window=20):
+        self.ema_fast = EMA(fast)
+        self.ema_slow = EMA(slow)
+        self.rsi = RSI(rsi_period)
+        self.atr = ATR(atr_period)
+        self.stats = RollingStats(window)
+        self.range = RollingMinMax(window)
+        self.returns = RollingStats(window)
+        self.prev_close = None
+
+    def update(self, high, low, close):
+        self.ema_fast.update(close)
+        self.ema_slow.update(close)
+        self.rsi.update(close)
+        self.atr.update(high, low, close)
+        self.stats.update(close)
+        self.range.update(close)
+        if self.prev_close and close > 0:
+            self.returns.update(math.log(close / self.prev_close))
+        self.prev_close = close
+        return self.values()
+
+    def values(self):
+        return {
+            "ema_fast": self.ema_fast.value,
+            "ema_slow": self.ema_slow.value,
+            "rsi": self.rsi.value,
+            "atr": self.atr.value,
+            "sma": self.stats.mean if self.stats.ready else None,
+            "zscore": self.stats.zscore(),
+            "rolling_min": self.range.min,
+            "rolling_max": self.range.max,
+            "volatility": self.returns.std(ddof=1) if self.returns.ready else None,
+        }
+
+
+INDICATOR_TYPES = {cls.__name__: cls for cls in (EMA, Wilder, RSI, ATR, RollingStats, RollingMinMax, IndicatorSet)}
+
+
+class LiveIndicators:
+    # Per-epic IndicatorSet fed by the quote stream's completed minute bars
+    def __init__(self, factory=IndicatorSet):
+        self.factory = factory
+        self.sets = {}
+
+    def on_bar(self, epic, bar):
+        start, open_, high, low, close, ticks = bar
+        indicators = self.sets.get(epic)
+        if indicators is None:
+            indicators = self.sets[epic] = self.factory()
+        indicators.update(high, low, close)
+
+    def values(self, epic):
+        indicators = self.sets.get(epic)
+        return indicators.values() if indicators is not None else None
+
+    def snapshot(self):
+        return {epic: s.snapshot() for epic, s in list(self.sets.items())}
+
+    def restore(self, state):
+        self.sets = {epic: Indicator.restore(s) for epic, s in state.items()}
+
+
+live_indicators = LiveIndicators()
+quote_stream.bar_listeners.append(live_indicators.on_bar)
@@ -0,0 +1,255 @@
+import asyncio
+import os
+import threading
+import time
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from .candle_store import candle_store, RESOLUTION_SECONDS
+from .candle_sync import candle_sync
+from .instrument_catalogue import instrument_catalogue
+from .quote_stream import QUOTE_WATCHLIST, quote_stream
+
+# Rolling volatility and range of every epic in the universe, kept from
+# minute bars as they arrive (quote stream) or are synced into the candle
+# store. Each epic owns a row of ring buffers holding the running sums of
+# log returns and squared log returns, so the volatility over any window up
+# to SCANNER_MAX_WINDOW bars is two subtractions per epic, and top-N is an
+# argpartition over one vector per query. The universe is SCANNER_SYMBOLS
+# plus up to SCANNER_MAX_EPICS instruments from the catalogue, tradeable ones
+# first; each sync pass requests one page per epic outside the quote stream.
+SCANNER_RESOLUTION = "MINUTE"
+SCANNER_MAX_WINDOW = int(os.getenv("SCANNER_MAX_WINDOW", "1440"))
+SCANNER_SYMBOLS = [s for s in (os.getenv("SCANNER_SYMBOLS") or ",".join(QUOTE_WATCHLIST)).split(",") if s]
+SCANNER_SYNC_INTERVAL = float(os.getenv("SCANNER_SYNC_INTERVAL", "60"))
+SCANNER_CONCURRENCY = int(os.getenv("SCANNER_CONCURRENCY", "4"))
+SCANNER_MAX_EPICS = int(os.getenv("SCANNER_MAX_EPICS", "200"))
+
+SCAN_METRICS = ("volatility", "range", "change")
+ROW_ARRAYS = ("_cum", "_cum2", "_high", "_low", "_count", "_last_close", "_last_start")
+
+
+def _grow(array, size, fill):
+    grown = np.full((size,) + array.shape[1:], fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class VolatilityScanner:
+    def __init__(self, max_window=SCANNER_MAX_WINDOW, capacity=64, max_epics=SCANNER_MAX_EPICS):
+        self.max_window = max_window
+        self.max_epics = max_epics
+        # One extra slot: a window of w returns spans w + 1 running sums
+        self.size = max_window + 1
+        self.rows = {}
+        self.epics = []
+        self.universe = set(SCANNER_SYMBOLS)
+        self._cum = np.zeros((capacity, self.size))
+        self._cum2 = np.zeros((capacity, self.size))
+        self._high = np.full((capacity, self.size), np.nan)
+        self._low = np.full((capacity, self.size), np.nan)
+        self._count = np.zeros(capacity, dtype=np.int64)
+        self._last_close = np.full(capacity, np.nan)
+        self._last_start = np.full(capacity, -1, dtype=np.int64)
+        # window -> (version, metrics); recomputed only after new bars
+        self._version = 0
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._task = None
+        self.stats = {"bars": 0, "queries": 0, "cache_hits": 0, "syncs": 0, "errors": 0}
+
+    def _row(self, epic):
+        row = self.rows.get(epic)
+        if row is None:
+            row = self.rows[epic] = len(self.epics)
+            self.epics.append(epic)
+            if row >= len(self._count):
+                size = 2 * len(self._count)
+                for name in ROW_ARRAYS:
+                    array = getattr(self, name)
+                    fill = -1 if name == "_last_start" else (0 if name in ("_cum", "_cum2", "_count") else np.nan)
+                    setattr(self, name, _grow(array, size, fill))
+        return row
+
+    def on_catalogue(self, instruments):
+        # Instrument catalogue listener (may run on a worker thread); the set is
+        # replaced whole since the sync loop reads it
+        ranked = sorted(instruments.values(), key=lambda inst: (inst["status"] != "TRADEABLE", inst["epic"]))
+        self.universe = set(SCANNER_SYMBOLS) | {inst["epic"] for inst in ranked[:self.max_epics]}
+
+    def on_bar(self, epic, bar):
+        # Quote stream listener: one completed bar in O(1)
+        start, open_, high, low, close, ticks = bar
+        with self._lock:
+            row = self._row(epic)
+            if start <= self._last_start[row] or not close > 0:
+                return
+            count = self._count[row]
+            previous = self._last_close[row]
+            r = float(np.log(close / previous)) if previous > 0 else 0.0
+            prev_slot = (count - 1) % self.size
+            base, base2 = (self._cum[row, prev_slot], self._cum2[row, prev_slot]) if count else (0.0, 0.0)
+            slot = count % self.size
+            self._cum[row, slot] = base + r
+            self._cum2[row, slot] = base2 + r * r
+            self._high[row, slot] = high
+            self._low[row, slot] = low
+            self._count[row] = count + 1
+            self._last_close[row] = close
+            self._last_start[row] = start
+            self._version += 1
+            self.stats["bars"] += 1
+
+    def ingest(self, epic, times, high, low, close):
+        # A run of bars (sorted by time) for one epic; already-seen bars are skipped
+        times = np.asarray(times, dtype=np.int64)
+        close = np.asarray(close, dtype=float)
+        with self._lock:
+            row = self._row(epic)
+            keep = (times > self._last_start[row]) & (close > 0)
+            if not keep.any():
+                return 0
+            times, close = times[keep], close[keep]
+            high, low = np.asarray(high, dtype=float)[keep], np.asarray(low, dtype=float)[keep]
+            count = self._count[row]
+            previous = self._last_close[row]
+            returns = np.diff(np.log(np.r_[previous if previous > 0 else close[0], close]))
+            prev_slot = (count - 1) % self.size
+            base, base2 = (self._cum[row, prev_slot], self._cum2[row, prev_slot]) if count else (0.0, 0.0)
+            cum, cum2 = base + np.cumsum(returns), base2 + np.cumsum(returns * returns)
+            # Only the newest `size` bars fit in the ring
+            n = len(times)
+            tail = slice(max(0, n - self.size), n)
+            slots = (count + np.arange(n)[tail]) % self.size
+            self._cum[row, slots] = cum[tail]
+            self._cum2[row, slots] = cum2[tail]
+            self._high[row, slots] = high[tail]
+            self._low[row, slots] = low[tail]
+            self._count[row] = count + n
+            self._last_close[row] = close[-1]
+            self._last_start[row] = times[-1]
+            self._version += 1
+            self.stats["bars"] += n
+            return n
+
+    def catch_up(self, epics, now=None):
+        # Feeds bars synced into the candle store since each epic's last one,
+        # leaving out the current, still forming bar
+        now = time.time() if now is None else now
+        step = RESOLUTION_SECONDS[SCANNER_RESOLUTION]
+        added = 0
+        for epic in epics:
+            row = self.rows.get(epic)
+            last = int(self._last_start[row]) if row is not None else -1
+            start = last + 1 if last >= 0 else int(now) - self.size * step
+            columns = candle_store.read(epic, SCANNER_RESOLUTION, start=start)
+            done = columns["time"] + step <= now
+            if done.any():
+                added += self.ingest(epic, columns["time"][done], columns["high"][done],
+                                     columns["low"][done], columns["close"][done])
+        return added
+
+    def _metrics(self, window):
+        # {metric: (epics,)} over the last `window` returns, NaN with fewer than two.
+        # O(1) per epic from the running sums; the range is added by _range()
+        n = len(self.epics)
+        count = self._count[:n]
+        returns = np.minimum(np.maximum(count - 1, 0), window)
+        last = (count - 1) % self.size
+        first = (count - 1 - returns) % self.size
+        rows = np.arange(n)
+        total = self._cum[rows, last] - self._cum[rows, first]
+        total2 = self._cum2[rows, last] - self._cum2[rows, first]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variance = (total2 - total * total / returns) / (returns - 1)
+            volatility = np.where(returns >= 2, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+        return {
+            "volatility": volatility,
+            "change": np.where(returns >= 2, np.expm1(total), np.nan),
+            "bars": np.where(count > 0, returns + 1, 0),
+        }
+
+    def _range(self, rows, bars, window):
+        # High-low range of the bars the window's returns span, as a fraction
+        # of the last close; a scan over the window for the given rows only
+        offsets = np.arange(window + 1)
+        last = (self._count[rows] - 1) % self.size
+        slots = (last[:, None] - offsets[None, :]) % self.size
+        inside = offsets[None, :] < bars[:, None]
+        high = np.where(inside, self._high[rows[:, None], slots], -np.inf).max(axis=1, initial=-np.inf)
+        low = np.where(inside, self._low[rows[:, None], slots], np.inf).min(axis=1, initial=np.inf)
+        with np.errstate(invalid="ignore"):
+            return np.where(bars >= 3, (high - low) / self._last_close[rows], np.nan)
+
+    def top(self, top_n=5, window=15, metric="volatility"):
+        # The top_n epics by metric over the last `window` minute bars
+        if metric not in SCAN_METRICS:
+            raise ValueError(f"Unknown scan metric {metric}")
+        window = max(2, min(int(window), self.max_window))
+        self.stats["queries"] += 1
+        with self._lock:
+            cached = self._cache.get(window)
+            if cached is not None and cached[0] == self._version:
+                self.stats["cache_hits"] += 1
+                metrics = cached[1]
+            else:
+                metrics = self._metrics(window)
+                self._cache[window] = (self._version, metrics)
+            if metric == "range" and "range" not in metrics:
+                metrics["range"] = self._range(np.arange(len(metrics["bars"])), metrics["bars"], window)
+            epics = list(self.epics)
+            score = np.nan_to_num(np.abs(metrics[metric]), nan=-np.inf)
+            valid = int(np.isfinite(score).sum())
+            top_n = min(max(int(top_n), 0), valid)
+            if not top_n:
+                return []
+            best = np.argpartition(-score, top_n - 1)[:top_n]
+            best = best[np.argsort(-score[best], kind="stable")]
+            ranges = metrics["range"][best] if "range" in metrics else self._range(best, metrics["bars"][best], window)
+        return [
+            {
+                "epic": epics[row],
+                "volatility": float(metrics["volatility"][row]),
+                "range": float(price_range),
+                "change": float(metrics["change"][row]),
+                "bars": int(metrics["bars"][row]),
+                "window_minutes": window,
+            }
+            for row, price_range in zip(best, ranges)
+        ]
+
+    async def _sync_loop(self, client_provider):
+        while True:
+            try:
+                api = client_provider()
+                # Streamed epics get their bars from the quote stream
+                epics = sorted(self.universe - set(quote_stream.epics))
+                if epics:
+                    await candle_sync.sync(api, epics, SCANNER_RESOLUTION, concurrency=SCANNER_CONCURRENCY)
+                await run_in_threadpool(self.catch_up, sorted(self.universe))
+                self.stats["syncs"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                print("Volatility scanner sync error:", e)
+            await asyncio.sleep(SCANNER_SYNC_INTERVAL)
+
+    def start(self, client_provider):
+        # client_provider() -> AsyncCapitalComAPI, raising if there is no live session
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._sync_loop(client_provider))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self):
+        return {**self.stats, "epics": len(self.epics), "universe": len(self.universe)}
+
+
+volatility_scanner = VolatilityScanner()
+quote_stream.bar_listeners.append(volatility_scanner.on_bar)
+instrument_catalogue.subscribe(volatility_scanner.on_catalogue)
@@ -0,0 +1,38 @@
+import argparse
+import numpy as np
+from app import indicators
+from benchmarks import reference
+from benchmarks.common import price_matrix, report, timed
+
+# compute_indicators over an assets x bars matrix, against the per-indicator
+# functions and, on a slice small enough for Python loops, the reference.
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indicator engine speed and parity")
+    parser.add_argument("--assets", type=int, default=500)
+    parser.add_argument("--bars", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=None)
+    args = parser.parse_args()
+    close, high, low = price_matrix(args.assets, args.bars)
+    target = args.target_ms / 1000 if args.target_ms else None
+
+    report(f"compute_indicators {args.assets}x{args.bars}",
+           *timed(lambda: indicators.compute_indicators(close, high, low), args.repeat), target)
+    report("rsi", *timed(lambda: indicators.rsi(close), args.repeat))
+    report("ema 26", *timed(lambda: indicators.ema(close, 26), args.repeat))
+    report("sma 20", *timed(lambda: indicators.sma(close, 20), args.repeat))
+    report("atr", *timed(lambda: indicators.atr(high, low, close), args.repeat))
+    report("volatility 20", *timed(lambda: indicators.volatility(close, 20), args.repeat))
+
+    rows = slice(0, min(args.assets, 20))
+    sample = close[rows, -2000:], high[rows, -2000:], low[rows, -2000:]
+    result = indicators.compute_indicators(*sample)
+    expected = reference.compute_indicators(*sample)
+    worst = 0.0
+    for name, series in expected.items():
+        both = ~np.isnan(series)
+        assert (np.isnan(result[name]) == ~both).all(), f"{name}: NaN pattern differs from the reference"
+        error = np.abs(result[name][both] - series[both]) / np.maximum(1.0, np.abs(series[both]))
+        worst = max(worst, float(error.max(initial=0.0)))
+    print(f"parity with the reference loops on {sample[0].shape[0]}x{sample[0].shape[1]}: max rel error {worst:.2e}")
@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import time
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from app.password_hashing import PasswordHasher, HashingBusy, build_context
+from benchmarks.common import report
+
+# A burst of simultaneous logins (bcrypt verifies) while a probe task measures
+# how late the event loop wakes it: once with the hashing process pool, once
+# with the verifies on Starlette's threadpool as login did before. Lag on the
+# loop is what every other request on the worker waits through.
+
+
+async def probe(lags, stop, interval=0.005):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def burst(verify, logins):
+    lags, stop = [], asyncio.Event()
+    prober = asyncio.create_task(probe(lags, stop))
+    latencies, rejected = [], 0
+
+    async def login():
+        nonlocal rejected
+        started = time.perf_counter()
+        try:
+            await verify()
+        except HashingBusy:
+            rejected += 1
+            return
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await prober
+    return elapsed, np.array(latencies), np.array(lags), rejected
+
+
+def summary(name, elapsed, latencies, lags, rejected):
+    report(name, elapsed, elapsed)
+    print(f"  login p50 {np.percentile(latencies, 50) * 1000:.0f} ms  p99 {np.percentile(latencies, 99) * 1000:.0f} ms"
+          f"  rejected {rejected}")
+    print(f"  loop lag p50 {np.percentile(lags, 50) * 1000:.1f} ms  p99 {np.percentile(lags, 99) * 1000:.1f} ms"
+          f"  max {lags.max() * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login burst against the bcrypt hashing pool")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost; the app default is 12")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    hashed = build_context(args.rounds).hash("hunter2")
+    hasher = PasswordHasher(workers=args.workers, rounds=args.rounds)
+    hasher.start()
+
+    async def pooled():
+        # One verify first so worker start-up is not part of the burst
+        await hasher.verify("hunter2", hashed)
+        return await burst(lambda: hasher.verify("hunter2", hashed), args.logins)
+
+    async def threaded():
+        context = build_context(args.rounds)
+        return await burst(lambda: run_in_threadpool(context.verify_and_update, "hunter2", hashed), args.logins)
+
+    try:
+        summary(f"{args.logins} logins, process pool ({args.workers} workers)", *asyncio.run(pooled()))
+    finally:
+        hasher.shutdown()
+    summary(f"{args.logins} logins, threadpool", *asyncio.run(threaded()))
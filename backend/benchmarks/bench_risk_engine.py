@@ -0,0 +1,52 @@
+import argparse
+import numpy as np
+from app.models import User
+from app.quote_stream import Quote
+from app.risk_engine import RiskEngine
+from app.risk_settings import RiskSettings
+from benchmarks.common import report, timed
+
+# Pre-trade check + settle throughput, the work /trade adds around the broker
+# call, for a few users trading a small book of epics with quote ticks
+# marking the open positions in between. Target: 10k orders/sec.
+
+
+class Quotes:
+    def __init__(self, epics):
+        self.quotes = {epic: Quote(1.0, 1.0001, 0) for epic in epics}
+
+    def latest(self, epic):
+        return self.quotes.get(epic)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Risk engine order throughput")
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--epics", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--target-rate", type=float, default=10000)
+    args = parser.parse_args()
+    epics = [f"E{i}" for i in range(args.epics)]
+    settings = {**RiskSettings().dict(), "concurrentTrades": args.epics, "leverage": 1000}
+    engine = RiskEngine(settings_loader=lambda username: dict(settings), quotes=Quotes(epics))
+    users = [User(username=f"u{i}", password="", api_key="", api_key_password="", use_demo=True,
+                  account_info={"accountInfo": {"balance": 1e6}}) for i in range(args.users)]
+    rng = np.random.default_rng(0)
+    orders = [(users[u], epics[e], "BUY" if side else "SELL", float(size))
+              for u, e, side, size in zip(rng.integers(0, args.users, args.orders),
+                                          rng.integers(0, args.epics, args.orders),
+                                          rng.integers(0, 2, args.orders),
+                                          rng.integers(1, 10, args.orders))]
+
+    def run():
+        for i, (user, epic, direction, size) in enumerate(orders):
+            rejection, kind = engine.check(user, epic, direction, size, stop_loss=0.99)
+            if rejection is None:
+                engine.settle(user.username, epic, direction, size, {"dealReference": "x"}, kind)
+            if i % 10 == 0:
+                engine.on_tick(epic, 1.0, 1.0001, i)
+
+    best, median = timed(run, args.repeat)
+    report(f"check + settle, {args.orders} orders", best, median, args.orders / args.target_rate)
+    print(f"{args.orders / best:,.0f} orders/sec best, {engine.stats['rejected']} rejected of {engine.stats['checks']}")
@@ -0,0 +1,37 @@
+import argparse
+import os
+import numpy as np
+from app.signal_pool import SignalPool
+from app.strategy import STRATEGIES
+from app.strategy_manager import score_matrix
+from benchmarks.common import price_matrix, report, timed
+
+# Full-universe signal sweep on the process pool at several worker counts,
+# against scoring the same matrix inline. Speedup is relative to inline;
+# counts above the machine's cores only measure the pool's overhead.
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Signal pool scaling")
+    parser.add_argument("--symbols", type=int, default=8000)
+    parser.add_argument("--bars", type=int, default=500)
+    parser.add_argument("--workers", default="1,2,4,8,16")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    close, _, _ = price_matrix(args.symbols, args.bars)
+    names = list(STRATEGIES)
+    print(f"{os.cpu_count()} CPUs, {args.symbols} symbols x {args.bars} bars, {len(names)} strategies")
+
+    inline, _ = timed(lambda: score_matrix(names, close), args.repeat)
+    report("inline", inline, inline)
+    expected = score_matrix(names, close)
+    for workers in [int(w) for w in args.workers.split(",") if w]:
+        pool = SignalPool(workers=workers, min_rows=1)
+        pool.start()
+        try:
+            pool.score(names, close[:workers])
+            result = pool.score(names, close)
+            assert all(np.array_equal(a, b) for a, b in zip(result, expected)), "pool result differs from inline"
+            best, median = timed(lambda: pool.score(names, close), args.repeat)
+        finally:
+            pool.shutdown()
+        report(f"{workers:>2} workers (x{inline / best:.2f})", best, median)
@@ -0,0 +1,40 @@
+import argparse
+import numpy as np
+from app.indicators import IndicatorCache, volatility
+from app.strategy import STRATEGIES
+from app.strategy_manager import StrategyManager, score_matrix
+from benchmarks.common import price_matrix, report, timed
+
+# One batch-mode signal sweep (indicators, every strategy, weighting and the
+# ensemble vote) over a symbols x bars close matrix, then the dict building
+# done at the API edge, and each strategy's share of the sweep.
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch signal sweep speed")
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--bars", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--target-ms", type=float, default=50)
+    args = parser.parse_args()
+    close, _, _ = price_matrix(args.symbols, args.bars)
+    names = list(STRATEGIES)
+    symbols = [f"S{i}" for i in range(args.symbols)]
+    rng = np.random.default_rng(1)
+    win_rates = rng.uniform(0.3, 0.7, (args.symbols, len(names)))
+    recent = rng.uniform(0.3, 0.7, (args.symbols, len(names)))
+    manager = StrategyManager(names)
+
+    def sweep():
+        return manager.get_signals_batch(symbols, close, backtest_win_rates=win_rates, recent_perf=recent,
+                                         volatility=volatility(close))
+
+    report(f"get_signals_batch {args.symbols}x{args.bars}, {len(names)} strategies",
+           *timed(sweep, args.repeat), args.target_ms / 1000)
+    batch = sweep()
+    report("to_dict", *timed(lambda: manager.to_dict(batch), args.repeat))
+    report("score_matrix", *timed(lambda: score_matrix(names, close), args.repeat))
+    report("volatility", *timed(lambda: volatility(close), args.repeat))
+    report("IndicatorCache (pack)", *timed(lambda: IndicatorCache(close), args.repeat))
+    for name, strategy in STRATEGIES.items():
+        # Each strategy on its own cache, so shared indicators are not hidden
+        report(f"  {name}", *timed(lambda: strategy.generate_signals(IndicatorCache(close)), args.repeat))
@@ -0,0 +1,45 @@
+import argparse
+import os
+import tempfile
+import numpy as np
+from app import simulator
+from app.candle_store import CandleStore
+from app.signal_pool import SignalPool
+from app.simulator import sweep
+from app.storage import Database
+from benchmarks.common import price_matrix
+
+# Event-driven parameter sweep (epics x parameter grid) over synthetic hourly
+# candles: runs/sec inline and on the signal pool at several worker counts,
+# each on an empty result cache, then the same sweep again served from it.
+# Counts above the machine's cores only measure the pool's overhead.
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulator sweep throughput")
+    parser.add_argument("--epics", type=int, default=4)
+    parser.add_argument("--bars", type=int, default=2000)
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}")
+    args = parser.parse_args()
+    grid = {"fast": [5, 8, 12, 16], "slow": [20, 26, 34, 50]}
+    close, high, low = price_matrix(args.epics, args.bars, late_share=0)
+    epics = [f"E{i}" for i in range(args.epics)]
+    print(f"{os.cpu_count()} CPUs, {args.epics} epics x {args.bars} bars, "
+          f"{len(grid['fast']) * len(grid['slow'])} parameter sets")
+    with tempfile.TemporaryDirectory() as root:
+        store = CandleStore(os.path.join(root, "candles"))
+        for row, epic in enumerate(epics):
+            store.append(epic, "HOUR", {"time": np.arange(args.bars, dtype=np.int64) * 3600, "open": close[row],
+                                        "high": high[row], "low": low[row], "close": close[row],
+                                        "volume": np.ones(args.bars)})
+        simulator.candle_store = store
+        for workers in sorted({int(w) for w in args.workers.split(",") if w}):
+            pool = SignalPool(workers=workers)
+            pool.start()
+            database = Database(os.path.join(root, f"sim{workers}.db"))
+            try:
+                stats = sweep(epics, "ema_crossover", grid, pool=pool, database=database)["stats"]
+                cached = sweep(epics, "ema_crossover", grid, pool=pool, database=database)["stats"]
+            finally:
+                pool.shutdown()
+            print(f"{workers:>2} workers: {stats['runs']} runs in {stats['elapsed'] * 1000:8.1f} ms, "
+                  f"{stats['runs_per_sec']:8.1f} runs/sec; cached {cached['runs_per_sec']:9.1f} runs/sec")
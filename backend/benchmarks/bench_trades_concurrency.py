@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import time
+import httpx
+from fastapi import FastAPI
+from app.broker_sessions import get_broker_api
+from app.capitalcom_api import CapitalComAPI, AsyncCapitalComAPI
+from app.main import app
+from app.rate_limiter import PriorityRateLimiter
+from benchmarks.common import MockBroker, report
+
+# N simultaneous GET /trades against a mock broker with fixed latency, through
+# the real async handler (AsyncCapitalComAPI on the event loop) and through a
+# sync handler calling CapitalComAPI the way the routers used to, which
+# Starlette runs on its 40-thread pool. The per-key rate limiter is opened up:
+# this measures how many broker calls one worker keeps in flight, not the quota.
+
+TRANSACTIONS = {"/api/v1/history/transactions": {"transactions": [{"dealId": "1", "size": "1"}]}}
+
+
+def make_client(cls, broker):
+    api = cls(identifier="id", password="pw", api_key=f"bench-{broker.url}", demo=True)
+    api.base_url = broker.url
+    api.limiter = PriorityRateLimiter(rate=1e9, burst=1e9)
+    return api
+
+
+async def burst(asgi_app, calls):
+    transport = httpx.ASGITransport(app=asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.get("/trades") for _ in range(calls)))
+        elapsed = time.perf_counter() - started
+    assert all(r.status_code == 200 and r.json() for r in responses), "a /trades call failed"
+    return elapsed
+
+
+def run_async(broker, calls):
+    api = make_client(AsyncCapitalComAPI, broker)
+    app.dependency_overrides[get_broker_api] = lambda: api
+
+    async def main():
+        try:
+            return await burst(app, calls)
+        finally:
+            await api.client.aclose()
+
+    try:
+        return asyncio.run(main())
+    finally:
+        app.dependency_overrides.clear()
+
+
+def run_sync(broker, calls):
+    api = make_client(CapitalComAPI, broker)
+    sync_app = FastAPI()
+
+    @sync_app.get("/trades")
+    def get_trades():
+        return api.get_trades()
+
+    return asyncio.run(burst(sync_app, calls))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent /trades calls, async vs sync broker client")
+    parser.add_argument("--calls", default="100,500")
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(f"mock broker latency {args.latency_ms:.0f} ms")
+    for calls in [int(c) for c in args.calls.split(",") if c]:
+        for name, run in (("async", run_async), ("sync", run_sync)):
+            broker = MockBroker(TRANSACTIONS, args.latency_ms / 1000)
+            try:
+                times = sorted(run(broker, calls) for _ in range(args.repeat))
+            finally:
+                broker.close()
+            report(f"{calls} x /trades, {name}", times[0], times[len(times) // 2])
+            print(f"  {calls / times[0]:,.0f} calls/sec, {broker.requests} broker requests "
+                  f"over {broker.connections} connections")
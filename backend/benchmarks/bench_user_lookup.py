@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+import tempfile
+from app import auth
+from app.auth import UserRepository, create_access_token, get_current_user
+from app.models import User
+from app.storage import Database
+from benchmarks.common import report, timed
+
+# Per-request user lookup at 10k users: the original path (parse the whole
+# users.json, then index it), the indexed SQLite row read behind the user
+# repository, the repository's cached model, and get_current_user with its
+# token cache. The users.json cache from user-010 was superseded by the
+# SQLite store (user-011); this measures what replaced it.
+
+
+def make_user(i):
+    return User(username=f"user{i}@example.com", password="$2b$12$" + "x" * 53, api_key=f"key{i}",
+                api_key_password="", use_demo=True, account_info={"accountInfo": {"balance": 1000.0 + i}})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-request user lookup cost")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    users = [make_user(i) for i in range(args.users)]
+    names = [users[i * args.users // args.lookups].username for i in range(args.lookups)]
+    with tempfile.TemporaryDirectory() as root:
+        users_file = os.path.join(root, "users.json")
+        with open(users_file, "w") as f:
+            json.dump({u.username: u.model_dump() for u in users}, f)
+        database = Database(os.path.join(root, "bench.db"))
+        database.upsert_users(u.model_dump() for u in users)
+        repo = UserRepository(database)
+
+        def users_json():
+            with open(users_file) as f:
+                return User(**json.load(f)[names[0]])
+
+        # The old path parsed the file on every request; one parse per lookup
+        best, median = timed(users_json, args.repeat)
+        report(f"users.json parse + lookup, {args.users} users", best, median)
+
+        def per_lookup(name, fn):
+            best, median = timed(lambda: [fn(n) for n in names], args.repeat)
+            print(f"{name:<40} best {best / args.lookups * 1e6:9.1f} us   median "
+                  f"{median / args.lookups * 1e6:9.1f} us per lookup")
+
+        per_lookup("Database.get_user", database.get_user)
+        repo.get(names[0])
+        per_lookup("UserRepository.get (cached model)", repo.get)
+        tokens = {n: create_access_token(n) for n in names}
+        # get_current_user resolves misses through the module's repository
+        auth.user_repo = repo
+        per_lookup("get_current_user (token cache)", lambda n: get_current_user(tokens[n]))
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import multiprocessing
+import time
+import numpy as np
+
+
+def price_matrix(assets, bars, seed=0, late_share=0.1):
+    # (close, high, low) random walks; late_share of the rows start partway
+    # through, like instruments listed after the others in an aligned matrix
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, (assets, bars)), axis=1))
+    spread = rng.uniform(0, 0.002, close.shape)
+    high, low = close * (1 + spread), close * (1 - spread)
+    late = rng.random(assets) < late_share
+    starts = rng.integers(0, bars // 2, assets)
+    for row in np.flatnonzero(late):
+        for matrix in (close, high, low):
+            matrix[row, :starts[row]] = np.nan
+    return close, high, low
+
+
+def timed(fn, repeat=5):
+    # (best, median) wall time of fn() in seconds
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times), float(np.median(times))
+
+
+def report(name, best, median, target=None):
+    line = f"{name:<40} best {best * 1000:9.1f} ms   median {median * 1000:9.1f} ms"
+    if target is not None:
+        line += f"   target {target * 1000:.0f} ms {'ok' if best <= target else 'MISSED'}"
+    print(line)
+
+
+def _serve_broker(payloads, latency, counters, ready):
+    # asyncio server speaking just enough HTTP/1.1 keep-alive for GETs
+    requests, connections = counters
+    bodies = {path: json.dumps(payload).encode() for path, payload in payloads.items()}
+
+    async def handle(reader, writer):
+        connections.value += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                path = head.split(b" ", 2)[1].decode().split("?")[0]
+                requests.value += 1
+                await asyncio.sleep(latency)
+                body = bodies.get(path, b"{}")
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=1024)
+        ready.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+class MockBroker:
+    # Keep-alive HTTP stand-in on localhost answering every GET with the
+    # payload for its path after `latency` seconds, like a remote broker. It
+    # runs in its own process so its threads do not share the caller's GIL.
+    def __init__(self, payloads=None, latency=0.0):
+        context = multiprocessing.get_context("spawn")
+        self._requests, self._connections = context.Value("l", 0, lock=False), context.Value("l", 0, lock=False)
+        ready = context.Queue()
+        self.process = context.Process(target=_serve_broker, daemon=True,
+                                       args=(payloads or {}, latency, (self._requests, self._connections), ready))
+        self.process.start()
+        self.url = f"http://127.0.0.1:{ready.get(timeout=30)}"
+
+    @property
+    def requests(self):
+        return self._requests.value
+
+    @property
+    def connections(self):
+        return self._connections.value
+
+    def close(self):
+        self.process.terminate()
+        self.process.join()
@@ -0,0 +1,90 @@
+import numpy as np
+
+# Plain-loop indicator implementations over one row's valid bars, the
+# yardstick app.indicators is checked against. Each returns a list the
+# length of its input, NaN where the indicator is not defined yet.
+
+
+def smooth(values, period, alpha, first=0):
+    out = [np.nan] * len(values)
+    if len(values) - first >= period:
+        y = sum(values[first:first + period]) / period
+        out[first + period - 1] = y
+        for i in range(first + period, len(values)):
+            y = (1 - alpha) * y + alpha * values[i]
+            out[i] = y
+    return out
+
+
+def ema(values, period):
+    return smooth(values, period, 2 / (period + 1))
+
+
+def rsi(values, period=14):
+    out = [np.nan] * len(values)
+    if len(values) <= period:
+        return out
+    gains = [max(b - a, 0) for a, b in zip(values, values[1:])]
+    losses = [max(a - b, 0) for a, b in zip(values, values[1:])]
+    gain, loss = sum(gains[:period]) / period, sum(losses[:period]) / period
+    for i in range(period, len(values)):
+        if i > period:
+            gain = (gain * (period - 1) + gains[i - 1]) / period
+            loss = (loss * (period - 1) + losses[i - 1]) / period
+        if loss == 0:
+            out[i] = 50.0 if gain == 0 else 100.0
+        else:
+            out[i] = 100 - 100 / (1 + gain / loss)
+    return out
+
+
+def rolling(values, period, ddof=0):
+    # (mean, std) over each window of `period` values
+    mean, std = [np.nan] * len(values), [np.nan] * len(values)
+    for i in range(period - 1, len(values)):
+        window = np.array(values[i - period + 1:i + 1])
+        mean[i], std[i] = window.mean(), window.std(ddof=ddof)
+    return mean, std
+
+
+def atr(high, low, close, period=14):
+    tr = [high[0] - low[0]] + [max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+                               for i in range(1, len(close))]
+    return smooth(tr, period, 1 / period)
+
+
+def volatility(values, period):
+    # Rolling sample std of log returns; the first bar has no return
+    returns = [float(np.log(b / a)) for a, b in zip(values, values[1:])]
+    return [np.nan] + rolling(returns, period, ddof=1)[1]
+
+
+def zscore(values, period):
+    mean, std = rolling(values, period)
+    return [(v - m) / s if s > 0 else np.nan for v, m, s in zip(values, mean, std)]
+
+
+def compute_indicators(close, high, low):
+    # The defaults of app.indicators.compute_indicators, row by row; bars
+    # missing from a row stay NaN
+    out = {}
+    for r in range(close.shape[0]):
+        valid = ~np.isnan(close[r])
+        c, h, l = (list(row[valid]) for row in (close[r], high[r], low[r]))
+        mean, std = rolling(c, 20)
+        series = {
+            "ema_12": ema(c, 12),
+            "ema_26": ema(c, 26),
+            "rsi": rsi(c),
+            "atr": atr(h, l, c) if c else [],
+            "sma_20": mean,
+            "bb_mid": mean,
+            "bb_upper": [m + 2 * s for m, s in zip(mean, std)],
+            "bb_lower": [m - 2 * s for m, s in zip(mean, std)],
+            "zscore": zscore(c, 20),
+            "volatility": volatility(c, 20) if c else [],
+        }
+        for name, values in series.items():
+            row = out.setdefault(name, np.full(close.shape, np.nan))[r]
+            row[valid] = values
+    return out
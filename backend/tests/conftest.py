@@ -0,0 +1,63 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app import capitalcom_api
+
+
+class FaultyBroker:
+    # Stand-in broker on localhost: each path answers from a script of
+    # (status, body) faults, then with a 200 and its JSON payload. A path's
+    # delays (seconds) hold its next responses back, to stand in for a hung
+    # broker. Keeps connections alive and counts how many were opened.
+    def __init__(self):
+        self.faults = {}
+        self.delays = {}
+        self.payloads = {}
+        self.hits = {}
+        self.connections = 0
+        broker = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                broker.connections += 1
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                broker.hits[path] = broker.hits.get(path, 0) + 1
+                delays = broker.delays.get(path)
+                if delays:
+                    time.sleep(delays.pop(0))
+                script = broker.faults.get(path)
+                status, body = script.pop(0) if script else (200, json.dumps(broker.payloads.get(path, {})))
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                # The client gave up on a delayed response
+                pass
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    monkeypatch.setattr(capitalcom_api, "backoff_delay", lambda attempt: 0)
+    broker = FaultyBroker()
+    yield broker
+    broker.server.shutdown()
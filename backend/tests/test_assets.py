@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from app import assets
+from app.broker_sessions import get_broker_api
+from app.instrument_catalogue import InstrumentCatalogue
+from app.main import app
+from app.storage import Database
+
+
+def market(epic, type="CURRENCIES", status="TRADEABLE", name=None):
+    return {"epic": epic, "symbol": epic, "name": name or epic, "type": type, "status": status,
+            "bid": 1.0, "offer": 1.1}
+
+
+class Navigation:
+    # Market navigation stand-in: node id -> page, or an error for a failing node
+    def __init__(self, pages):
+        self.pages = pages
+
+    async def get_market_navigation(self, node_id=None):
+        page = self.pages.get(node_id)
+        return page if page is not None else {"error": "Broker returned 503"}
+
+
+def tree(*markets, failing=False):
+    pages = {None: {"nodes": [{"id": "fx", "name": "FX"}, {"id": "stocks", "name": "Stocks"}], "markets": []},
+             "fx": {"nodes": [], "markets": [m for m in markets if m["type"] == "CURRENCIES"]}}
+    if not failing:
+        pages["stocks"] = {"nodes": [], "markets": [m for m in markets if m["type"] == "SHARES"]}
+    return Navigation(pages)
+
+
+@pytest.fixture
+def catalogue(tmp_path, monkeypatch):
+    catalogue = InstrumentCatalogue(database=Database(str(tmp_path / "catalogue.db")))
+    monkeypatch.setattr(assets, "instrument_catalogue", catalogue)
+    return catalogue
+
+
+@pytest.fixture
+def client(catalogue):
+    app.dependency_overrides[get_broker_api] = lambda: None
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_refresh_reports_only_changes(catalogue):
+    eurusd, aapl = market("EURUSD"), market("AAPL", "SHARES")
+    assert asyncio.run(catalogue.refresh(tree(eurusd, aapl))) == {"added": 2, "changed": 0, "removed": 0,
+                                                                   "complete": True}
+    version = catalogue.version
+    assert asyncio.run(catalogue.refresh(tree(eurusd, aapl)))["added"] == 0
+    assert catalogue.version == version
+    result = asyncio.run(catalogue.refresh(tree(market("EURUSD", status="CLOSED"))))
+    assert (result["changed"], result["removed"]) == (1, 1)
+    assert catalogue.get("EURUSD")["status"] == "CLOSED"
+    assert catalogue.version == version + 1
+
+
+def test_partial_crawl_keeps_unvisited_instruments(catalogue):
+    asyncio.run(catalogue.refresh(tree(market("EURUSD"), market("AAPL", "SHARES"))))
+    result = asyncio.run(catalogue.refresh(tree(market("EURUSD"), failing=True)))
+    assert result == {"added": 0, "changed": 0, "removed": 0, "complete": False}
+    assert catalogue.get("AAPL") is not None
+    # A fresh process reads the same catalogue back
+    reloaded = InstrumentCatalogue(database=catalogue.db)
+    reloaded.load()
+    assert set(reloaded.instruments) == {"EURUSD", "AAPL"}
+
+
+def test_etag_answers_304_for_strong_weak_and_star(client, catalogue):
+    asyncio.run(catalogue.refresh(tree(market("EURUSD"), market("AAPL", "SHARES"))))
+    response = client.get("/assets", params={"type": "SHARES"})
+    assert response.status_code == 200
+    assert [i["epic"] for i in response.json()] == ["AAPL"]
+    etag = response.headers["etag"]
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        assert client.get("/assets", params={"type": "SHARES"}, headers={"If-None-Match": header}).status_code == 304
+    assert client.get("/assets", headers={"If-None-Match": etag}).status_code == 200
+    # A catalogue change moves the ETag
+    asyncio.run(catalogue.refresh(tree(market("EURUSD"), market("AAPL", "SHARES", name="Apple"))))
+    assert client.get("/assets", params={"type": "SHARES"}, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_unknown_filters_are_not_cached(client, catalogue):
+    asyncio.run(catalogue.refresh(tree(market("EURUSD"))))
+    for i in range(20):
+        assert client.get("/assets", params={"type": f"junk{i}"}).json() == []
+    client.get("/assets", params={"type": "CURRENCIES", "status": "TRADEABLE"})
+    assert len(catalogue.responses) == 1
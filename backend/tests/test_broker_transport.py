@@ -0,0 +1,36 @@
+import asyncio
+from app.capitalcom_api import CapitalComAPI, AsyncCapitalComAPI
+
+CALLS = 10
+
+
+def make_client(cls, broker):
+    api = cls(identifier="id", password="pw", api_key=f"transport-{broker.url}", demo=True)
+    api.base_url = broker.url
+    return api
+
+
+def test_sync_calls_reuse_one_connection(broker):
+    api = make_client(CapitalComAPI, broker)
+    broker.payloads["/api/v1/positions"] = {"positions": []}
+    for _ in range(CALLS):
+        assert api.get_positions() == {"positions": []}
+    assert broker.hits["/api/v1/positions"] == CALLS
+    assert broker.connections == 1
+    # Another client for the same key shares the pooled session
+    assert make_client(CapitalComAPI, broker).session is api.session
+
+
+def test_async_calls_reuse_one_connection(broker):
+    api = make_client(AsyncCapitalComAPI, broker)
+    broker.payloads["/api/v1/positions"] = {"positions": []}
+
+    async def run():
+        try:
+            return [await api.get_positions() for _ in range(CALLS)]
+        finally:
+            await api.client.aclose()
+
+    assert asyncio.run(run()) == [{"positions": []}] * CALLS
+    assert broker.hits["/api/v1/positions"] == CALLS
+    assert broker.connections == 1
@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime, timezone
+import numpy as np
+from app.candle_store import CandleStore
+from app.candle_sync import CandleSync
+
+STEP = 60
+NOW = 1_000 * STEP
+
+
+def make_sync(tmp_path, bars):
+    store = CandleStore(root=str(tmp_path))
+    times = NOW - STEP * np.arange(bars, 0, -1, dtype=np.int64)
+    prices = np.ones(bars)
+    store.append("EURUSD", "MINUTE", {"time": times, "open": prices, "high": prices, "low": prices,
+                                      "close": prices, "volume": prices})
+    return CandleSync(store, max_points=100, initial_bars=50)
+
+
+def test_history_bars_plans_the_missing_head(tmp_path):
+    sync = make_sync(tmp_path, 50)
+    tail, gap_pages = sync.plan("EURUSD", "MINUTE", now=NOW, history_bars=300)
+    assert tail == []
+    pages = [page for _, page in gap_pages]
+    assert pages[0][0] == NOW - 300 * STEP
+    assert pages[-1][1] == NOW - 50 * STEP
+    assert len(pages) == 3
+
+
+def test_checked_head_is_not_requested_again(tmp_path):
+    sync = make_sync(tmp_path, 50)
+    _, gap_pages = sync.plan("EURUSD", "MINUTE", now=NOW, history_bars=300)
+    sync._save_checked_gaps("EURUSD", "MINUTE", {gap for gap, _ in gap_pages})
+    assert sync.plan("EURUSD", "MINUTE", now=NOW + STEP, history_bars=300)[1] == []
+    # Without history_bars the head is never asked for
+    assert make_sync(tmp_path / "other", 50).plan("EURUSD", "MINUTE", now=NOW)[1] == []
+
+
+class HistoryAPI:
+    # Serves one bar per minute for whatever page is asked for
+    async def _fetch_prices(self, epic, resolution, max_points, start, end, lane):
+        start, end = (int(datetime.fromisoformat(t).replace(tzinfo=timezone.utc).timestamp()) for t in (start, end))
+        return [{"time": datetime.fromtimestamp(t, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S"),
+                 "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "volume": 1.0}
+                for t in range(start, end, STEP)]
+
+
+def test_sync_backfills_the_head_into_the_store(tmp_path):
+    sync = make_sync(tmp_path, 50)
+    errors = asyncio.run(sync.sync(HistoryAPI(), ["EURUSD"], "MINUTE", now=NOW, history_bars=300))
+    assert errors == {"EURUSD": None}
+    series = sync.store.series("EURUSD", "MINUTE")
+    assert series.first_time() == NOW - 300 * STEP
+    assert series.gaps(STEP) == []
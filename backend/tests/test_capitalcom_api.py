@@ -0,0 +1,101 @@
+import asyncio
+from app.capitalcom_api import CapitalComAPI, AsyncCapitalComAPI
+from app.resilience import BREAKER_THRESHOLD, MAX_RETRIES, get_breaker
+
+
+def make_client(cls, broker):
+    api = cls(identifier="id", password="pw", api_key=f"key-{broker.url}", demo=True)
+    api.base_url = broker.url
+    return api
+
+
+def test_5xx_and_bad_json_count_as_breaker_failures(broker):
+    api = make_client(CapitalComAPI, broker)
+    breaker = get_breaker(broker.url, "/api/v1/accounts")
+    broker.faults["/api/v1/accounts"] = [(501, "{}"), (200, "<html>down</html>"), (505, "{}")]
+    assert "error" in api.get_account_info()
+    assert breaker.failures == 3
+    broker.payloads["/api/v1/accounts"] = {"accounts": []}
+    assert api.get_account_info() == {"accounts": []}
+    assert breaker.failures == 0
+
+
+def test_cached_fallback_but_never_for_positions(broker):
+    api = make_client(CapitalComAPI, broker)
+    broker.payloads["/api/v1/accounts"] = {"accounts": [1]}
+    broker.payloads["/api/v1/positions"] = {"positions": [1]}
+    assert api.get_account_info() == {"accounts": [1]}
+    assert api.get_positions() == {"positions": [1]}
+    broker.faults["/api/v1/accounts"] = [(503, "{}")] * 3
+    broker.faults["/api/v1/positions"] = [(503, "{}")] * 3
+    assert api.get_account_info() == {"accounts": [1]}
+    assert "error" in api.get_positions()
+
+
+def test_async_client_treats_faults_the_same(broker):
+    api = make_client(AsyncCapitalComAPI, broker)
+    breaker = get_breaker(broker.url, "/api/v1/positions")
+    broker.faults["/api/v1/positions"] = [(502, "{}"), (200, "not json"), (500, "{}")]
+
+    async def run():
+        try:
+            return await api.get_positions()
+        finally:
+            await api.client.aclose()
+
+    assert "error" in asyncio.run(run())
+    assert breaker.failures == 3
+    assert broker.hits["/api/v1/positions"] == 3
+
+
+def open_breaker(api, broker, path):
+    # Enough failing calls (each retried MAX_RETRIES times) to trip the breaker
+    broker.faults[path] = [(503, "{}")] * BREAKER_THRESHOLD
+    calls = -(-BREAKER_THRESHOLD // (MAX_RETRIES + 1))
+    for _ in range(calls):
+        assert "error" in api.get_account_info()
+    breaker = get_breaker(broker.url, path)
+    assert breaker.state == breaker.OPEN
+    return breaker
+
+
+def test_open_breaker_fails_fast_without_calling_the_broker(broker):
+    api = make_client(CapitalComAPI, broker)
+    open_breaker(api, broker, "/api/v1/accounts")
+    hits = broker.hits["/api/v1/accounts"]
+    assert hits == BREAKER_THRESHOLD
+    assert "Circuit open" in api.get_account_info()["error"]
+    assert broker.hits["/api/v1/accounts"] == hits
+
+
+def test_breaker_half_opens_and_closes_on_a_good_probe(broker):
+    api = make_client(CapitalComAPI, broker)
+    breaker = open_breaker(api, broker, "/api/v1/accounts")
+    # A failed probe opens it again for another reset_timeout
+    breaker.opened_at -= breaker.reset_timeout
+    broker.faults["/api/v1/accounts"] = [(503, "{}")]
+    assert "error" in api.get_account_info()
+    assert breaker.state == breaker.OPEN
+    assert "Circuit open" in api.get_account_info()["error"]
+    breaker.opened_at -= breaker.reset_timeout
+    broker.payloads["/api/v1/accounts"] = {"accounts": [2]}
+    assert api.get_account_info() == {"accounts": [2]}
+    assert breaker.state == breaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_hung_broker_is_retried_then_served_from_cache(broker):
+    api = make_client(CapitalComAPI, broker)
+    api.timeout = (1.0, 0.2)
+    path = "/api/v1/accounts"
+    broker.payloads[path] = {"accounts": [1]}
+    assert api.get_account_info() == {"accounts": [1]}
+    # One hung response: the retry gets the fresh payload
+    broker.payloads[path] = {"accounts": [2]}
+    broker.delays[path] = [0.5]
+    assert api.get_account_info() == {"accounts": [2]}
+    assert broker.hits[path] == 3
+    # Every attempt hangs: the last good payload is served
+    broker.delays[path] = [0.5] * (MAX_RETRIES + 1)
+    assert api.get_account_info() == {"accounts": [2]}
+    assert broker.hits[path] == 3 + MAX_RETRIES + 1
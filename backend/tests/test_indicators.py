@@ -0,0 +1,39 @@
+import numpy as np
+from app import indicators
+from benchmarks import reference
+
+
+def gapped_prices(rows=12, bars=400, seed=0):
+    # Rows with late starts, early ends, holes and one empty row
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (rows, bars)), axis=1))
+    high = close * (1 + rng.uniform(0, 0.01, close.shape))
+    low = close * (1 - rng.uniform(0, 0.01, close.shape))
+    for matrix in (close, high, low):
+        matrix[1, :150] = np.nan
+        matrix[2, 300:] = np.nan
+        matrix[3, 100:110] = np.nan
+        matrix[4, ::9] = np.nan
+        matrix[5] = np.nan
+        matrix[6, :-10] = np.nan
+    return close, high, low
+
+
+def test_compute_indicators_matches_the_reference_loops():
+    close, high, low = gapped_prices()
+    result = indicators.compute_indicators(close, high, low)
+    expected = reference.compute_indicators(close, high, low)
+    for name, series in expected.items():
+        np.testing.assert_allclose(result[name], series, rtol=1e-9, atol=1e-9, err_msg=name)
+
+
+def test_single_indicators_match_compute_indicators():
+    close, high, low = gapped_prices(seed=1)
+    result = indicators.compute_indicators(close, high, low)
+    np.testing.assert_allclose(indicators.ema(close, 26), result["ema_26"])
+    np.testing.assert_allclose(indicators.rsi(close), result["rsi"])
+    np.testing.assert_allclose(indicators.atr(high, low, close), result["atr"])
+    np.testing.assert_allclose(indicators.zscore(close), result["zscore"])
+    np.testing.assert_allclose(indicators.volatility(close, 20), result["volatility"])
+    # 1-D rows give 1-D results
+    np.testing.assert_allclose(indicators.rsi(close[1]), result["rsi"][1])
@@ -0,0 +1,25 @@
+import asyncio
+import pytest
+from app.password_hashing import HashingBusy, PasswordHasher
+
+
+def test_hash_and_verify_on_spawned_workers():
+    hasher = PasswordHasher(workers=1, rounds=4)
+
+    async def run():
+        hashed = await hasher.hash("secret")
+        return await hasher.verify("secret", hashed), await hasher.verify("wrong", hashed)
+
+    try:
+        (ok, new_hash), (bad, _) = asyncio.run(run())
+    finally:
+        hasher.shutdown()
+    assert ok and new_hash is None
+    assert not bad
+
+
+def test_full_queue_raises_a_domain_error():
+    hasher = PasswordHasher(workers=1, max_queue=0, rounds=4)
+    with pytest.raises(HashingBusy):
+        asyncio.run(hasher.hash("secret"))
+    assert hasher.stats["rejected"] == 1
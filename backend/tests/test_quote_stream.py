@@ -0,0 +1,127 @@
+import asyncio
+import json
+import websockets
+from app import quote_stream
+from app.broker_sessions import BrokerSessionManager
+from app.candle_store import CandleStore
+from app.quote_replay import make_handler
+from app.quote_stream import QuoteStream, store_minute_bar
+
+
+class Api:
+    identifier = "id"
+    password = "pw"
+    api_key = "key"
+    api_key_password = None
+    demo = True
+
+    def __init__(self, cst):
+        self.cst = cst
+
+    def get_tokens(self):
+        return {"cst": self.cst, "security_token": "s", "session_token": None}
+
+
+def test_failing_tick_listener_does_not_stop_the_others():
+    stream = QuoteStream(epics=["EURUSD"])
+    stream.bar_listeners = []
+    seen = []
+
+    def broken(epic, bid, ask, timestamp):
+        raise RuntimeError("boom")
+
+    stream.tick_listeners = [broken, lambda epic, bid, ask, timestamp: seen.append(epic)]
+    stream.on_quote("EURUSD", 1.0, 1.1, 0)
+    assert seen == ["EURUSD"]
+    assert stream.latest("EURUSD").bid == 1.0
+    assert stream.stats["listener_errors"] == 1
+
+
+def test_stream_session_moves_to_a_live_user():
+    sessions = BrokerSessionManager()
+    sessions.register("alice", Api("a"), streaming_host="wss://a/")
+    sessions.register("bob", Api("b"), streaming_host="wss://b/")
+    assert sessions.stream_session() == ("wss://a/", sessions.tokens("alice"))
+    # Stays on the same session while it lives
+    sessions.register("carol", Api("c"), streaming_host="wss://c/")
+    assert sessions.stream_session()[0] == "wss://a/"
+    sessions.drop("alice")
+    assert sessions.stream_session() == ("wss://b/", sessions.tokens("bob"))
+    assert sessions.shared_async_client().cst == "b"
+    sessions.drop("bob")
+    sessions.drop("carol")
+    assert sessions.stream_session() is None
+
+
+def test_streamed_minute_bars_are_written_in_order(tmp_path, monkeypatch):
+    store = CandleStore(root=str(tmp_path))
+    monkeypatch.setattr(quote_stream, "candle_store", store)
+    futures = [store_minute_bar("EURUSD", (60 * i, 1.0, 1.2, 0.9, 1.1, 5)) for i in range(1, 4)]
+    for future in futures:
+        future.result(timeout=5)
+    columns = store.read("EURUSD", "MINUTE")
+    assert list(columns["time"]) == [60, 120, 180]
+    assert list(columns["volume"]) == [5.0, 5.0, 5.0]
+
+
+class Recorder:
+    # Wraps the server side of a connection, keeping what the stream sent
+    def __init__(self, ws):
+        self.ws = ws
+        self.received = []
+
+    async def __aiter__(self):
+        async for raw in self.ws:
+            self.received.append(json.loads(raw))
+            yield raw
+
+    async def send(self, message):
+        await self.ws.send(message)
+
+
+def test_stream_reconnects_and_resubscribes_to_the_replay_server(monkeypatch):
+    monkeypatch.setattr(quote_stream, "STREAM_RECONNECT_MIN", 0.05)
+    monkeypatch.setattr(quote_stream, "STREAM_PING_INTERVAL", 0.05)
+    epics = [f"EPIC{i}" for i in range(45)]
+    ticks = [{"epic": epic, "bid": 1.0 + i / 1000, "ofr": 1.001 + i / 1000, "timestamp": 1_700_000_000_000 + 10 * i}
+             for i, epic in enumerate(["EPIC0", "EPIC44"] * 5)]
+    replay = make_handler(ticks, speed=1.0, loop=True)
+    connections = []
+
+    async def handler(ws, *args):
+        recorder = Recorder(ws)
+        connections.append(recorder)
+        await replay(recorder, *args)
+
+    async def wait_for(condition):
+        for _ in range(200):
+            if condition():
+                return
+            await asyncio.sleep(0.02)
+        raise AssertionError("timed out")
+
+    async def main():
+        async with websockets.serve(handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            stream = QuoteStream(epics=epics)
+            stream.bar_listeners = []
+            stream.start(lambda: (f"ws://127.0.0.1:{port}/", {"cst": "c", "security_token": "s"}))
+            try:
+                await wait_for(lambda: stream.stats["ticks"] >= 5)
+                await connections[0].ws.close()
+                await wait_for(lambda: stream.stats["connects"] == 2)
+                before = stream.stats["ticks"]
+                await wait_for(lambda: stream.stats["ticks"] >= before + 5)
+                await wait_for(lambda: any(m["destination"] == "ping" for m in connections[1].received))
+            finally:
+                await stream.stop()
+        return stream
+
+    stream = asyncio.run(main())
+    assert len(connections) == 2
+    for connection in connections:
+        chunks = [m["payload"]["epics"] for m in connection.received if m["destination"] == "marketData.subscribe"]
+        assert [len(chunk) for chunk in chunks] == [40, 5]
+        assert sum(chunks, []) == epics
+        assert all(m["cst"] == "c" and m["securityToken"] == "s" for m in connection.received)
+    assert set(stream.quotes) == {"EPIC0", "EPIC44"}
@@ -0,0 +1,155 @@
+import asyncio
+import pytest
+from app.rate_limiter import PriorityRateLimiter, ORDERS, ACCOUNT, MARKET_DATA, REPORTS
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+    async def async_sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+        await asyncio.sleep(0)
+
+
+def make_limiter(rate=10, burst=2):
+    clock = FakeClock()
+    return PriorityRateLimiter(rate=rate, burst=burst, clock=clock, sleep=clock.sleep,
+                               async_sleep=clock.async_sleep), clock
+
+
+def test_burst_then_rate():
+    limiter, clock = make_limiter(rate=10, burst=2)
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.now == 0.0
+    limiter.acquire()
+    assert clock.now == pytest.approx(0.1)
+    stats = limiter.get_stats()["account"]
+    assert stats["granted"] == 3
+    assert stats["queue_depth"] == 0
+    assert stats["max_wait"] == pytest.approx(0.1)
+
+
+def test_lanes_served_by_priority():
+    limiter, clock = make_limiter(rate=1, burst=1)
+    limiter.acquire()
+    order = []
+
+    async def yield_only(delay):
+        # Time only moves when the test advances the clock
+        await asyncio.sleep(0)
+
+    limiter.async_sleep = yield_only
+
+    async def waiter(lane):
+        await limiter.acquire_async(lane)
+        order.append(lane)
+
+    async def main():
+        # Queued lowest priority first; served highest priority first
+        tasks = [asyncio.ensure_future(waiter(lane)) for lane in (REPORTS, MARKET_DATA, ACCOUNT, ORDERS)]
+        await asyncio.sleep(0)
+        assert sum(s["queue_depth"] for s in limiter.get_stats().values()) == 4
+        while len(order) < 4:
+            clock.now += 1.0
+            for _ in range(10):
+                await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == [ORDERS, ACCOUNT, MARKET_DATA, REPORTS]
+    stats = limiter.get_stats()
+    assert stats["orders"]["max_wait"] == 1.0
+    assert stats["reports"]["max_wait"] == 4.0
+    assert all(s["queue_depth"] == 0 for s in stats.values())
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    limiter, clock = make_limiter(rate=1, burst=1)
+
+    async def blocked_sleep(delay):
+        await asyncio.Event().wait()
+
+    limiter.async_sleep = blocked_sleep
+
+    async def main():
+        await limiter.acquire_async()
+        waiter = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0)
+        assert len(limiter._waiting) == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter._waiting == []
+        clock.now += 1.0
+        # Would wait forever behind the cancelled ticket
+        await asyncio.wait_for(limiter.acquire_async(), timeout=1.0)
+
+    asyncio.run(main())
+    assert limiter.get_stats()["account"]["queue_depth"] == 0
+
+
+def test_timed_out_async_waiter_leaves_the_queue():
+    limiter, clock = make_limiter(rate=1, burst=1)
+
+    async def main():
+        await limiter.acquire_async()
+        limiter.async_sleep = asyncio.sleep
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire_async(ORDERS), timeout=0.01)
+        assert limiter._waiting == []
+        clock.now += 1.0
+        await asyncio.wait_for(limiter.acquire_async(REPORTS), timeout=1.0)
+
+    asyncio.run(main())
+
+
+def test_interrupted_sync_waiter_leaves_the_queue():
+    limiter, clock = make_limiter(rate=1, burst=1)
+    limiter.acquire()
+
+    def interrupted(delay):
+        raise KeyboardInterrupt
+
+    limiter.sleep = interrupted
+    with pytest.raises(KeyboardInterrupt):
+        limiter.acquire()
+    assert limiter._waiting == []
+    limiter.sleep = clock.sleep
+    limiter.acquire()
+    assert clock.now == pytest.approx(1.0)
+
+
+def test_deep_async_queue_only_sleeps_at_the_head():
+    sleeps = []
+
+    async def counted_sleep(delay):
+        sleeps.append(delay)
+        await asyncio.sleep(delay)
+
+    limiter = PriorityRateLimiter(rate=200, burst=1, async_sleep=counted_sleep)
+    order = []
+
+    async def waiter(i):
+        await limiter.acquire_async(ACCOUNT)
+        order.append(i)
+
+    async def main():
+        await asyncio.gather(*(waiter(i) for i in range(40)))
+
+    asyncio.run(main())
+    assert order == list(range(40))
+    # Roughly one refill wait per grant; polling every waiter would be ~40x that
+    assert len(sleeps) <= 2 * 40
+    assert limiter._wakers == {}
+    assert limiter.get_stats()["account"]["queue_depth"] == 0
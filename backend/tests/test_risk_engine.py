@@ -0,0 +1,93 @@
+from app.models import User
+from app.quote_stream import Quote
+from app.risk_engine import RiskEngine
+from app.risk_settings import RiskSettings
+
+
+class Quotes:
+    def __init__(self, **quotes):
+        self.quotes = quotes
+
+    def latest(self, epic):
+        return self.quotes.get(epic)
+
+
+def make_engine(quotes=None, balance=1000.0, **settings):
+    values = {**RiskSettings().dict(), **settings}
+    engine = RiskEngine(settings_loader=lambda username: dict(values), clock=lambda: 0.0,
+                        quotes=quotes or Quotes(EURUSD=Quote(1.0, 1.0, 0)))
+    user = User(username="u", password="", api_key="", api_key_password="", use_demo=True,
+                account_info={"accountInfo": {"balance": balance}})
+    return engine, user
+
+
+def trade(engine, user, epic, direction, size, **kwargs):
+    reason, kind = engine.check(user, epic, direction, size, **kwargs)
+    if reason is None:
+        engine.settle(user.username, epic, direction, size, {"dealReference": "x"}, kind)
+    return reason
+
+
+def test_closing_order_passes_concurrent_trades_limit():
+    engine, user = make_engine(concurrentTrades=1)
+    assert trade(engine, user, "EURUSD", "BUY", 100) is None
+    assert engine.status(user)["open_trades"] == 1
+    assert trade(engine, user, "GBPUSD", "BUY", 100, price=1.0) == "Max concurrent trades reached (1)"
+    assert trade(engine, user, "EURUSD", "SELL", 60) is None
+    assert trade(engine, user, "EURUSD", "SELL", 40) is None
+    assert engine.status(user)["open_trades"] == 0
+
+
+def test_adding_to_a_position_is_not_a_new_trade():
+    engine, user = make_engine(concurrentTrades=1)
+    assert trade(engine, user, "EURUSD", "BUY", 100) is None
+    assert trade(engine, user, "EURUSD", "BUY", 100) is None
+    assert engine.status(user)["open_trades"] == 1
+    # Flipping opens a new position and counts against the limit again
+    engine.reconcile(user.username, [])
+    assert trade(engine, user, "EURUSD", "SELL", 100) is None
+    assert trade(engine, user, "EURUSD", "BUY", 300) is None
+
+
+def test_daily_loss_limit_still_allows_cutting_losses():
+    quotes = Quotes(EURUSD=Quote(10.0, 10.0, 0))
+    engine, user = make_engine(quotes, concurrentTrades=5, maxDailyLoss=10, leverage=100)
+    assert trade(engine, user, "EURUSD", "BUY", 100) is None
+    engine.on_tick("EURUSD", 8.5, 8.5, 0)
+    assert trade(engine, user, "EURUSD", "BUY", 10).startswith("Daily loss limit")
+    quotes.quotes["EURUSD"] = Quote(8.5, 8.5, 0)
+    assert trade(engine, user, "EURUSD", "SELL", 100) is None
+    assert engine.status(user)["realized_pnl"] == -150.0
+
+
+def test_reconcile_counts_positions_per_epic():
+    engine, user = make_engine(concurrentTrades=2)
+    engine.book(user)
+    deals = [{"position": {"size": 1, "direction": "BUY", "level": 1.0}, "market": {"epic": "EURUSD"}}] * 3
+    engine.reconcile(user.username, deals)
+    assert engine.status(user)["open_trades"] == 1
+    assert trade(engine, user, "EURUSD", "SELL", 3) is None
+    assert engine.status(user)["open_trades"] == 0
+
+
+def test_unquoted_epic_needs_a_price():
+    engine, user = make_engine(Quotes())
+    assert engine.needs_price(user, "GOLD", "BUY", 1)
+    assert trade(engine, user, "GOLD", "BUY", 1) == "No price for GOLD to check the order against"
+    assert trade(engine, user, "GOLD", "BUY", 1, price=2000.0, stop_loss=1000.0).startswith("Stop loss risks")
+    assert trade(engine, user, "GOLD", "BUY", 1, price=2000.0) is None
+
+
+def test_concurrent_opens_on_one_epic_release_their_reservations():
+    engine, user = make_engine(concurrentTrades=2)
+    # Both orders are checked before either fills, as /trade does around the broker call
+    first = engine.check(user, "EURUSD", "BUY", 100)
+    second = engine.check(user, "EURUSD", "BUY", 100)
+    assert first == second == (None, "open")
+    engine.settle(user.username, "EURUSD", "BUY", 100, {"dealReference": "a"}, first[1])
+    engine.settle(user.username, "EURUSD", "BUY", 100, {"dealReference": "b"}, second[1])
+    assert trade(engine, user, "EURUSD", "SELL", 200) is None
+    book = engine.book(user)
+    assert (book.open_trades, book.pending, book.pending_opens) == (0, 0, 0)
+    assert trade(engine, user, "GBPUSD", "BUY", 100, price=1.0) is None
+    assert trade(engine, user, "USDJPY", "BUY", 100, price=1.0) is None
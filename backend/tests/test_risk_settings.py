@@ -0,0 +1,56 @@
+import os
+from app.models import User
+from app.risk_engine import RiskEngine
+from app.risk_settings import RiskSettingsStore, RiskSettings
+from app.storage import Database
+
+
+def test_other_workers_writes_reach_listeners(tmp_path):
+    path = os.path.join(tmp_path, "app.db")
+    worker_a, worker_b = RiskSettingsStore(Database(path)), RiskSettingsStore(Database(path))
+    seen = []
+    worker_b.subscribe(lambda username, settings, version: seen.append((username, settings["leverage"], version)))
+    assert worker_b.get("alice") is None
+    assert worker_b.reload() == []
+
+    version = worker_a.set("alice", {**RiskSettings().dict(), "leverage": 5})
+    changed = worker_b.reload()
+    assert [(u, s["leverage"], v) for u, v, s in changed] == [("alice", 5, version)]
+    assert worker_b.get("alice")["leverage"] == 5
+    # Nothing new since the last look
+    assert worker_b.reload() == []
+    # Its own writes are not reported back as remote changes
+    worker_b.set("alice", {**RiskSettings().dict(), "leverage": 3})
+    assert seen[-1][:2] == ("alice", 3)
+    assert worker_b.reload() == []
+    assert [s["leverage"] for _, _, s in worker_a.reload()] == [3]
+
+
+def test_deletes_reach_listeners_and_other_workers(tmp_path):
+    path = os.path.join(tmp_path, "app.db")
+    worker_a, worker_b = RiskSettingsStore(Database(path)), RiskSettingsStore(Database(path))
+    local, remote = [], []
+    worker_a.subscribe(lambda username, settings, version: local.append((username, settings)))
+    worker_b.subscribe(lambda username, settings, version: remote.append((username, settings)))
+    worker_a.set("alice", {**RiskSettings().dict(), "leverage": 5})
+    worker_b.reload()
+
+    assert worker_a.delete("alice")
+    assert local[-1] == ("alice", None)
+    assert worker_a.get("alice") is None
+    # Nothing left to delete
+    assert not worker_a.delete("alice")
+    assert worker_b.reload() == [("alice", 0, None)]
+    assert worker_b.get("alice") is None
+    assert worker_b.reload() == []
+
+
+def test_deleted_settings_put_the_risk_engine_back_on_defaults(tmp_path):
+    store = RiskSettingsStore(Database(os.path.join(tmp_path, "app.db")))
+    engine = RiskEngine(settings_loader=store.get)
+    store.subscribe(engine.update_settings)
+    store.set("u", {**RiskSettings().dict(), "concurrentTrades": 3})
+    user = User(username="u", password="", api_key="", api_key_password="", use_demo=True)
+    assert engine.book(user).settings["concurrentTrades"] == 3
+    store.delete("u")
+    assert engine.book(user).settings == RiskSettings().dict()
@@ -0,0 +1,21 @@
+import numpy as np
+from app.signal_pool import SignalPool
+from app.strategy import STRATEGIES
+from app.strategy_manager import score_matrix
+from benchmarks.common import price_matrix
+
+
+def test_pool_workers_are_not_forked_from_the_app_and_match_inline():
+    close, _, _ = price_matrix(40, 120)
+    names = list(STRATEGIES)
+    pool = SignalPool(workers=2, min_rows=1)
+    pool.start()
+    try:
+        assert pool._executor._mp_context.get_start_method() != "fork"
+        signals, raw = pool.score(names, close)
+    finally:
+        pool.shutdown()
+    expected_signals, expected_raw = score_matrix(names, close)
+    assert np.array_equal(signals, expected_signals)
+    assert np.array_equal(raw, expected_raw, equal_nan=True)
+    assert pool.stats["shards"] == 2
@@ -0,0 +1,36 @@
+from app.signal_tracker import SignalTracker
+from app.strategy import LONG, SHORT, HOLD
+
+
+def make_tracker(tmp_path):
+    return SignalTracker(horizon=60, window=10, min_gap=0, path=str(tmp_path / "tracker.npz"))
+
+
+def test_signal_is_scored_against_a_later_price(tmp_path):
+    tracker = make_tracker(tmp_path)
+    tracker.record("EURUSD", ["a", "b"], [LONG, SHORT], 1.0, timestamp=0)
+    tracker.on_price("EURUSD", 1.1, timestamp=30)
+    assert tracker.resolve(now=60) == 2
+    performance = tracker.performance(["EURUSD"], min_samples=1)["EURUSD"]
+    assert performance["a"]["win_rate"] == 1.0
+    assert performance["b"]["win_rate"] == 0.0
+
+
+def test_signal_without_a_later_price_expires(tmp_path):
+    tracker = make_tracker(tmp_path)
+    tracker.record("GOLD", ["a"], [LONG], 2000.0, timestamp=0)
+    tracker.resolve(now=60)
+    assert tracker.stats["expired"] == 1
+    assert tracker.stats["resolved"] == 0
+    assert tracker.win_rate("GOLD", "a", min_samples=1) is None
+
+
+def test_price_times_survive_a_snapshot(tmp_path):
+    tracker = make_tracker(tmp_path)
+    tracker.record("EURUSD", ["a"], [LONG], 1.0, timestamp=0)
+    tracker.record("EURUSD", ["a"], [HOLD], 1.2, timestamp=10)
+    tracker.snapshot()
+    restored = make_tracker(tmp_path)
+    assert restored.load()
+    restored.resolve(now=60)
+    assert restored.win_rate("EURUSD", "a", min_samples=1) == 1.0
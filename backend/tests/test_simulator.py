@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from app import simulator
+from app.candle_store import CandleStore
+from app.signal_pool import SignalPool
+from app.simulator import FillModel, RunConfig, Simulator, sweep
+from app.storage import Database
+from app.strategy import LONG, HOLD
+
+HOUR = 3600
+NO_COSTS = FillModel(spread=0.0, slippage=0.0, latency_ms=0)
+
+
+class Script:
+    # Plugin stand-in returning a fixed signal per bar
+    def __init__(self, signals):
+        self.signals = list(signals)
+
+    def on_bar(self, bar):
+        return self.signals.pop(0), 1.0
+
+    def on_tick(self, bid, ask, timestamp_ms):
+        pass
+
+
+def run(bars, signals, fill=NO_COSTS, **config):
+    # bars: (open, high, low, close) per hour
+    o, h, l, c = (np.array(column, dtype=float) for column in zip(*bars))
+    sim = Simulator("EURUSD", Script(signals), fill, RunConfig(**config))
+    return sim.run_bars(np.arange(len(c)) * HOUR, o, h, l, c, resolution="HOUR")
+
+
+def test_stop_gapped_through_fills_at_the_open():
+    # Long at 100 with a 2% stop (98); the next bar opens at 95, below the stop
+    result = run([(100, 100, 100, 100), (95, 96, 94, 95), (95, 95, 95, 95)], [LONG, HOLD, HOLD], stop_loss=0.02)
+    assert result["stops"] == 1
+    assert result["trades"] == 1
+    assert result["final_balance"] == pytest.approx(10000 - 5)
+
+
+def test_take_profit_fills_at_the_limit_or_a_better_open():
+    # Limit at 103 inside the next bar's range fills at 103
+    result = run([(100, 100, 100, 100), (101, 104, 100.5, 102), (102, 102, 102, 102)], [LONG, HOLD, HOLD],
+                 take_profit=0.03)
+    assert result["limits"] == 1
+    assert result["final_balance"] == pytest.approx(10000 + 3)
+    # Gapping over the limit fills at the open
+    result = run([(100, 100, 100, 100), (105, 106, 104, 105), (105, 105, 105, 105)], [LONG, HOLD, HOLD],
+                 take_profit=0.03)
+    assert result["final_balance"] == pytest.approx(10000 + 5)
+
+
+def test_latency_moves_the_fill_to_the_next_open_with_spread_and_slippage():
+    fill = FillModel(spread=0.01, slippage=0.001, latency_ms=500)
+    result = run([(100, 100, 100, 100), (102, 102, 102, 102), (104, 104, 104, 104)], [LONG, HOLD, HOLD], fill)
+    # Bought at bar 1's open ask (102 + 0.51) slipped up, sold at bar 2's open bid (104 - 0.52) slipped down
+    entry = 102.51 * 1.001
+    exit_ = 103.48 * 0.999
+    assert result["orders"] == 1
+    assert result["trades"] == 1
+    assert result["final_balance"] == pytest.approx(10000 + exit_ - entry)
+
+
+def test_sweep_reads_repeated_runs_from_the_cache(tmp_path, monkeypatch):
+    store = CandleStore(root=str(tmp_path / "candles"))
+    close = 100 * np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.01, 300)))
+    store.append("EURUSD", "HOUR", {"time": np.arange(300, dtype=np.int64) * HOUR, "open": close,
+                                    "high": close * 1.001, "low": close * 0.999, "close": close,
+                                    "volume": np.ones(300)})
+    monkeypatch.setattr(simulator, "candle_store", store)
+    database = Database(str(tmp_path / "sim.db"))
+    pool = SignalPool(workers=1)
+    grid = {"fast": [5, 8], "slow": [20]}
+    first = sweep(["EURUSD"], "ema_crossover", grid, pool=pool, database=database)
+    assert first["stats"]["simulated"] == 2
+    second = sweep(["EURUSD"], "ema_crossover", grid, pool=pool, database=database)
+    assert second["stats"] == {**second["stats"], "simulated": 0, "cached": 2}
+    assert [r["result"] for r in second["runs"]] == [r["result"] for r in first["runs"]]
+    # Another fill model is another run
+    third = sweep(["EURUSD"], "ema_crossover", grid, fill=NO_COSTS, pool=pool, database=database)
+    assert third["stats"]["simulated"] == 2
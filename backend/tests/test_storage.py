@@ -0,0 +1,35 @@
+import os
+import threading
+import pytest
+from app.storage import Database, DatabaseBusy
+
+
+def test_exhausted_pool_times_out(tmp_path):
+    db = Database(os.path.join(tmp_path, "app.db"), pool_size=1, pool_timeout=0.05)
+    with db.connection():
+        with pytest.raises(DatabaseBusy):
+            with db.connection():
+                pass
+    # The held connection went back to the pool
+    with db.connection() as conn:
+        assert conn.execute("SELECT 1").fetchone() == (1,)
+
+
+def test_pool_is_shared_between_threads(tmp_path):
+    db = Database(os.path.join(tmp_path, "app.db"), pool_size=2, pool_timeout=5)
+    errors = []
+
+    def work():
+        try:
+            for _ in range(50):
+                db.users_version()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert db._created == 2
@@ -0,0 +1,81 @@
+import json
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from app import indicators
+from app.streaming_indicators import EMA, RSI, ATR, Indicator, IndicatorSet, RollingMinMax, RollingStats, Wilder
+
+BARS = 3000
+WINDOW = 20
+
+
+def series(seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, BARS)))
+    spread = rng.uniform(0, 0.01, BARS)
+    return close * (1 + spread), close * (1 - spread), close
+
+
+def feed(make, inputs, restart_at=None):
+    # One output per bar; at restart_at the state goes through a JSON
+    # snapshot and a restore, as it would across a process restart
+    indicator, outputs = make(), []
+    for i, args in enumerate(zip(*inputs)):
+        if i == restart_at:
+            indicator = Indicator.restore(json.loads(json.dumps(indicator.snapshot())))
+        value = indicator.update(*(float(a) for a in args))
+        outputs.append(np.nan if value is None else value)
+    return np.array(outputs, dtype=float), indicator
+
+
+def assert_matches(streamed, batch):
+    np.testing.assert_allclose(streamed, batch, rtol=1e-9, atol=1e-12)
+
+
+def test_recursive_indicators_match_the_batch_series():
+    high, low, close = series()
+    for restart_at in (None, BARS // 2):
+        assert_matches(feed(lambda: EMA(12), [close], restart_at)[0], indicators.ema(close, 12))
+        assert_matches(feed(lambda: Wilder(14), [close], restart_at)[0], indicators.wilder(close, 14))
+        assert_matches(feed(lambda: RSI(14), [close], restart_at)[0], indicators.rsi(close, 14))
+        assert_matches(feed(lambda: ATR(14), [high, low, close], restart_at)[0], indicators.atr(high, low, close, 14))
+
+
+def test_rolling_indicators_match_the_batch_series():
+    # BARS is past window * 64 updates, so the periodic re-sum is covered too
+    _, _, close = series(1)
+    for restart_at in (None, 1500):
+        means, stats = feed(lambda: RollingStats(WINDOW), [close], restart_at)
+        means[:WINDOW - 1] = np.nan
+        assert_matches(means, indicators.sma(close, WINDOW))
+        mean, upper, lower = indicators.bollinger(close, WINDOW)
+        assert np.isclose(stats.std(), (upper[-1] - mean[-1]) / 2)
+        assert np.isclose(stats.zscore(), indicators.zscore(close, WINDOW)[-1])
+
+        extremes, _ = feed(lambda: RollingMinMax(WINDOW), [close], restart_at)
+        windows = sliding_window_view(close, WINDOW)
+        np.testing.assert_array_equal(extremes[WINDOW - 1:, 0], windows.min(axis=1))
+        np.testing.assert_array_equal(extremes[WINDOW - 1:, 1], windows.max(axis=1))
+
+
+def test_indicator_set_matches_compute_indicators_after_a_restore():
+    high, low, close = series(2)
+    batch = indicators.compute_indicators(close, high, low, ema_periods=(12, 26), vol_period=WINDOW, z_period=WINDOW)
+    window_min = sliding_window_view(close, WINDOW).min(axis=1)
+    live = IndicatorSet(window=WINDOW)
+    for i in range(BARS):
+        if i == 1234:
+            live = Indicator.restore(json.loads(json.dumps(live.snapshot())))
+        values = live.update(float(high[i]), float(low[i]), float(close[i]))
+        if i >= 100:
+            expected = {
+                "ema_fast": batch["ema_12"][i],
+                "ema_slow": batch["ema_26"][i],
+                "rsi": batch["rsi"][i],
+                "atr": batch["atr"][i],
+                "sma": batch["sma_20"][i],
+                "zscore": batch["zscore"][i],
+                "volatility": batch["volatility"][i],
+                "rolling_min": window_min[i - WINDOW + 1],
+            }
+            for name, value in expected.items():
+                assert np.isclose(values[name], value, rtol=1e-9, atol=1e-12), (i, name)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from app.instrument_catalogue import InstrumentCatalogue
+from app.volatility_scanner import VolatilityScanner
+
+
+def series(n, seed=0, sigma=0.01):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, sigma, n)))
+    high, low = close * (1 + rng.uniform(0, 0.002, n)), close * (1 - rng.uniform(0, 0.002, n))
+    return np.arange(n, dtype=np.int64) * 60, high, low, close
+
+
+def test_streamed_and_ingested_bars_agree():
+    times, high, low, close = series(80)
+    streamed, ingested = VolatilityScanner(max_window=30), VolatilityScanner(max_window=30)
+    for i in range(80):
+        streamed.on_bar("EURUSD", (times[i], close[i], high[i], low[i], close[i], 1))
+    ingested.ingest("EURUSD", times[:50], high[:50], low[:50], close[:50])
+    ingested.ingest("EURUSD", times[40:], high[40:], low[40:], close[40:])
+    for window in (2, 15, 30):
+        for metric in ("volatility", "range", "change"):
+            a, b = streamed.top(1, window, metric)[0], ingested.top(1, window, metric)[0]
+            assert a == pytest.approx(b)
+
+
+def test_windows_are_right_after_the_ring_wraps():
+    scanner = VolatilityScanner(max_window=10)
+    times, high, low, close = series(35, seed=1)
+    scanner.ingest("GOLD", times[:7], high[:7], low[:7], close[:7])
+    for i in range(7, 35):
+        scanner.on_bar("GOLD", (times[i], close[i], high[i], low[i], close[i], 1))
+    returns = np.diff(np.log(close))[-10:]
+    top = scanner.top(1, 10)[0]
+    assert top["bars"] == 11
+    assert top["volatility"] == pytest.approx(returns.std(ddof=1))
+    assert top["change"] == pytest.approx(close[-1] / close[-11] - 1)
+    assert top["range"] == pytest.approx((high[-11:].max() - low[-11:].min()) / close[-1])
+
+
+def test_top_orders_by_metric_and_clamps_the_window():
+    scanner = VolatilityScanner(max_window=20)
+    for epic, sigma in (("CALM", 0.001), ("WILD", 0.05), ("MID", 0.01)):
+        times, high, low, close = series(40, sigma=sigma)
+        scanner.ingest(epic, times, high, low, close)
+    assert [row["epic"] for row in scanner.top(2, 15)] == ["WILD", "MID"]
+    assert [row["epic"] for row in scanner.top(5, 15)] == ["WILD", "MID", "CALM"]
+    assert scanner.top(1, 10 ** 6)[0]["window_minutes"] == 20
+    assert scanner.top(1, 0)[0]["window_minutes"] == 2
+    with pytest.raises(ValueError):
+        scanner.top(1, 15, "sharpe")
+
+
+def test_catalogue_feeds_the_universe_tradeable_first():
+    scanner = VolatilityScanner(max_epics=2)
+    instruments = {epic: {"epic": epic, "symbol": epic, "name": epic, "type": "SHARES", "status": status}
+                   for epic, status in (("AAA", "CLOSED"), ("BBB", "TRADEABLE"), ("CCC", "TRADEABLE"))}
+    catalogue = InstrumentCatalogue(database=None)
+    catalogue.subscribe(scanner.on_catalogue)
+    catalogue._index(instruments)
+    assert {"BBB", "CCC"} <= scanner.universe
+    assert "AAA" not in scanner.universe